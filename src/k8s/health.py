@@ -1,12 +1,12 @@
+import asyncio
 import logging
+import os
 import threading
 import time
+from typing import Optional
 
-from fastapi import FastAPI, Response, status
-from fastapi.responses import PlainTextResponse
-from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest, make_asgi_app, start_http_server
-import uvicorn
-
+# fastapi, uvicorn and prometheus_client are imported when a HealthCheck is
+# created, so one-shot commands that never serve /health don't load them
 
 # Global health status
 health_status = {
@@ -16,19 +16,49 @@ health_status = {
     "errors": []
 }
 
+# Distinct health errors kept in health_status["errors"]
+MAX_HEALTH_ERRORS = 20
+
 logger = logging.getLogger('health')
 
-# Create FastAPI app
-app = FastAPI(title="Health API", description="Health check API for network test daemon")
+
+def record_error(message):
+    """Add an error to health_status, counting repeats instead of appending them"""
+    now = time.time()
+    errors = health_status["errors"]
+    for error in errors:
+        if error["message"] == message:
+            error["count"] += 1
+            error["last_seen"] = now
+            return
+    errors.append({"message": message, "count": 1, "first_seen": now, "last_seen": now})
+    del errors[:-MAX_HEALTH_ERRORS]
 
 class HealthCheck:
-    def __init__(self, port=8080, config=None):
-        self.app = app
+    def __init__(self, port=8080, config=None, matrix=None, history=None, profiler=None, collectors=None):
+        from fastapi import FastAPI
+        from k8s.network import metrics
+
+        # Everything this server exports exists from the first scrape
+        metrics.enable()
+        self.app = FastAPI(title="Health API", description="Health check API for network test daemon")
         self.port = port
         self.config = config
+        # Async callable returning the node latency matrix, if this daemon measures one
+        self.matrix = matrix
+        # ResultHistory of recent probe samples, if the daemon keeps one
+        self.history = history
+        # StackSampler for /debug/profile; None keeps the endpoint disabled
+        self.profiler = profiler
+        # Extra prometheus collectors for the merged registry in multiprocess mode
+        self.collectors = list(collectors or ())
         self.setup_routes()
     
     def setup_routes(self):
+        from fastapi import Response, status
+        from fastapi.responses import PlainTextResponse
+        from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, ProcessCollector, generate_latest, multiprocess
+
         @self.app.get("/health")
         @self.app.get("/healthz")
         async def health_check(response: Response):
@@ -41,7 +71,7 @@ class HealthCheck:
             
             if health_status["last_test_run"] is None or (current_time - health_status["last_test_run"]) > (interval * 2):
                 health_status["status"] = "unhealthy"
-                health_status["errors"].append("Tests not running within expected interval")
+                record_error("Tests not running within expected interval")
                 response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
             else:
                 health_status["status"] = "healthy"
@@ -53,36 +83,88 @@ class HealthCheck:
         @self.app.get("/status")
         async def detailed_status():
             """Return detailed status including test results and configuration"""
+            # Summarizing many targets is slow; keep it off the event loop
+            results = await asyncio.to_thread(self.history.summary) if self.history is not None else None
             return {
                 "health": health_status,
                 "config": {k: v for k, v in self.config.items() if k != "password"},
                 "targets": self.config.get("http_targets", []),
+                "results": results,
                 "uptime": time.time() - self.config.get("start_time", time.time())
             }
 
-        @app.get("/metrics")
+        @self.app.get("/results")
+        async def results(response: Response, target: Optional[str] = None, since: Optional[float] = None):
+            """Recent samples for a target, newer than since (unix time); without target, the known targets"""
+            if self.history is None:
+                response.status_code = status.HTTP_404_NOT_FOUND
+                return {"error": "Result history is not enabled"}
+            if target is None:
+                return {"targets": await asyncio.to_thread(self.history.targets)}
+            samples = await asyncio.to_thread(self.history.results, target, since)
+            if samples is None:
+                response.status_code = status.HTTP_404_NOT_FOUND
+                return {"error": f"No results for {target}"}
+            return {"target": target, "samples": samples}
+
+        @self.app.get("/summary")
+        async def summary(response: Response):
+            """Per-target error ratio and latency quantiles over the buffered samples"""
+            if self.history is None:
+                response.status_code = status.HTTP_404_NOT_FOUND
+                return {"error": "Result history is not enabled"}
+            return await asyncio.to_thread(self.history.summary)
+
+        @self.app.get("/matrix")
+        async def matrix(response: Response, scope: str = "cluster"):
+            """Latest node-to-node latency/loss matrix"""
+            if self.matrix is None:
+                response.status_code = status.HTTP_404_NOT_FOUND
+                return {"error": "Node mesh probing is not enabled"}
+            return await self.matrix(scope)
+
+        @self.app.get("/debug/profile")
+        async def profile(response: Response, seconds: float = 10):
+            """Sample every thread's stack for a while and return collapsed stacks"""
+            if self.profiler is None:
+                response.status_code = status.HTTP_404_NOT_FOUND
+                return {"error": "Profiling is not enabled"}
+            stacks = await asyncio.to_thread(self.profiler.dump, min(seconds, 60))
+            return PlainTextResponse(stacks)
+
+        @self.app.get("/metrics")
         async def metrics():
-          """Expose Prometheus metrics"""
+          """Expose Prometheus metrics, merged from every worker process in multiprocess mode"""
+          registry = REGISTRY
+          if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+              registry = CollectorRegistry()
+              multiprocess.MultiProcessCollector(registry)
+              # Process metrics are not written to the multiprocess directory
+              ProcessCollector(registry=registry)
+              for collector in self.collectors:
+                  registry.register(collector)
           return PlainTextResponse(
-              generate_latest(REGISTRY),
+              generate_latest(registry),
               media_type=CONTENT_TYPE_LATEST
           )
         
-    def start(self):
+    def start(self, host="0.0.0.0", port=None):
       """Start FastAPI health check server"""
+      import uvicorn
+
       # Run server in a separate thread
       server_thread = threading.Thread(
           target=uvicorn.run,
           kwargs={
-              "app": app,
-              "host": "0.0.0.0",
-              "port": self.port,
+              "app": self.app,
+              "host": host,
+              "port": port or self.port,
               "log_level": "error"  # Reduce log noise
           }
       )
       server_thread.daemon = True
       server_thread.start()
       
-      logger.info(f"Started FastAPI health check server on port {self.port}")
+      logger.info(f"Started FastAPI health check server on port {port or self.port}")
       return self
     
\ No newline at end of file
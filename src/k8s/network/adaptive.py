@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import math
+import statistics
+
+from k8s.network.metrics import Counter, Gauge
+from k8s.network.series import SeriesRegistry
+
+ADAPTIVE_METRICS = {
+    'interval': Gauge('probe_adaptive_interval_seconds', 'Current interval of a probe job under adaptive sampling', ['probe_job'], multiprocess_mode='mostrecent'),
+    'deviations': Counter('probe_adaptive_deviations', 'Probe runs whose latency or error ratio deviated from the job\'s baseline', ['probe_job']),
+}
+
+
+class Baseline:
+    """Exponentially weighted latency mean/variance and error ratio of one job's runs"""
+
+    __slots__ = ('mean', 'var', 'error_ratio', 'runs')
+
+    def __init__(self):
+        self.mean = None
+        self.var = 0.0
+        self.error_ratio = 0.0
+        self.runs = 0
+
+    def update(self, latency, error_ratio, alpha):
+        self.error_ratio += alpha * (error_ratio - self.error_ratio)
+        if latency is not None:
+            if self.mean is None:
+                self.mean = latency
+            else:
+                diff = latency - self.mean
+                increment = alpha * diff
+                self.mean += increment
+                self.var = (1 - alpha) * (self.var + diff * increment)
+        self.runs += 1
+
+
+class AdaptiveSampler:
+    """Per-job probe intervals that follow how unusual each job's results are
+
+    Samples recorded while a job runs are collected per run. When the run
+    completes, its median latency and error ratio are compared with the
+    job's baseline: a run more than `threshold` standard deviations (and at
+    least `min_change` relative) slower than the baseline, or with an error
+    ratio `error_margin` above it, is a deviation and the job drops straight
+    to `min_factor` times its configured interval. Every run without a
+    deviation multiplies the interval by `backoff`, up to `max_factor` times
+    the configured interval, so stable targets are probed less and the
+    budget goes to the ones that look wrong. The baseline adapts slowly while
+    deviating, so an incident does not immediately become the new normal.
+    """
+
+    def __init__(self, min_factor=0.25, max_factor=4.0, backoff=1.5, threshold=3.0, min_change=0.2,
+                 error_margin=0.1, alpha=0.2, warmup_runs=3, min_interval=1.0, series=None):
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.backoff = backoff
+        self.threshold = threshold
+        self.min_change = min_change
+        self.error_margin = error_margin
+        self.alpha = alpha
+        self.warmup_runs = warmup_runs
+        self.min_interval = min_interval
+        self.series = series if series is not None else SeriesRegistry()
+        self._baselines = {}
+        self._runs = {}
+
+    def observe(self, job, latency):
+        """Count one sample of the current run of job (latency None for a failure)"""
+        run = self._runs.get(job)
+        if run is None:
+            run = self._runs[job] = [0, []]
+        if latency is None:
+            run[0] += 1
+        else:
+            run[1].append(latency)
+
+    def deviates(self, baseline, latency, error_ratio):
+        if baseline.runs < self.warmup_runs:
+            return False
+        if error_ratio > baseline.error_ratio + self.error_margin:
+            return True
+        if latency is None or baseline.mean is None:
+            return False
+        return latency - baseline.mean > max(self.threshold * math.sqrt(baseline.var), self.min_change * baseline.mean)
+
+    def interval(self, job):
+        """Interval for the next run of job, given the run that just completed"""
+        errors, latencies = self._runs.pop(job.name, (0, []))
+        if not errors and not latencies:
+            return job.interval
+        baseline = self._baselines.get(job.name)
+        if baseline is None:
+            baseline = self._baselines[job.name] = Baseline()
+        latency = statistics.median(latencies) if latencies else None
+        error_ratio = errors / (errors + len(latencies))
+        deviating = self.deviates(baseline, latency, error_ratio)
+        baseline.update(latency, error_ratio, self.alpha / 4 if deviating else self.alpha)
+
+        if deviating:
+            self.series.labels(ADAPTIVE_METRICS['deviations'], probe_job=job.name).inc()
+            interval = max(job.base_interval * self.min_factor, min(self.min_interval, job.base_interval))
+        else:
+            interval = min(job.interval * self.backoff, job.base_interval * self.max_factor)
+        self.series.labels(ADAPTIVE_METRICS['interval'], probe_job=job.name).set(interval)
+        return interval
+
+    def forget(self, job):
+        self._baselines.pop(job, None)
+        self._runs.pop(job, None)
+        for metric in ADAPTIVE_METRICS.values():
+            self.series.remove(metric, probe_job=job)
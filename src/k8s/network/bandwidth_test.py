@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import sys
+import time
+
+from k8s.network.metrics import Gauge
+
+from k8s.network.test import NetworkTest, load_common_config_from_env
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('network-test')
+
+BANDWIDTH_METRICS = {
+    'stream': Gauge('bandwidth_stream_bits_per_second', 'Throughput of one stream in the last bandwidth test', ['url', 'direction', 'stream'], multiprocess_mode='mostrecent'),
+    'aggregate': Gauge('bandwidth_aggregate_bits_per_second', 'Combined throughput of all streams in the last bandwidth test', ['url', 'direction'], multiprocess_mode='mostrecent'),
+    'timeseries': Gauge('bandwidth_interval_bits_per_second', 'Combined throughput over the most recent report interval', ['url', 'direction'], multiprocess_mode='mostrecent'),
+}
+
+BLOCK_SIZE = 256 * 1024
+
+
+class BandwidthNetworkTest(NetworkTest):
+    """iperf-style throughput test against test-http-server
+
+    Runs N parallel streams for a fixed duration, each on its own connection,
+    downloading from /download or uploading to /upload. Bytes are counted
+    per stream and sampled every report interval into a time series. Each
+    stream holds one of the engine's sample slots, and waits for the probe
+    rate budget, like any other sample.
+    """
+
+    def probe_jobs(self):
+      """One job per bandwidth target (opt-in; these saturate the link)"""
+      return [
+          self.probe_job(
+              f"bandwidth:{url}",
+              lambda url=url: self.run_bandwidth_test_async(
+                  url,
+                  self.config.get('bandwidth_streams', 4),
+                  self.config.get('bandwidth_duration', 10),
+                  self.config.get('bandwidth_direction', 'download'),
+                  quiet=True
+              )
+          )
+          for url in self.config.get('bandwidth_targets', [])
+      ]
+
+    def run_bandwidth_test(self, url, streams=4, duration=10, direction='download', report_interval=1.0, output=None):
+      """Run a bandwidth test and optionally write its time series as CSV"""
+      result = self.engine.run(self.run_bandwidth_test_async(url, streams, duration, direction, report_interval))
+      if output:
+          with open(output, 'w', newline='') as f:
+              writer = csv.writer(f)
+              writer.writerow(['elapsed_seconds', 'stream', 'bytes', 'bits_per_second'])
+              writer.writerows(result['timeseries'])
+          logger.info(f"Wrote time series to {output}")
+      return result
+
+    async def run_bandwidth_test_async(self, url, streams=4, duration=10, direction='download', report_interval=1.0, quiet=False):
+      """Run `streams` parallel transfers for `duration` seconds"""
+      base = url.rstrip('/')
+      counters = [0] * streams
+      if streams > self.engine.concurrency:
+          logger.warning(f"{streams} streams but only {self.engine.concurrency} sample slots; the rest wait for a free slot")
+      if not quiet:
+          logger.info(f"Running {direction} bandwidth test to {base} with {streams} streams for {duration}s")
+
+      start = time.monotonic()
+      deadline = start + duration
+      transfer = self._download if direction == 'download' else self._upload
+      tasks = [asyncio.ensure_future(transfer(base, i, counters, deadline)) for i in range(streams)]
+      timeseries = await self._report(base, direction, counters, tasks, start, report_interval, quiet)
+      outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+      elapsed = time.monotonic() - start
+
+      per_stream = []
+      for i, outcome in enumerate(outcomes):
+          if isinstance(outcome, Exception):
+              logger.error(f"Stream {i} to {base} failed - {str(outcome) or type(outcome).__name__}")
+          bps = counters[i] * 8 / elapsed if elapsed > 0 else 0
+          self.series.labels(BANDWIDTH_METRICS['stream'], url=base, direction=direction, stream=str(i)).set(bps)
+          per_stream.append(bps)
+      aggregate = sum(per_stream)
+      self.series.labels(BANDWIDTH_METRICS['aggregate'], url=base, direction=direction).set(aggregate)
+
+      if not quiet:
+          logger.info(f"\nBandwidth Results for {base} ({direction}, {elapsed:.1f}s):")
+          for i, bps in enumerate(per_stream):
+              logger.info(f"  Stream {i}: {bps / 1e9:.3f} Gbit/s ({counters[i]} bytes)")
+          logger.info(f"  Aggregate: {aggregate / 1e9:.3f} Gbit/s")
+
+      return {
+          "elapsed": elapsed,
+          "bytes": counters,
+          "streams_bps": per_stream,
+          "aggregate_bps": aggregate,
+          "timeseries": timeseries
+      }
+
+    async def _report(self, base, direction, counters, tasks, start, report_interval, quiet):
+      """Sample the counters every report_interval until all streams finish"""
+      timeseries = []
+      previous = list(counters)
+      last = start
+      while not all(task.done() for task in tasks):
+          await asyncio.wait(tasks, timeout=report_interval)
+          now = time.monotonic()
+          span = now - last
+          if span <= 0:
+              continue
+          total = 0
+          for i, count in enumerate(counters):
+              delta = count - previous[i]
+              total += delta
+              timeseries.append((round(now - start, 3), i, delta, delta * 8 / span))
+          previous = list(counters)
+          last = now
+          self.series.labels(BANDWIDTH_METRICS['timeseries'], url=base, direction=direction).set(total * 8 / span)
+          if not quiet:
+              logger.info(f"{now - start:6.1f}s  {total * 8 / span / 1e9:.3f} Gbit/s")
+      return timeseries
+
+    async def _download(self, base, stream, counters, deadline):
+      async with self.engine.slot('bandwidth'):
+          seconds = max(deadline - time.monotonic(), 0)
+          conn, target, host = await self.engine.http.connect(f"{base}/download?seconds={seconds:.3f}")
+          try:
+              conn.writer.write(
+                  f"GET {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('latin-1')
+              )
+              await conn.writer.drain()
+              _, status_code, _ = await self.engine.http.read_head(conn.reader)
+              if status_code != 200:
+                  raise OSError(f"HTTP {status_code} from {base}/download")
+              while time.monotonic() < deadline:
+                  block = await conn.reader.read(BLOCK_SIZE)
+                  if not block:
+                      break
+                  counters[stream] += len(block)
+          finally:
+              conn.close()
+
+    async def _upload(self, base, stream, counters, deadline):
+      async with self.engine.slot('bandwidth'):
+          conn, target, host = await self.engine.http.connect(f"{base}/upload")
+          block = os.urandom(BLOCK_SIZE)
+          chunk = f"{len(block):x}\r\n".encode('latin-1') + block + b"\r\n"
+          try:
+              conn.writer.write(
+                  f"POST {target} HTTP/1.1\r\nHost: {host}\r\nTransfer-Encoding: chunked\r\n"
+                  "Content-Type: application/octet-stream\r\nConnection: close\r\n\r\n".encode('latin-1')
+              )
+              while time.monotonic() < deadline:
+                  conn.writer.write(chunk)
+                  await conn.writer.drain()
+                  counters[stream] += len(block)
+              conn.writer.write(b"0\r\n\r\n")
+              await conn.writer.drain()
+              _, status_code, _ = await self.engine.http.read_head(conn.reader)
+              if status_code != 200:
+                  raise OSError(f"HTTP {status_code} from {base}/upload")
+          finally:
+              conn.close()
+
+
+def load_targets_from_env():
+    """Load this probe's targets and settings from environment variables
+
+    Settings shared by every probe type come from load_common_config_from_env.
+    """
+    config = {
+        'bandwidth_targets': [],
+    }
+
+    # Load bandwidth targets (comma-separated base URLs of test-http-server)
+    bandwidth_targets = os.environ.get('BANDWIDTH_TARGETS', '')
+    if bandwidth_targets:
+        config['bandwidth_targets'] = [url.strip() for url in bandwidth_targets.split(',')]
+        config['bandwidth_streams'] = int(os.environ.get('BANDWIDTH_STREAMS', 4))
+        config['bandwidth_duration'] = float(os.environ.get('BANDWIDTH_DURATION', 10))
+        config['bandwidth_direction'] = os.environ.get('BANDWIDTH_DIRECTION', 'download')
+
+    return config
+
+def main():
+    parser = argparse.ArgumentParser(description='Kubernetes Network Bandwidth Test with Prometheus Metrics')
+
+    # Create subparsers for different commands
+    subparsers = parser.add_subparsers(dest='command', help='Test command')
+
+    # Bandwidth test
+    run_parser = subparsers.add_parser('run', help='Measure throughput to a test-http-server')
+    run_parser.add_argument('url', help='Base URL of test-http-server (e.g. http://network-test)')
+    run_parser.add_argument('--streams', type=int, default=4, help='Number of parallel streams (default: 4)')
+    run_parser.add_argument('--duration', type=float, default=10, help='Test duration in seconds (default: 10)')
+    run_parser.add_argument('--direction', choices=['download', 'upload'], default='download', help='Transfer direction (default: download)')
+    run_parser.add_argument('--interval', type=float, default=1.0, help='Report interval in seconds (default: 1)')
+    run_parser.add_argument('--output', help='Write the per-interval time series to this CSV file')
+
+    # Daemon mode for continuous monitoring
+    subparsers.add_parser('daemon', help='Run as a daemon for continuous monitoring')
+
+    args = parser.parse_args()
+
+    config = load_common_config_from_env()
+    config.update(load_targets_from_env())
+    test = BandwidthNetworkTest(config)
+
+    if args.command == 'run':
+        test.run_bandwidth_test(args.url, args.streams, args.duration, args.direction, args.interval, args.output)
+    elif args.command == 'daemon':
+        try:
+            test.run_scheduler()
+        except KeyboardInterrupt:
+            logger.info("Shutting down...")
+            sys.exit(0)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
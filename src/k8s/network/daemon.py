@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+import signal
+import sys
+
+from k8s.network import bandwidth_test, http_test, k8s_discovery_test, k8s_node_test, k8s_svc_test, ping_test, tls_test, udp_test
+from k8s.network.bandwidth_test import BandwidthNetworkTest
+from k8s.network.http_test import HttpNetworkTest
+from k8s.network.k8s_discovery_test import DiscoveryNetworkTest
+from k8s.network.k8s_node_test import NodeNetworkTest
+from k8s.network.k8s_svc_test import ServiceNetworkTest
+from k8s.network.ping_test import PingNetworkTest
+from k8s.network.test import load_common_config_from_env
+from k8s.network.tls_test import TlsNetworkTest
+from k8s.network.udp_test import UdpNetworkTest
+from k8s.network.workers import WorkerPool, ensure_multiprocess_dir
+
+logger = logging.getLogger('network-test')
+
+# Probe type -> (test class, env loader of its targets)
+PROBES = {
+    'tcp': (PingNetworkTest, ping_test.load_targets_from_env),
+    'http': (HttpNetworkTest, http_test.load_targets_from_env),
+    'svc': (ServiceNetworkTest, k8s_svc_test.load_targets_from_env),
+    'node': (NodeNetworkTest, k8s_node_test.load_targets_from_env),
+    'bandwidth': (BandwidthNetworkTest, bandwidth_test.load_targets_from_env),
+    'discovery': (DiscoveryNetworkTest, k8s_discovery_test.load_targets_from_env),
+    'udp': (UdpNetworkTest, udp_test.load_targets_from_env),
+    'tls': (TlsNetworkTest, tls_test.load_targets_from_env),
+}
+
+
+class MultiProbeNetworkTest(HttpNetworkTest, PingNetworkTest, ServiceNetworkTest, NodeNetworkTest, BandwidthNetworkTest,
+                            DiscoveryNetworkTest, UdpNetworkTest, TlsNetworkTest):
+    """Run several probe types in one process
+
+    All probe types share one probe engine, scheduler, set of latency
+    recorders and health/metrics server.
+    """
+
+    def __init__(self, config, probes=None):
+        super().__init__(config)
+        self.probes = list(probes or PROBES)
+
+    def probe_jobs(self):
+        jobs = []
+        for probe in self.probes:
+            cls, _ = PROBES[probe]
+            jobs.extend(cls.probe_jobs(self))
+        return jobs
+
+    def background_tasks(self):
+        tasks = []
+        for probe in self.probes:
+            cls, _ = PROBES[probe]
+            tasks.extend(cls.background_tasks(self))
+        return tasks
+
+
+def load_config_from_env(probes=None):
+    """The shared settings plus the targets of each selected probe type"""
+    config = load_common_config_from_env()
+    for probe in probes or PROBES:
+        _, load = PROBES[probe]
+        config.update(load())
+    return config
+
+
+def parse_probes(value):
+    probes = [p.strip() for p in value.split(',') if p.strip()]
+    unknown = set(probes) - set(PROBES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown probe types: {', '.join(sorted(unknown))}")
+    return probes
+
+
+def run_workers(config, probes, workers):
+    """Run the daemon as `workers` probe processes under this one, which serves health and merged metrics"""
+    ensure_multiprocess_dir()
+    pool = WorkerPool(lambda config: MultiProbeNetworkTest(config, probes), config, workers).start()
+    pool.health_check(mesh='node' in probes and config.get('node_mesh')).start()
+    logger.info(f"Running {workers} probe worker processes")
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt()
+    signal.signal(signal.SIGTERM, terminate)
+
+    try:
+        pool.monitor()
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+    finally:
+        pool.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='Kubernetes Network Speed Test with Prometheus Metrics')
+    parser.add_argument(
+        '--probes',
+        type=parse_probes,
+        default=parse_probes(os.environ.get('NETWORK_TEST_PROBES', ','.join(PROBES))),
+        help=f"Comma-separated probe types to run (default: NETWORK_TEST_PROBES or {','.join(PROBES)})"
+    )
+
+    # Create subparsers for different commands
+    subparsers = parser.add_subparsers(dest='command', help='Test command')
+
+    # Single run of every configured probe
+    subparsers.add_parser('once', help='Run every configured probe once and exit')
+
+    # Daemon mode for continuous monitoring
+    daemon_parser = subparsers.add_parser('daemon', help='Run as a daemon for continuous monitoring')
+    daemon_parser.add_argument(
+        '--workers',
+        type=int,
+        default=int(os.environ.get('NETWORK_TEST_WORKERS', 1)),
+        help='Probe worker processes sharing the targets, with metrics merged on one /metrics (default: NETWORK_TEST_WORKERS or 1)'
+    )
+
+    args = parser.parse_args()
+
+    config = load_config_from_env(args.probes)
+
+    if args.command == 'once':
+        MultiProbeNetworkTest(config, args.probes).run_scheduled_tests()
+    elif args.command == 'daemon' and args.workers > 1:
+        # Workers build their own tests after the fork
+        run_workers(config, args.probes, args.workers)
+    elif args.command == 'daemon':
+        try:
+            MultiProbeNetworkTest(config, args.probes).run_scheduler()
+        except KeyboardInterrupt:
+            logger.info("Shutting down...")
+            sys.exit(0)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import logging
+import os
+import ssl
+from urllib.parse import urlencode
+
+from k8s.network.http_client import AsyncHttpClient
+
+logger = logging.getLogger('network-test')
+
+SERVICE_ACCOUNT_DIR = '/var/run/secrets/kubernetes.io/serviceaccount'
+SERVICE_NAME_LABEL = 'kubernetes.io/service-name'
+
+
+class KubeApiError(OSError):
+    """Raised when the API server answers with an error status"""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"API server returned {status_code}: {message}")
+        self.status_code = status_code
+
+
+class KubeApi:
+    """Minimal asyncio client for the list and watch calls discovery needs
+
+    Uses the pod's service account by default; `server` (and optionally
+    `token`) point it at another API server, e.g. the fake one in
+    k8s.utils.fake_api_server.
+    """
+
+    def __init__(self, server=None, token=None, ca_file=None):
+        if server is None:
+            host = os.environ.get('KUBERNETES_SERVICE_HOST')
+            if not host:
+                raise KubeApiError(0, "not running in a cluster and no API server configured")
+            server = f"https://{host}:{os.environ.get('KUBERNETES_SERVICE_PORT', 443)}"
+            token = token or _read(os.path.join(SERVICE_ACCOUNT_DIR, 'token'))
+            ca_file = ca_file or os.path.join(SERVICE_ACCOUNT_DIR, 'ca.crt')
+        self.server = server.rstrip('/')
+        self.token = token
+        ssl_context = ssl.create_default_context(cafile=ca_file) if ca_file and os.path.exists(ca_file) else None
+        self.http = AsyncHttpClient(ssl_context=ssl_context)
+
+    async def _open(self, path, params):
+        query = f"?{urlencode(params)}" if params else ""
+        conn, target, host = await self.http.connect(f"{self.server}{path}{query}")
+        try:
+            auth = f"Authorization: Bearer {self.token}\r\n" if self.token else ""
+            conn.writer.write(
+                f"GET {target} HTTP/1.1\r\nHost: {host}\r\n{auth}Accept: application/json\r\n"
+                "User-Agent: k8s-network-test\r\nConnection: close\r\n\r\n".encode('latin-1')
+            )
+            await conn.writer.drain()
+            _, status_code, headers = await self.http.read_head(conn.reader)
+            if status_code != 200:
+                body = b''.join([block async for block in self.http.iter_body(conn.reader, headers, 'GET', 64 * 1024)])
+                raise KubeApiError(status_code, body.decode('utf-8', 'replace').strip())
+        except BaseException:
+            conn.close()
+            raise
+        return conn, headers
+
+    async def list(self, path, params=None, timeout=30):
+        """GET a list, returning the decoded JSON"""
+        async def _list():
+            conn, headers = await self._open(path, params)
+            try:
+                return json.loads(b''.join([block async for block in self.http.iter_body(conn.reader, headers, 'GET')]))
+            finally:
+                conn.close()
+        return await asyncio.wait_for(_list(), timeout)
+
+    async def watch(self, path, params=None, idle_timeout=330):
+        """Yield watch events (dicts with type and object) until the server ends the stream"""
+        conn, headers = await self._open(path, {**(params or {}), 'watch': 'true'})
+        body = self.http.iter_body(conn.reader, headers, 'GET')
+        buffer = b''
+        try:
+            while True:
+                try:
+                    block = await asyncio.wait_for(body.__anext__(), idle_timeout)
+                except StopAsyncIteration:
+                    return
+                buffer += block
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+        finally:
+            await body.aclose()
+            conn.close()
+
+    def close(self):
+        self.http.close()
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def object_key(obj):
+    metadata = obj['metadata']
+    return f"{metadata.get('namespace', '')}/{metadata['name']}"
+
+
+class Informer:
+    """Local cache of one resource kind, kept current with list + watch
+
+    The resource is listed once; after that a watch from the listed
+    resourceVersion applies each ADDED/MODIFIED/DELETED event to the cache, so
+    nothing is re-listed unless the watch falls too far behind (410 Gone).
+    on_change is called after every change to the cache.
+    """
+
+    def __init__(self, api, path, params=None, on_change=None):
+        self.api = api
+        self.path = path
+        self.params = params or {}
+        self.on_change = on_change
+        self.items = {}
+        self.resource_version = None
+
+    async def list(self):
+        data = await self.api.list(self.path, self.params)
+        self.items = {object_key(obj): obj for obj in data.get('items', [])}
+        self.resource_version = data['metadata']['resourceVersion']
+        self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    async def run(self):
+        """Keep the cache current until cancelled, reconnecting with backoff"""
+        backoff = 1
+        while True:
+            try:
+                if self.resource_version is None:
+                    await self.list()
+                await self._watch()
+                backoff = 1
+                continue
+            except asyncio.CancelledError:
+                raise
+            except KubeApiError as e:
+                if e.status_code == 410:
+                    self.resource_version = None
+                    continue
+                logger.error(f"Watch of {self.path} failed - {e}")
+            except (OSError, asyncio.TimeoutError, EOFError, ValueError) as e:
+                logger.warning(f"Watch of {self.path} interrupted - {str(e) or type(e).__name__}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    async def _watch(self):
+        params = {**self.params, 'resourceVersion': self.resource_version, 'allowWatchBookmarks': 'true', 'timeoutSeconds': 300}
+        async for event in self.api.watch(self.path, params):
+            kind, obj = event.get('type'), event.get('object', {})
+            if kind == 'ERROR':
+                raise KubeApiError(obj.get('code', 500), obj.get('message', ''))
+            self.resource_version = obj['metadata']['resourceVersion']
+            if kind == 'BOOKMARK':
+                continue
+            if kind == 'DELETED':
+                self.items.pop(object_key(obj), None)
+            else:
+                self.items[object_key(obj)] = obj
+            self._changed()
+
+
+class Endpoint:
+    """One ready backend address of a Service port"""
+
+    def __init__(self, namespace, service, pod, address, port, node=None):
+        self.namespace = namespace
+        self.service = service
+        self.pod = pod
+        self.address = address
+        self.port = port
+        self.node = node
+
+    @property
+    def name(self):
+        return f"{self.namespace}/{self.service}/{self.pod}@{self.address}:{self.port}"
+
+
+class EndpointDiscovery:
+    """Services, EndpointSlices and Nodes from the API server, cached locally
+
+    Only services matching `service_selector` (a label selector) are probed;
+    their EndpointSlices supply the individual ready endpoints, so each
+    backend pod is probed directly instead of through kube-proxy.
+    """
+
+    def __init__(self, api, namespace=None, service_selector=None, nodes=True, on_change=None):
+        self.api = api
+        self.on_change = on_change
+        prefix = f"/namespaces/{namespace}" if namespace else ""
+        self.services = Informer(
+            api, f"/api/v1{prefix}/services", {'labelSelector': service_selector} if service_selector else None, self._changed
+        )
+        self.slices = Informer(api, f"/apis/discovery.k8s.io/v1{prefix}/endpointslices", {'labelSelector': SERVICE_NAME_LABEL}, self._changed)
+        self.nodes = Informer(api, "/api/v1/nodes", None, self._changed) if nodes else None
+
+    @property
+    def informers(self):
+        return [informer for informer in (self.services, self.slices, self.nodes) if informer is not None]
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    async def sync(self):
+        """List every resource once"""
+        await asyncio.gather(*(informer.list() for informer in self.informers))
+
+    async def run(self):
+        """Watch every resource until cancelled"""
+        await asyncio.gather(*(informer.run() for informer in self.informers))
+
+    def endpoints(self):
+        """Ready endpoints of the selected services"""
+        services = set(self.services.items)
+        endpoints = []
+        for endpoint_slice in self.slices.items.values():
+            metadata = endpoint_slice['metadata']
+            namespace = metadata.get('namespace', '')
+            service = metadata.get('labels', {}).get(SERVICE_NAME_LABEL)
+            if f"{namespace}/{service}" not in services or endpoint_slice.get('addressType') == 'FQDN':
+                continue
+            ports = [p for p in endpoint_slice.get('ports') or [] if p.get('protocol', 'TCP') == 'TCP' and p.get('port')]
+            for endpoint in endpoint_slice.get('endpoints') or []:
+                if endpoint.get('conditions', {}).get('ready') is False or not endpoint.get('addresses'):
+                    continue
+                address = endpoint['addresses'][0]
+                target_ref = endpoint.get('targetRef') or {}
+                pod = target_ref.get('name') if target_ref.get('kind') == 'Pod' else address
+                for port in ports:
+                    endpoints.append(Endpoint(namespace, service, pod, address, port['port'], endpoint.get('nodeName')))
+        return endpoints
+
+    def ready_nodes(self):
+        """(name, InternalIP) of every Ready node"""
+        if self.nodes is None:
+            return []
+        nodes = []
+        for node in self.nodes.items.values():
+            status = node.get('status', {})
+            ready = any(c.get('type') == 'Ready' and c.get('status') == 'True' for c in status.get('conditions', []))
+            address = next((a['address'] for a in status.get('addresses', []) if a.get('type') == 'InternalIP'), None)
+            if ready and address:
+                nodes.append((node['metadata']['name'], address))
+        return sorted(nodes)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+import asyncio
+import ipaddress
+import random
+import socket
+import struct
+import time
+
+RCODES = {1: 'formerr', 2: 'servfail', 3: 'nxdomain', 4: 'notimp', 5: 'refused'}
+
+TYPE_A = 1
+TYPE_CNAME = 5
+CLASS_IN = 1
+FLAG_TC = 0x0200
+
+
+class DnsError(OSError):
+    """Raised when the resolver answers with an error or an unusable response"""
+
+    def __init__(self, reason, name):
+        super().__init__(f"{reason} resolving {name}")
+        self.reason = reason
+        self.name = name
+
+
+class DnsAnswer:
+
+    def __init__(self, name, addresses, ttl, elapsed, cached=False):
+        self.name = name
+        self.addresses = addresses
+        self.ttl = ttl
+        self.elapsed = elapsed
+        self.cached = cached
+
+
+def read_resolv_conf(path='/etc/resolv.conf'):
+    """Return (nameservers, search domains, ndots) from resolv.conf"""
+    nameservers, search, ndots = [], [], 1
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if not parts or parts[0].startswith(('#', ';')):
+                    continue
+                if parts[0] == 'nameserver' and len(parts) > 1:
+                    nameservers.append(parts[1])
+                elif parts[0] in ('search', 'domain'):
+                    search = parts[1:]
+                elif parts[0] == 'options':
+                    for option in parts[1:]:
+                        if option.startswith('ndots:'):
+                            ndots = int(option.split(':', 1)[1])
+    except OSError:
+        pass
+    return nameservers or ['127.0.0.1'], search, ndots
+
+
+def build_query(query_id, name):
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)  # recursion desired
+    labels = b''.join(
+        bytes([len(label)]) + label.encode('idna') for label in name.rstrip('.').split('.') if label
+    )
+    return header + labels + b'\x00' + struct.pack('!HH', TYPE_A, CLASS_IN)
+
+
+def _skip_name(data, offset):
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += length + 1
+
+
+def parse_response(data, query_id, name):
+    """Return (addresses, minimum TTL) from an A query response"""
+    if len(data) < 12:
+        raise DnsError('short response', name)
+    response_id, flags, qdcount, ancount, _, _ = struct.unpack('!HHHHHH', data[:12])
+    if response_id != query_id:
+        raise DnsError('mismatched response id', name)
+    if flags & FLAG_TC:
+        raise DnsError('truncated', name)
+    rcode = flags & 0x000F
+    if rcode:
+        raise DnsError(RCODES.get(rcode, f'rcode{rcode}'), name)
+
+    offset = 12
+    addresses, ttls = [], []
+    try:
+        for _ in range(qdcount):
+            offset = _skip_name(data, offset) + 4
+
+        for _ in range(ancount):
+            offset = _skip_name(data, offset)
+            rtype, rclass, ttl, rdlength = struct.unpack('!HHIH', data[offset:offset + 10])
+            offset += 10
+            if rtype == TYPE_A and rclass == CLASS_IN and rdlength == 4:
+                if offset + 4 > len(data):
+                    raise DnsError('malformed response', name)
+                addresses.append(socket.inet_ntoa(data[offset:offset + 4]))
+                ttls.append(ttl)
+            elif rtype == TYPE_CNAME:
+                ttls.append(ttl)
+            offset += rdlength
+    except (struct.error, IndexError):
+        # Truncated or corrupt records
+        raise DnsError('malformed response', name) from None
+    if not addresses:
+        raise DnsError('nodata', name)
+    return addresses, min(ttls)
+
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, future, query_id):
+        self.future = future
+        self.query_id = struct.pack('!H', query_id)
+
+    def datagram_received(self, data, addr):
+        # A late answer to an earlier query, or a spoofed one: keep waiting
+        if data[:2] != self.query_id:
+            return
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class DnsResolver:
+    """Asyncio stub resolver for A records that reports TTLs
+
+    Queries go straight to the configured nameserver over UDP (one socket per
+    query, so each uses a fresh source port), which means the measured time
+    is the resolver round trip and nothing else. With cache=True answers are
+    kept until their TTL expires, so callers can take DNS out of other
+    measurements without pinning addresses forever.
+    """
+
+    def __init__(self, nameserver=None, port=53, timeout=2, cache=False, resolv_conf='/etc/resolv.conf'):
+        nameservers, self.search, self.ndots = read_resolv_conf(resolv_conf)
+        self.nameserver = nameserver or nameservers[0]
+        self.port = port
+        self.timeout = timeout
+        self.cache = cache
+        self._cache = {}
+
+    def candidates(self, name):
+        """Names to try for `name`, applying the search list like the system resolver"""
+        if name.endswith('.'):
+            return [name]
+        expanded = [f"{name}.{domain}" for domain in self.search]
+        if name.count('.') >= self.ndots:
+            return [name] + expanded
+        return expanded + [name]
+
+    async def resolve(self, name, use_cache=True):
+        """Resolve a name to IPv4 addresses, returning a DnsAnswer"""
+        try:
+            ipaddress.ip_address(name)
+            return DnsAnswer(name, [name], None, 0.0, cached=True)
+        except ValueError:
+            pass
+
+        if self.cache and use_cache:
+            addresses, expires = self._cache.get(name, (None, 0))
+            remaining = expires - time.monotonic()
+            if remaining > 0:
+                return DnsAnswer(name, addresses, remaining, 0.0, cached=True)
+
+        start = time.perf_counter()
+        error = None
+        for candidate in self.candidates(name):
+            try:
+                addresses, ttl = await self.query(candidate)
+                break
+            except DnsError as e:
+                if e.reason not in ('nxdomain', 'nodata'):
+                    raise
+                error = e
+        else:
+            raise DnsError(error.reason if error else 'nxdomain', name)
+        elapsed = time.perf_counter() - start
+
+        if self.cache and ttl > 0:
+            self._cache[name] = (addresses, time.monotonic() + ttl)
+        return DnsAnswer(name, addresses, ttl, elapsed)
+
+    async def query(self, name):
+        """Send a single A query, returning (addresses, ttl)
+
+        Datagrams that do not carry the query's ID are ignored until the
+        timeout. A truncated answer is retried over TCP, like the system
+        resolver does, rather than returning part of the records.
+        """
+        loop = asyncio.get_running_loop()
+        query_id = random.getrandbits(16)
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _QueryProtocol(future, query_id), remote_addr=(self.nameserver, self.port)
+        )
+        try:
+            transport.sendto(build_query(query_id, name))
+            data = await asyncio.wait_for(future, self.timeout)
+        finally:
+            transport.close()
+        try:
+            return parse_response(data, query_id, name)
+        except DnsError as e:
+            if e.reason != 'truncated':
+                raise
+        return await self.query_tcp(name)
+
+    async def query_tcp(self, name):
+        """Send a single A query over TCP, returning (addresses, ttl)"""
+        query_id = random.getrandbits(16)
+        query = build_query(query_id, name)
+
+        async def exchange():
+            reader, writer = await asyncio.open_connection(self.nameserver, self.port)
+            try:
+                writer.write(struct.pack('!H', len(query)) + query)
+                await writer.drain()
+                length, = struct.unpack('!H', await reader.readexactly(2))
+                return await reader.readexactly(length)
+            finally:
+                writer.close()
+
+        try:
+            data = await asyncio.wait_for(exchange(), self.timeout)
+        except asyncio.IncompleteReadError:
+            raise DnsError('short response', name) from None
+        return parse_response(data, query_id, name)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+
+from k8s.network.http_client import AsyncHttpClient
+from k8s.network.instrumentation import INSTRUMENTATION_METRICS, in_flight
+from k8s.network.tls import tls_handshake
+from k8s.network.udp import send_train
+
+logger = logging.getLogger('network-test')
+
+
+class RateLimiter:
+    """Token bucket pacing samples to `rate` per second, with bursts of up to `burst`
+
+    Tokens may go negative: each caller takes one and sleeps until its share
+    of the debt is paid back, so waiters are released in arrival order at
+    exactly the configured rate without a lock or a refill task.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        """Wait for a token, returning the seconds waited"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        wait = -self._tokens / self.rate
+        await asyncio.sleep(wait)
+        return wait
+
+
+class ProbeEngine:
+    """Run probe coroutines concurrently on a dedicated asyncio event loop
+
+    The loop lives in a daemon thread so synchronous callers (CLI commands,
+    the scheduler thread) can submit work with run() while every probe sample
+    in flight shares the same loop. The semaphore caps how many samples are
+    open at once, regardless of how many targets are configured, and `rate`
+    (samples per second) caps how fast new ones start.
+    """
+
+    def __init__(self, concurrency=100, rate=None, burst=None):
+        self.concurrency = concurrency
+        self.http = AsyncHttpClient()
+        self.loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiter = RateLimiter(rate, burst) if rate else None
+        self._thread = threading.Thread(target=self._run_loop, name='probe-engine', daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the engine loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def gather(self, coros):
+        """Run several coroutines concurrently and return their results in order"""
+        async def _gather():
+            return await asyncio.gather(*coros, return_exceptions=True)
+        return self.run(_gather())
+
+    async def pace(self, probe):
+        """Wait for the probes-per-second budget, if one is set"""
+        if self._limiter is not None:
+            INSTRUMENTATION_METRICS['rate_limit_wait'].labels(probe=probe).observe(await self._limiter.acquire())
+
+    @contextlib.asynccontextmanager
+    async def slot(self, probe):
+        """Hold one sample slot, paced like any sample, for a long-running transfer"""
+        await self.pace(probe)
+        async with self._semaphore:
+            with in_flight(probe):
+                yield
+
+    async def tcp_connect(self, host, port, timeout=5):
+        """Open and close a TCP connection, returning the elapsed seconds"""
+        await self.pace('tcp')
+        async with self._semaphore:
+            with in_flight('tcp'):
+                start_time = time.perf_counter()
+                _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+                elapsed = time.perf_counter() - start_time
+                writer.close()
+                return elapsed
+
+    async def http_get(self, url, timeout=5, reuse=False, stream=False, max_bytes=None, method='GET'):
+        """Issue a GET (or `method`) request; the response carries per-phase timings"""
+        await self.pace('http')
+        async with self._semaphore:
+            with in_flight('http'):
+                return await self.http.request(method, url, timeout=timeout, reuse=reuse, stream=stream, max_bytes=max_bytes)
+
+    async def tls_handshake(self, host, port, context, server_name=None, session=None, timeout=5):
+        """Time a TLS handshake to host:port, returning a TlsHandshake"""
+        await self.pace('tls')
+        async with self._semaphore:
+            with in_flight('tls'):
+                return await asyncio.wait_for(tls_handshake(host, port, context, server_name, session), timeout)
+
+    async def udp_train(self, host, port, packets=100, rate=50, size=64, timeout=1.0):
+        """Send a UDP packet train to an echo responder, returning its TrainResult"""
+        await self.pace('udp')
+        async with self._semaphore:
+            with in_flight('udp'):
+                return await send_train(host, port, packets, rate, size, timeout)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.http.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
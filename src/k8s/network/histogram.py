@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+import math
+import os
+import threading
+import time
+from array import array
+
+# Default Prometheus buckets for probe latencies, in seconds
+DEFAULT_LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def latency_buckets_from_env():
+    """Histogram buckets from LATENCY_BUCKETS (comma-separated seconds)"""
+    buckets = os.environ.get('LATENCY_BUCKETS', '')
+    if not buckets:
+        return DEFAULT_LATENCY_BUCKETS
+    return tuple(sorted(float(b) for b in buckets.split(',') if b.strip()))
+
+
+class LogHistogram:
+    """Log-bucketed histogram with a bounded relative error (HDR-style)
+
+    Bucket i covers [min_value * growth**(i-1), min_value * growth**i), so any
+    quantile is reported within `precision` of the true value. Counts live in a
+    flat array, so recording is an index computation and an increment and the
+    memory used is fixed by the value range, not by the number of samples.
+    """
+
+    def __init__(self, min_value=1e-5, max_value=60.0, precision=0.02):
+        self.min_value = min_value
+        self.max_value = max_value
+        self._log_growth = math.log1p(precision)
+        # Bucket 0 holds underflow, the last bucket holds overflow
+        self._size = int(math.ceil(math.log(max_value / min_value) / self._log_growth)) + 2
+        self.counts = array('I', bytes(4 * self._size))
+        self.reset()
+
+    def reset(self):
+        for i in range(self._size):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value):
+        if value < self.min_value:
+            return 0
+        return min(int(math.log(value / self.min_value) / self._log_growth) + 1, self._size - 1)
+
+    def _value(self, index):
+        """Representative value (bucket midpoint) for a bucket index"""
+        if index == 0:
+            return self.min_value
+        lower = self.min_value * math.exp((index - 1) * self._log_growth)
+        return lower * (1 + math.expm1(self._log_growth) / 2)
+
+    def record(self, value):
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= rank:
+                # Never report beyond the exact extremes we have seen
+                return min(max(self._value(i), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class RollingHistogram:
+    """LogHistogram over a sliding time window
+
+    The window is split into `slots` sub-histograms; the oldest slot is cleared
+    and reused as time moves on, so quantiles reflect roughly the last
+    `window_seconds` without storing individual samples.
+    """
+
+    def __init__(self, window_seconds=300, slots=5, **histogram_args):
+        self.slot_seconds = window_seconds / slots
+        self._slots = [LogHistogram(**histogram_args) for _ in range(slots)]
+        self._epochs = [None] * slots
+        self._histogram_args = histogram_args
+        self._lock = threading.Lock()
+
+    def _slot(self, now):
+        epoch = int(now // self.slot_seconds)
+        i = epoch % len(self._slots)
+        if self._epochs[i] != epoch:
+            self._slots[i].reset()
+            self._epochs[i] = epoch
+        return self._slots[i]
+
+    def record(self, value, now=None):
+        with self._lock:
+            self._slot(time.monotonic() if now is None else now).record(value)
+
+    def snapshot(self, now=None):
+        """Merge the live slots into a single LogHistogram"""
+        now = time.monotonic() if now is None else now
+        oldest = int(now // self.slot_seconds) - len(self._slots) + 1
+        merged = LogHistogram(**self._histogram_args)
+        with self._lock:
+            for epoch, histogram in zip(self._epochs, self._slots):
+                if epoch is not None and epoch >= oldest:
+                    merged.merge(histogram)
+        return merged
+
+
+class LatencyRecorder:
+    """Per-target latency recorder
+
+    Every sample is observed into a cumulative Prometheus histogram (which can
+    be aggregated across replicas with histogram_quantile) and into a rolling
+    window, whose quantiles are published as gauges after each cycle. Series
+    are looked up through `series` (metric.labels by default) on every update,
+    so a registry that tracks or evicts them sees each one.
+    """
+
+    def __init__(self, histogram, quantile_gauge, labels, quantiles=DEFAULT_QUANTILES, window_seconds=300, series=None):
+        self._histogram = histogram
+        self._quantile_gauge = quantile_gauge
+        self._labels = labels
+        self._series = series or (lambda metric, **labels: metric.labels(**labels))
+        self.quantiles = quantiles
+        self.window = RollingHistogram(window_seconds=window_seconds)
+        self.updated = time.monotonic()
+
+    def record(self, seconds):
+        self._series(self._histogram, **self._labels).observe(seconds)
+        self.window.record(seconds)
+        self.updated = time.monotonic()
+
+    def export_quantiles(self):
+        """Publish rolling-window quantiles and return them keyed by quantile"""
+        snapshot = self.window.snapshot()
+        values = {}
+        for q in self.quantiles:
+            value = snapshot.quantile(q)
+            if value is not None:
+                self._series(self._quantile_gauge, quantile=str(q), **self._labels).set(value)
+                values[q] = value
+        return values
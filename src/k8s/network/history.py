@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import math
+import threading
+import time
+from array import array
+
+
+class ResultRing:
+    """Fixed-capacity ring of recent samples for one target
+
+    Samples are kept column-wise in typed arrays (timestamp, latency, status),
+    so a full ring costs 18 bytes per sample and never grows. A failed sample
+    has a NaN latency; status is the HTTP status code, or 0 where there is none.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.latencies = array('d', bytes(8 * capacity))
+        self.statuses = array('H', bytes(2 * capacity))
+        self.count = 0
+        self.total = 0
+        self._next = 0
+
+    def record(self, timestamp, latency, status=0):
+        i = self._next
+        self.timestamps[i] = timestamp
+        self.latencies[i] = math.nan if latency is None else latency
+        self.statuses[i] = status
+        self._next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.total += 1
+
+    def indices(self):
+        """Buffer indices from the oldest sample to the newest"""
+        start = (self._next - self.count) % self.capacity
+        return [(start + i) % self.capacity for i in range(self.count)]
+
+    @property
+    def updated(self):
+        return self.timestamps[(self._next - 1) % self.capacity] if self.count else 0.0
+
+
+class ResultHistory:
+    """Recent probe samples per target, for debugging without Prometheus
+
+    Holds at most `max_targets` rings of `capacity` samples each; when a new
+    target would exceed that, the target updated least recently is dropped,
+    so memory is fixed however long the daemon runs and however targets churn.
+    """
+
+    def __init__(self, capacity=1024, max_targets=1000):
+        self.capacity = capacity
+        self.max_targets = max_targets
+        self._rings = {}
+        self._lock = threading.Lock()
+
+    def record(self, target, latency, status=0, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            ring = self._rings.get(target)
+            if ring is None:
+                if len(self._rings) >= self.max_targets:
+                    oldest = min(self._rings, key=lambda name: self._rings[name].updated)
+                    del self._rings[oldest]
+                ring = self._rings[target] = ResultRing(self.capacity)
+            ring.record(timestamp, latency, status)
+
+    def targets(self):
+        with self._lock:
+            return sorted(self._rings)
+
+    def evict_older_than(self, cutoff):
+        """Drop targets with no samples since cutoff (a time.time() timestamp)"""
+        with self._lock:
+            for target in [t for t, ring in self._rings.items() if ring.updated < cutoff]:
+                del self._rings[target]
+
+    def results(self, target, since=None):
+        """Samples for target newer than since, oldest first, or None for an unknown target"""
+        with self._lock:
+            ring = self._rings.get(target)
+            if ring is None:
+                return None
+            samples = []
+            for i in ring.indices():
+                timestamp = ring.timestamps[i]
+                if since is not None and timestamp <= since:
+                    continue
+                latency = ring.latencies[i]
+                samples.append({
+                    "timestamp": timestamp,
+                    "latency": None if math.isnan(latency) else latency,
+                    "status": ring.statuses[i] or None,
+                })
+            return samples
+
+    def summary(self):
+        """Per-target counts, error ratio and latency quantiles over the buffered samples"""
+        with self._lock:
+            rings = list(self._rings.items())
+            columns = [(target, ring.total, [ring.latencies[i] for i in ring.indices()], ring.updated) for target, ring in rings]
+
+        summary = {}
+        for target, total, latencies, updated in columns:
+            ok = sorted(latency for latency in latencies if not math.isnan(latency))
+            errors = len(latencies) - len(ok)
+            entry = {
+                "samples": len(latencies),
+                "total": total,
+                "errors": errors,
+                "error_ratio": errors / len(latencies) if latencies else 0.0,
+                "last_sample": updated,
+                "last_latency": None if not latencies or math.isnan(latencies[-1]) else latencies[-1],
+            }
+            if ok:
+                entry.update({
+                    "min": ok[0],
+                    "p50": ok[int(0.5 * (len(ok) - 1))],
+                    "p90": ok[int(0.9 * (len(ok) - 1))],
+                    "p99": ok[int(0.99 * (len(ok) - 1))],
+                    "max": ok[-1],
+                })
+            summary[target] = entry
+        return summary
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+import asyncio
+import socket
+import ssl
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+class HttpError(OSError):
+    """Raised when a response cannot be read or parsed"""
+
+
+class HttpResponse:
+
+    def __init__(self, status_code, headers, content, size, timings, reused=False):
+        self.status_code = status_code
+        self.headers = headers
+        # Empty when the body was streamed; size is the number of bytes received
+        self.content = content
+        self.size = size
+        # Seconds per phase; connection phases are absent on a reused connection
+        self.timings = timings
+        self.reused = reused
+
+    @property
+    def elapsed(self):
+        return sum(self.timings.values())
+
+    @property
+    def time_to_last_byte(self):
+        """Seconds from sending the request to receiving the last body byte"""
+        return self.timings['ttfb'] + self.timings['transfer']
+
+    @property
+    def throughput(self):
+        """Body bytes per second over the transfer phase"""
+        transfer = self.timings['transfer']
+        return self.size / transfer if transfer > 0 else 0.0
+
+
+class HttpConnection:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+def parse_url(url):
+    """Split a URL into (scheme, host, port, request target)"""
+    parts = urlsplit(url)
+    scheme = parts.scheme or 'http'
+    if scheme not in DEFAULT_PORTS:
+        raise HttpError(f"Unsupported scheme {scheme}")
+    host = parts.hostname
+    if not host:
+        raise HttpError(f"No host in {url}")
+    port = parts.port or DEFAULT_PORTS[scheme]
+    target = parts.path or '/'
+    if parts.query:
+        target = f"{target}?{parts.query}"
+    return scheme, host, port, target
+
+
+class AsyncHttpClient:
+    """Minimal asyncio HTTP/1.1 client used by the probe engine
+
+    Connections are opened in explicit steps (resolve, connect, TLS) so each
+    phase can be timed with time.perf_counter(). With reuse=True, connections
+    that end a response cleanly are kept per (scheme, host, port) and handed to
+    the next request, so keep-alive samples measure only TTFB and transfer.
+    """
+
+    def __init__(self, ssl_context=None, max_idle_per_host=4, chunk_size=64 * 1024):
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.max_idle_per_host = max_idle_per_host
+        self.chunk_size = chunk_size
+        self._idle = defaultdict(deque)
+
+    async def get(self, url, timeout=5, reuse=False, stream=False, max_bytes=None):
+        return await self.request('GET', url, timeout=timeout, reuse=reuse, stream=stream, max_bytes=max_bytes)
+
+    async def request(self, method, url, timeout=5, reuse=False, stream=False, max_bytes=None):
+        return await asyncio.wait_for(self._request(method, url, reuse, (stream, max_bytes)), timeout)
+
+    async def _request(self, method, url, reuse, body_mode):
+        scheme, host, port, target = parse_url(url)
+        key = (scheme, host, port)
+        request = self._build_request(method, host, port, scheme, target, reuse)
+
+        conn = self._checkout(key) if reuse else None
+        if conn is not None:
+            try:
+                return await self._exchange(conn, key, request, method, body_mode, {}, reuse, reused=True)
+            except (OSError, EOFError):
+                # The server closed an idle connection; retry on a fresh one
+                conn.close()
+
+        timings = {}
+        conn = await self._open(scheme, host, port, timings)
+        return await self._exchange(conn, key, request, method, body_mode, timings, reuse, reused=False)
+
+    async def connect(self, url):
+        """Open a connection for url, returning (HttpConnection, request target, Host header)
+
+        For callers that drive the exchange themselves, e.g. long uploads.
+        """
+        scheme, host, port, target = parse_url(url)
+        conn = await self._open(scheme, host, port, {})
+        return conn, target, self._host_header(scheme, host, port)
+
+    def _host_header(self, scheme, host, port):
+        return host if port == DEFAULT_PORTS[scheme] else f"{host}:{port}"
+
+    async def _open(self, scheme, host, port, timings):
+        loop = asyncio.get_running_loop()
+
+        start = time.perf_counter()
+        addrinfo = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        family, _, _, _, sockaddr = addrinfo[0]
+        timings['dns'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection(sockaddr[0], sockaddr[1], family=family)
+        timings['connect'] = time.perf_counter() - start
+
+        if scheme == 'https':
+            start = time.perf_counter()
+            try:
+                await writer.start_tls(self.ssl_context, server_hostname=host)
+            except BaseException:
+                writer.close()
+                raise
+            timings['tls'] = time.perf_counter() - start
+
+        return HttpConnection(reader, writer)
+
+    async def _exchange(self, conn, key, request, method, body_mode, timings, reuse, reused):
+        keep = False
+        try:
+            start = time.perf_counter()
+            conn.writer.write(request)
+            await conn.writer.drain()
+            version, status_code, headers = await self.read_head(conn.reader)
+            timings['ttfb'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            content, size, complete = await self._read_body(conn.reader, headers, method, *body_mode)
+            timings['transfer'] = time.perf_counter() - start
+
+            connection = headers.get('connection', '').lower()
+            persistent = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+            keep = reuse and complete and persistent
+            return HttpResponse(status_code, headers, content, size, timings, reused=reused)
+        finally:
+            if keep:
+                self._checkin(key, conn)
+            else:
+                conn.close()
+
+    def _checkout(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            conn = idle.pop()
+            if not conn.reader.at_eof() and not conn.writer.is_closing():
+                return conn
+            conn.close()
+        return None
+
+    def _checkin(self, key, conn):
+        idle = self._idle[key]
+        if len(idle) >= self.max_idle_per_host:
+            conn.close()
+        else:
+            idle.append(conn)
+
+    def close(self):
+        """Close all idle pooled connections"""
+        for idle in self._idle.values():
+            while idle:
+                idle.pop().close()
+        self._idle.clear()
+
+    def _build_request(self, method, host, port, scheme, target, keep_alive):
+        return (
+            f"{method} {target} HTTP/1.1\r\n"
+            f"Host: {self._host_header(scheme, host, port)}\r\n"
+            "User-Agent: k8s-network-test\r\n"
+            "Accept: */*\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        ).encode('latin-1')
+
+    async def read_head(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise HttpError("Connection closed before response")
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise HttpError(f"Malformed status line {status_line!r}")
+        status_code = int(parts[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return parts[0], status_code, headers
+
+    async def _read_body(self, reader, headers, method, stream, max_bytes):
+        """Read the response body, returning (content, size, reusable)
+
+        In streaming mode the body is counted block by block and discarded, so
+        memory stays at one chunk no matter how large the response is. Reading
+        stops once max_bytes have been received; the connection is then left
+        mid-body and cannot be reused.
+        """
+        blocks = None if stream else []
+        size = 0
+        truncated = False
+        body = self.iter_body(reader, headers, method, max_bytes)
+        try:
+            async for block in body:
+                size += len(block)
+                if blocks is not None:
+                    blocks.append(block)
+                if max_bytes is not None and size >= max_bytes:
+                    truncated = True
+                    break
+        finally:
+            await body.aclose()
+
+        framed = method == 'HEAD' or 'content-length' in headers or self._is_chunked(headers)
+        # Joined once at the end, so each byte is copied a single time
+        return b''.join(blocks or ()), size, framed and not truncated
+
+    def _is_chunked(self, headers):
+        return headers.get('transfer-encoding', '').lower() == 'chunked'
+
+    async def iter_body(self, reader, headers, method, max_bytes=None):
+        """Yield the response body in blocks of at most chunk_size bytes,
+        never reading past max_bytes"""
+        if method == 'HEAD':
+            return
+        budget = max_bytes if max_bytes is not None else float('inf')
+        if self._is_chunked(headers):
+            while True:
+                size_line = await reader.readline()
+                remaining = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                if remaining == 0:
+                    # Discard trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                while remaining and budget:
+                    block = await reader.readexactly(int(min(remaining, self.chunk_size, budget)))
+                    remaining -= len(block)
+                    budget -= len(block)
+                    yield block
+                await reader.readexactly(2)
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining and budget:
+                block = await reader.readexactly(int(min(remaining, self.chunk_size, budget)))
+                remaining -= len(block)
+                budget -= len(block)
+                yield block
+        else:
+            while budget:
+                block = await reader.read(int(min(self.chunk_size, budget)))
+                if not block:
+                    return
+                budget -= len(block)
+                yield block
@@ -1,29 +1,85 @@
 #!/usr/bin/env python3
 import argparse
+import csv
 import logging
-import time
 import sys
-import threading
 import os
 
-from k8s.health import HealthCheck
-from k8s.network.test import NetworkTest
+from k8s.network.histogram import DEFAULT_QUANTILES
+from k8s.network.http_client import AsyncHttpClient
+from k8s.network.load import LoadGenerator, RateSchedule
+from k8s.network.test import NetworkTest, load_common_config_from_env
 
 logger = logging.getLogger('network-test')
 
 class HttpNetworkTest(NetworkTest):
     
-    def _run_scheduled_tests(self):
-      # HTTP tests
-      for url in self.config.get('http_targets', []):
-          self.run_http_test(url, self.config.get('http_count', 5), quiet=True)
+    def probe_jobs(self):
+      """One job per URL; targets from a targets file are dicts with their own settings"""
+      count = self.config.get('http_count', 5)
+      targets = [target if isinstance(target, dict) else {'url': target} for target in self.config.get('http_targets', [])]
+      return [
+          self.probe_job(
+              f"http:{target['url']}",
+              lambda target=target: self.run_http_test_async(
+                  target['url'],
+                  target.get('count', count),
+                  quiet=True,
+                  timeout=target.get('timeout', 5),
+                  method=target.get('method', 'GET'),
+                  expect_status=target.get('expect_status')
+              ),
+              target.get('interval'),
+              spec=target
+          )
+          for target in targets
+      ]
 
+    def run_load_test(self, url, rate, duration, ramp_to=None, max_in_flight=1000, timeout=5, output=None):
+      """Send open-loop load to url and report achieved rate, errors and latency quantiles"""
+      schedule = RateSchedule(rate, duration, ramp_to)
+      ramp = f" ramping to {schedule.ramp_to:g}/s" if schedule.ramp_to != rate else ""
+      logger.info(f"Sending {schedule.total} requests to {url} at {rate:g}/s{ramp} over {duration:g}s")
 
-def load_config_from_env():
-    """Load configuration from environment variables"""
+      result = self.engine.run(self.run_load_test_async(url, schedule, max_in_flight, timeout))
+
+      logger.info(f"\nLoad Results for {url}:")
+      logger.info(f"  Target rate: {result.target_rate:.1f}/s")
+      logger.info(f"  Sent rate: {result.send_rate:.1f}/s ({result.sent} requests)")
+      logger.info(f"  Completed rate: {result.completed_rate:.1f}/s")
+      logger.info(f"  Errors: {result.errors} ({result.error_ratio:.2%})")
+      logger.info(f"  Status: {', '.join(f'{k}={v}' for k, v in sorted(result.status_classes.items())) or 'none'}")
+      for q in DEFAULT_QUANTILES + (0.999,):
+          value = result.histogram.quantile(q)
+          if value is not None:
+              logger.info(f"  p{q * 100:g}: {value * 1000:.2f} ms")
+      if result.histogram.count:
+          logger.info(f"  Max: {result.histogram.max * 1000:.2f} ms")
+
+      if output:
+          with open(output, 'w', newline='') as f:
+              writer = csv.writer(f)
+              writer.writerow(['second', 'target_rate', 'sent', 'errors'] + [f'p{q * 100:g}_seconds' for q in DEFAULT_QUANTILES])
+              writer.writerows(result.timeseries(DEFAULT_QUANTILES))
+          logger.info(f"Wrote per-second results to {output}")
+      return result
+
+    async def run_load_test_async(self, url, schedule, max_in_flight=1000, timeout=5):
+      """Run a load test on its own connection pool, sized to the in-flight limit"""
+      client = AsyncHttpClient(max_idle_per_host=max_in_flight)
+      try:
+          return await LoadGenerator(client, schedule, max_in_flight, timeout).run(url)
+      finally:
+          client.close()
+
+
+def load_targets_from_env():
+    """Load this probe's targets and settings from environment variables
+
+    Settings shared by every probe type come from load_common_config_from_env.
+    """
     config = {
         'http_targets': [],
-        'interval_seconds': int(os.environ.get('NETWORK_TEST_INTERVAL', 60)),
     }
     
     # Load HTTP targets (comma-separated list of URLs)
@@ -31,6 +87,10 @@ def load_config_from_env():
     if http_targets:
         config['http_targets'] = [url.strip() for url in http_targets.split(',')]
         config['http_count'] = int(os.environ.get('HTTP_COUNT', 3))
+        config['http_mode'] = os.environ.get('HTTP_MODE', 'cold')
+        config['http_stream'] = os.environ.get('HTTP_STREAM', 'false').lower() == 'true'
+        if os.environ.get('HTTP_MAX_BYTES'):
+            config['http_max_bytes'] = int(os.environ['HTTP_MAX_BYTES'])
 
     return config
 
@@ -44,29 +104,47 @@ def main():
     http_parser = subparsers.add_parser('http', help='Test HTTP requests')
     http_parser.add_argument('--url', help='URL to test')
     http_parser.add_argument('--count', type=int, default=5, help='Number of tests to run (default: 5)')
+    http_parser.add_argument('--stream', action='store_true', help='Count the response body in chunks instead of buffering it')
+    http_parser.add_argument('--max-bytes', type=int, help='Stop reading the response body after this many bytes')
+    http_parser.add_argument('--mode', choices=['cold', 'pooled'], help='New connection per request, or reuse keep-alive connections (default: HTTP_MODE or cold)')
     
+    # Open-loop load test
+    load_parser = subparsers.add_parser('load', help='Send requests at a fixed or ramping rate and report latency quantiles')
+    load_parser.add_argument('--url', required=True, help='URL to load')
+    load_parser.add_argument('--rate', type=float, required=True, help='Requests per second (start rate when ramping)')
+    load_parser.add_argument('--ramp-to', type=float, help='Ramp linearly to this rate over the duration')
+    load_parser.add_argument('--duration', type=float, default=30, help='Test duration in seconds (default: 30)')
+    load_parser.add_argument('--max-in-flight', type=int, default=1000, help='Maximum open requests and pooled connections (default: 1000)')
+    load_parser.add_argument('--timeout', type=float, default=5, help='Per-request timeout in seconds (default: 5)')
+    load_parser.add_argument('--output', help='Write per-second rate, errors and latency quantiles to this CSV file')
+
     # Daemon mode for continuous monitoring
     subparsers.add_parser('daemon', help='Run as a daemon for continuous monitoring')
     
     args = parser.parse_args()
 
-    config = load_config_from_env()
+    config = load_common_config_from_env()
+    config.update(load_targets_from_env())
     test = HttpNetworkTest(config)
 
     if args.command == 'http':
+        if args.mode:
+            test.config['http_mode'] = args.mode
+        if args.stream:
+            test.config['http_stream'] = True
+        if args.max_bytes:
+            test.config['http_max_bytes'] = args.max_bytes
         test.run_http_test(args.url, args.count)
+    elif args.command == 'load':
+        if args.rate <= 0 and not args.ramp_to:
+            parser.error('--rate or --ramp-to must be positive')
+        if args.duration <= 0:
+            parser.error('--duration must be positive')
+        test.run_load_test(args.url, args.rate, args.duration, args.ramp_to, args.max_in_flight, args.timeout, args.output)
     elif args.command == 'daemon':
-        # Start scheduler in a separate thread
-        scheduler_thread = threading.Thread(target=test.run_scheduler)
-        scheduler_thread.daemon = True
-        scheduler_thread.start()
-        
-        # Keep main thread alive
         try:
-            while True:
-                time.sleep(1)
+            test.run_scheduler()
         except KeyboardInterrupt:
-          
             logger.info("Shutting down...")
             sys.exit(0)
     else:
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import errno
+import gc
+import ssl
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from collections import deque
+
+from k8s.network.metrics import Counter, Gauge, Histogram
+
+from k8s.network.dns import DnsError
+from k8s.network.http_client import HttpError
+
+# Process CPU and RSS come from prometheus_client's default process collector
+# (process_cpu_seconds_total, process_resident_memory_bytes); these cover the
+# rest of the daemon's view of itself.
+INSTRUMENTATION_METRICS = {
+    'cycle_duration': Histogram('probe_cycle_duration_seconds', 'Wall time of a full cycle over every configured probe; in daemon mode, until every scheduled job has completed a run'),
+    'cycle_cpu': Gauge('probe_cycle_cpu_seconds', 'Process CPU time spent in the last full probe cycle', multiprocess_mode='livesum'),
+    'in_flight': Gauge('probe_samples_in_flight', 'Probe samples currently open on the probe engine', ['probe'], multiprocess_mode='livesum'),
+    'rate_limit_wait': Histogram('probe_rate_limit_wait_seconds', 'Time samples waited for the probes-per-second budget', ['probe'],
+                                 buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)),
+    'errors': Counter('probe_errors', 'Probe sample errors by class (timeout, refused, reset, unreachable, dns, tls, protocol, other)', ['probe', 'error']),
+    'gc_pause': Histogram('python_gc_pause_seconds', 'Time spent in garbage collection passes', ['generation'],
+                          buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)),
+}
+
+UNREACHABLE_ERRNOS = {errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EHOSTDOWN, errno.ENETDOWN}
+
+
+def error_class(exc):
+    """Classify a probe exception for probe_errors_total"""
+    if isinstance(exc, TimeoutError):
+        return 'timeout'
+    if isinstance(exc, ConnectionRefusedError):
+        return 'refused'
+    if isinstance(exc, (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)):
+        return 'reset'
+    if isinstance(exc, ssl.SSLError):
+        return 'tls'
+    if isinstance(exc, DnsError):
+        return 'timeout' if exc.reason == 'timeout' else 'dns'
+    if isinstance(exc, (HttpError, EOFError, ValueError)):
+        return 'protocol'
+    if isinstance(exc, OSError):
+        if getattr(exc, 'errno', None) in UNREACHABLE_ERRNOS:
+            return 'unreachable'
+        if exc.__class__.__name__ == 'gaierror':
+            return 'dns'
+    return 'other'
+
+
+def count_error(probe, exc):
+    INSTRUMENTATION_METRICS['errors'].labels(probe=probe, error=error_class(exc)).inc()
+
+
+def in_flight(probe):
+    """Context manager counting a sample in probe_samples_in_flight"""
+    return INSTRUMENTATION_METRICS['in_flight'].labels(probe=probe).track_inprogress()
+
+
+_gc_started = {}
+# A pass can start while prometheus_client holds its (non-reentrant) value
+# lock, e.g. in the middle of labels(), so the callback only queues pauses
+# and flush_gc_metrics() exports them
+_gc_pauses = deque(maxlen=4096)
+
+
+def _gc_callback(phase, info):
+    if phase == 'start':
+        _gc_started[threading.get_ident()] = time.perf_counter()
+    else:
+        start = _gc_started.pop(threading.get_ident(), None)
+        if start is not None:
+            _gc_pauses.append((info['generation'], time.perf_counter() - start))
+
+
+def install_gc_metrics():
+    """Time every garbage collection pass into python_gc_pause_seconds"""
+    if _gc_callback not in gc.callbacks:
+        gc.callbacks.append(_gc_callback)
+
+
+def flush_gc_metrics():
+    """Export the garbage collection pauses timed since the last flush"""
+    while _gc_pauses:
+        generation, pause = _gc_pauses.popleft()
+        INSTRUMENTATION_METRICS['gc_pause'].labels(generation=str(generation)).observe(pause)
+
+
+class CycleTimer:
+    """Records wall and CPU time of a full probe cycle
+
+    Used as a context manager around a one-shot cycle, or with start() and
+    stop() for the daemon's cycles, which end on a job completion callback.
+    """
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def stop(self):
+        INSTRUMENTATION_METRICS['cycle_duration'].observe(time.perf_counter() - self._start)
+        INSTRUMENTATION_METRICS['cycle_cpu'].set(time.process_time() - self._cpu)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StackSampler:
+    """Sampling profiler over every thread in the process
+
+    Every `interval` seconds the current stack of each thread is taken from
+    sys._current_frames() and counted, which costs nothing while idle and
+    little while sampling. dump() returns the counts in collapsed-stack format
+    ("outer;inner;leaf count" per line), ready for flamegraph tools.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+
+    def sample(self, seconds):
+        stacks = StackCounter()
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+        return stacks
+
+    def dump(self, seconds):
+        stacks = self.sample(seconds)
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import sys
+import logging
+import os
+
+from k8s.network.discovery import EndpointDiscovery, KubeApi, KubeApiError
+from k8s.network.instrumentation import count_error
+from k8s.network.test import METRICS, NetworkTest, load_common_config_from_env
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('network-test')
+
+
+class DiscoveryNetworkTest(NetworkTest):
+    """Probe every ready Service endpoint and Node found through the API server
+
+    Targets are listed once and then kept current by watches, and the
+    scheduler's jobs are updated as endpoints and nodes come and go, so the
+    target list never goes stale as the cluster scales.
+    """
+
+    def __init__(self, config):
+      super().__init__(config)
+      self._discovery = None
+      self._discovery_changed = None
+
+    @property
+    def discovery(self):
+      if self._discovery is None:
+          api = KubeApi(self.config.get('discovery_api_server'), self.config.get('discovery_token'))
+          self._discovery = EndpointDiscovery(
+              api,
+              namespace=self.config.get('discovery_namespace'),
+              service_selector=self.config.get('discovery_service_selector'),
+              nodes=self.config.get('discovery_nodes', True),
+              on_change=self._on_discovery_change
+          )
+      return self._discovery
+
+    def probe_jobs(self):
+      """Jobs for the endpoints and nodes currently known, listing them first if needed"""
+      if not self.config.get('discovery_enabled'):
+          return []
+      if self.discovery.slices.resource_version is None:
+          try:
+              self.engine.run(self.discovery.sync())
+          except (OSError, asyncio.TimeoutError, ValueError) as e:
+              logger.error(f"Discovery failed - {str(e) or type(e).__name__}")
+              return []
+      return self.discovery_jobs()
+
+    def discovery_jobs(self):
+      count = self.config.get('discovery_count', 3)
+      jobs = [
+          self.probe_job(f"endpoint:{endpoint.name}", lambda endpoint=endpoint: self.run_endpoint_test_async(endpoint, count, quiet=True))
+          for endpoint in self.discovery.endpoints()
+      ]
+      port = self.config.get('discovery_node_port', 22)
+      jobs += [
+          self.probe_job(f"discovered-node:{name}", lambda name=name, address=address: self.run_node_test_async(name, address, port, count, quiet=True))
+          for name, address in self.discovery.ready_nodes()
+      ]
+      return jobs
+
+    def background_tasks(self):
+      if not self.config.get('discovery_enabled'):
+          return []
+      return [self._watch_discovery()]
+
+    async def _watch_discovery(self):
+      """Run the watches and apply their changes to the scheduler, batched per second"""
+      self._discovery_changed = asyncio.Event()
+      self.replace_jobs('discovery', self.discovery_jobs())
+      watches = asyncio.ensure_future(self.discovery.run())
+      try:
+          while True:
+              await self._discovery_changed.wait()
+              await asyncio.sleep(1)
+              self._discovery_changed.clear()
+              self.replace_jobs('discovery', self.discovery_jobs())
+      finally:
+          watches.cancel()
+
+    def _on_discovery_change(self):
+      if self._discovery_changed is not None:
+          self._discovery_changed.set()
+
+    async def run_endpoint_test_async(self, endpoint, count=3, quiet=False):
+      """Connect directly to one service endpoint, bypassing kube-proxy"""
+      labels = dict(namespace=endpoint.namespace, service=endpoint.service, pod=endpoint.pod, port=endpoint.port)
+      target = f"endpoint:{endpoint.name}"
+      results = []
+      for i in range(count):
+          try:
+              elapsed = await self.engine.tcp_connect(endpoint.address, endpoint.port, timeout=self.config.get('discovery_timeout', 5))
+          except (OSError, asyncio.TimeoutError) as e:
+              logger.error(f"Error connecting to {endpoint.name} - {str(e) or type(e).__name__}")
+              self.series.labels(METRICS['endpoint_connection_errors'], **labels).inc()
+              count_error('endpoint', e)
+              self.record_sample(target, None)
+          else:
+              self.latency_recorder('endpoint_connection', **labels).record(elapsed)
+              self.record_sample(target, elapsed, timings={'connect': elapsed})
+              results.append(elapsed * 1000)
+          if i < count - 1:
+              await asyncio.sleep(0.2)
+
+      quantiles = self.latency_recorder('endpoint_connection', **labels).export_quantiles()
+      if not quiet:
+          if results:
+              logger.info(f"\nResults for {endpoint.name}:")
+              self._log_summary(results, quantiles)
+          else:
+              logger.warning(f"No successful connections to {endpoint.name}")
+      return results
+
+    async def run_node_test_async(self, name, address, port=22, count=3, quiet=False):
+      """TCP connection test to a discovered node, labeled with its name"""
+      results = []
+      for i in range(count):
+          result = await self.ping_host_async(name, port, timeout=self.config.get('discovery_timeout', 5), address=address)
+          if result is not None:
+              results.append(result * 1000)
+          if i < count - 1:
+              await asyncio.sleep(0.2)
+      self._record_tcp_results(name, port, results, quiet)
+      return results
+
+
+def load_targets_from_env():
+    """Load this probe's targets and settings from environment variables
+
+    Settings shared by every probe type come from load_common_config_from_env.
+    """
+    config = {
+        'discovery_enabled': os.environ.get('DISCOVERY_ENABLED', 'false').lower() == 'true',
+    }
+
+    # Empty API server means the in-cluster service account
+    config['discovery_api_server'] = os.environ.get('DISCOVERY_API_SERVER') or None
+    config['discovery_token'] = os.environ.get('DISCOVERY_TOKEN') or None
+    config['discovery_namespace'] = os.environ.get('DISCOVERY_NAMESPACE') or None
+    config['discovery_service_selector'] = os.environ.get('DISCOVERY_SERVICE_SELECTOR') or None
+    config['discovery_nodes'] = os.environ.get('DISCOVERY_NODES', 'true').lower() == 'true'
+    config['discovery_node_port'] = int(os.environ.get('DISCOVERY_NODE_PORT', 22))
+    config['discovery_count'] = int(os.environ.get('DISCOVERY_COUNT', 3))
+    config['discovery_timeout'] = float(os.environ.get('DISCOVERY_TIMEOUT', 5))
+
+    return config
+
+def main():
+    parser = argparse.ArgumentParser(description='Kubernetes Network Test of discovered Service endpoints and Nodes')
+
+    # Create subparsers for different commands
+    subparsers = parser.add_subparsers(dest='command', help='Test command')
+
+    # List what discovery finds
+    subparsers.add_parser('list', help='List the ready endpoints and nodes discovery finds')
+
+    # Single run over every discovered target
+    subparsers.add_parser('once', help='Probe every discovered endpoint and node once')
+
+    # Daemon mode for continuous monitoring
+    subparsers.add_parser('daemon', help='Run as a daemon for continuous monitoring')
+
+    args = parser.parse_args()
+
+    config = load_common_config_from_env()
+    config.update(load_targets_from_env())
+    config['discovery_enabled'] = True
+    test = DiscoveryNetworkTest(config)
+
+    try:
+        if args.command == 'list':
+            test.engine.run(test.discovery.sync())
+            for endpoint in test.discovery.endpoints():
+                print(f"endpoint {endpoint.name} node={endpoint.node}")
+            for name, address in test.discovery.ready_nodes():
+                print(f"node {name} {address}")
+        elif args.command == 'once':
+            test.run_scheduled_tests()
+        elif args.command == 'daemon':
+            test.run_scheduler()
+        else:
+            parser.print_help()
+            sys.exit(1)
+    except KubeApiError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
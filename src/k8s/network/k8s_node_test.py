@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import json
 import socket
 import time
 import statistics
 import sys
-import requests
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from prometheus_client import start_http_server, Gauge, Counter, Summary
-import threading
-import schedule
+import zlib
+from k8s.network.metrics import Gauge
 import os
 
-from k8s.network.test import NetworkTest
+from k8s.network.instrumentation import count_error
+from k8s.network.test import NetworkTest, load_common_config_from_env
 
 # Configure logging
 logging.basicConfig(
@@ -21,22 +21,179 @@ logging.basicConfig(
 )
 logger = logging.getLogger('network-test')
 
+MESH_METRICS = {
+    'rtt': Gauge('node_mesh_rtt_seconds', 'Median TCP connect time from this node to a peer in the last run', ['source', 'destination'], multiprocess_mode='mostrecent'),
+    'loss': Gauge('node_mesh_loss_ratio', 'Fraction of failed TCP connects from this node to a peer in the last run', ['source', 'destination'], multiprocess_mode='mostrecent'),
+}
+
+def parse_node(entry):
+    """Split a 'name=address' node entry; a bare address is its own name"""
+    name, sep, address = entry.partition('=')
+    if sep:
+        return name.strip(), address.strip()
+    return entry.strip(), entry.strip()
+
+class MeshMatrix:
+    """Latest latency and loss from this node to each peer"""
+
+    def __init__(self, source):
+        self.source = source
+        self.rows = {}
+        self.updated = None
+
+    def update(self, destination, rtt, loss):
+        self.rows[destination] = (rtt, loss)
+        self.updated = time.time()
+
+    def local(self):
+        return {
+            "source": self.source,
+            "rtt_ms": {dest: None if rtt is None else round(rtt * 1000, 3) for dest, (rtt, _) in self.rows.items()},
+            "loss": {dest: round(loss, 3) for dest, (_, loss) in self.rows.items()},
+            "updated": self.updated,
+        }
+
+    @staticmethod
+    def combine(rows, unreachable=()):
+        """Build a compact matrix from per-source rows: a node list plus
+        rtt_ms[i][j] and loss[i][j] from node i to node j (null if unmeasured),
+        and the peer addresses whose row could not be fetched"""
+        nodes = sorted({row["source"] for row in rows} | {dest for row in rows for dest in row["rtt_ms"]})
+        by_source = {row["source"]: row for row in rows}
+        empty = {"rtt_ms": {}, "loss": {}}
+        return {
+            "nodes": nodes,
+            "rtt_ms": [[by_source.get(src, empty)["rtt_ms"].get(dst) for dst in nodes] for src in nodes],
+            "loss": [[by_source.get(src, empty)["loss"].get(dst) for dst in nodes] for src in nodes],
+            "unreachable": sorted(unreachable),
+            "updated": time.time(),
+        }
+
 class NodeNetworkTest(NetworkTest):
+
+    def __init__(self, config):
+      super().__init__(config)
+      self._mesh = None
     
-    def _run_scheduled_tests(self):
-      """Run tests based on configuration"""
-      logger.info("Starting scheduled network tests")
-      config = self.config
-      
-      # Node tests
-      nodes = config.get('nodes', [])
-      if nodes:
-          self.scan_k8s_nodes(
-              nodes, 
-              config.get('node_port', 22),
-              config.get('node_count', 3),
-              quiet=True
+    def probe_jobs(self):
+      """One job per node, or per peer node in mesh mode"""
+      if self.config.get('node_mesh'):
+          return self.mesh_jobs()
+      port = self.config.get('node_port', 22)
+      count = self.config.get('node_count', 3)
+      nodes = [parse_node(node) for node in self.config.get('nodes', [])]
+      return [
+          self.probe_job(f"node:{name}", lambda address=address: self.run_ping_test_async(address, port, count, quiet=True))
+          for name, address in nodes
+      ]
+
+    @property
+    def mesh(self):
+      if self._mesh is None:
+          self._mesh = MeshMatrix(self.config.get('node_name') or socket.gethostname())
+      return self._mesh
+
+    def mesh_peers(self):
+      """(name, address) of every configured node except the one we run on"""
+      own = {self.mesh.source, self.config.get('host_ip')}
+      peers = [parse_node(node) for node in self.config.get('nodes', [])]
+      return [(name, address) for name, address in peers if name not in own and address not in own]
+
+    def mesh_jobs(self):
+      """One job per peer, with first runs staggered evenly over the interval
+
+      Each source starts at a different point in the rotation (derived from
+      its name), so at any moment the N sources are probing different
+      destinations rather than all hitting the same node.
+      """
+      interval = self.config.get('interval_seconds', 60)
+      port = self.config.get('node_port', 22)
+      count = self.config.get('node_count', 3)
+      peers = self.mesh_peers()
+      rotation = zlib.crc32(self.mesh.source.encode()) % max(len(peers), 1)
+      return [
+          self.probe_job(
+              f"mesh:{name}",
+              lambda name=name, address=address: self.run_mesh_probe_async(name, address, port, count),
+              offset=interval * ((i + rotation) % len(peers)) / len(peers)
           )
+          for i, (name, address) in enumerate(peers)
+      ]
+
+    async def run_mesh_probe_async(self, destination, address, port=22, count=3):
+      """Measure median connect time and loss to one peer node"""
+      results = []
+      for i in range(count):
+          try:
+              results.append(await self.engine.tcp_connect(address, port, timeout=self.config.get('node_timeout', 5)))
+              self.record_sample(f"mesh:{destination}", results[-1], timings={'connect': results[-1]})
+          except (OSError, asyncio.TimeoutError) as e:
+              count_error('mesh', e)
+              self.record_sample(f"mesh:{destination}", None)
+              logger.debug(f"Error connecting to {destination} ({address}:{port}) - {str(e) or type(e).__name__}")
+          if i < count - 1:
+              await asyncio.sleep(0.2)
+
+      rtt = statistics.median(results) if results else None
+      loss = 1 - len(results) / count
+      source = self.mesh.source
+      if rtt is not None:
+          self.series.labels(MESH_METRICS['rtt'], source=source, destination=destination).set(rtt)
+      self.series.labels(MESH_METRICS['loss'], source=source, destination=destination).set(loss)
+      self.mesh.update(destination, rtt, loss)
+      return results
+
+    async def mesh_matrix(self, scope="cluster"):
+      """Matrix for /matrix: this node's row, or every mesh pod's row merged
+
+      With scope=cluster the rows of the other mesh pods are fetched from
+      their own /matrix?scope=local, found through the headless mesh service.
+      """
+      if scope == "local":
+          return self.mesh.local()
+      if not self.config.get('mesh_service'):
+          return self.mesh.combine([self.mesh.local()])
+      future = asyncio.run_coroutine_threadsafe(self._fetch_mesh_rows(), self.engine.loop)
+      return self.mesh.combine(*await asyncio.wrap_future(future))
+
+    async def _fetch_mesh_rows(self):
+      """(rows, addresses of the peers that did not return a usable row)
+
+      These lookups and requests serve /matrix rather than measure anything,
+      so they go around the probe rate limit and record no samples.
+      """
+      try:
+          addresses = (await self.resolver.resolve(self.config['mesh_service'], use_cache=False)).addresses
+      except (OSError, asyncio.TimeoutError) as e:
+          logger.error(f"Error resolving mesh service {self.config['mesh_service']} - {str(e) or type(e).__name__}")
+          addresses = []
+      port = self.config.get('health_port', 8080)
+      responses = await asyncio.gather(
+          *(self.engine.http.request('GET', f"http://{address}:{port}/matrix?scope=local", timeout=2) for address in addresses),
+          return_exceptions=True
+      )
+      rows, unreachable = [self.mesh.local()], []
+      for address, response in zip(addresses, responses):
+          if isinstance(response, Exception) or response.status_code != 200:
+              unreachable.append(address)
+              continue
+          try:
+              row = json.loads(response.content)
+              if not isinstance(row.get("rtt_ms"), dict) or not isinstance(row.get("loss"), dict):
+                  raise ValueError("not a matrix row")
+          except (ValueError, AttributeError):
+              logger.debug(f"Invalid /matrix response from mesh peer {address}")
+              unreachable.append(address)
+              continue
+          if row.get("source") != self.mesh.source:
+              rows.append(row)
+      return rows, unreachable
+
+    def create_health_check(self):
+      health_check = super().create_health_check()
+      if self.config.get('node_mesh'):
+          health_check.matrix = self.mesh_matrix
+      return health_check
 
     def scan_k8s_nodes(self, nodes, port=22, count=5, quiet=False):
         """Test connectivity to multiple K8s nodes in parallel"""
@@ -44,23 +201,23 @@ class NodeNetworkTest(NetworkTest):
             logger.info(f"Testing connectivity to {len(nodes)} Kubernetes nodes...")
         results = {}
         
-        with ThreadPoolExecutor(max_workers=min(10, len(nodes))) as executor:
-            future_to_node = {executor.submit(self.run_ping_test, node, port, count, quiet): node for node in nodes}
-            for future in future_to_node:
-                node = future_to_node[future]
-                try:
-                    data = future.result()
-                    results[node] = data
-                except Exception as exc:
-                    logger.error(f'{node} generated an exception: {exc}')
+        # All nodes at once on the probe engine, bounded by its concurrency limit
+        outcomes = self.engine.gather([self.run_ping_test_async(node, port, count, quiet) for node in nodes])
+        for node, data in zip(nodes, outcomes):
+            if isinstance(data, Exception):
+                logger.error(f'{node} generated an exception: {data}')
+            else:
+                results[node] = data
         
         return results
 
-def load_config_from_env():
-    """Load configuration from environment variables"""
+def load_targets_from_env():
+    """Load this probe's targets and settings from environment variables
+
+    Settings shared by every probe type come from load_common_config_from_env.
+    """
     config = {
         'nodes': [],
-        'interval_seconds': int(os.environ.get('NETWORK_TEST_INTERVAL', 60)),
     }
     
     # Load nodes (comma-separated list of node IPs)
@@ -69,6 +226,13 @@ def load_config_from_env():
         config['nodes'] = [node.strip() for node in nodes.split(',')]
         config['node_port'] = int(os.environ.get('NODE_PORT', 22))
         config['node_count'] = int(os.environ.get('NODE_COUNT', 3))
+
+    # Mesh mode: run as a DaemonSet, each pod probing every other node
+    config['node_mesh'] = os.environ.get('NODE_MESH', 'false').lower() == 'true'
+    config['node_name'] = os.environ.get('NODE_NAME')
+    config['host_ip'] = os.environ.get('HOST_IP')
+    # Headless service selecting the mesh pods, used to assemble the full /matrix
+    config['mesh_service'] = os.environ.get('MESH_SERVICE')
     
     return config
 
@@ -80,7 +244,7 @@ def main():
     
     # K8s nodes test
     nodes_parser = subparsers.add_parser('nodes', help='Test connections to multiple K8s nodes')
-    nodes_parser.add_argument('--nodes', required=True, help='Comma-separated list of node IPs')
+    nodes_parser.add_argument('--nodes', required=True, help='Comma-separated list of node IPs (or name=ip)')
     nodes_parser.add_argument('--port', type=int, default=22, help='Port to connect to (default: 22)')
     nodes_parser.add_argument('--count', type=int, default=5, help='Number of tests per node (default: 5)')
     
@@ -89,22 +253,16 @@ def main():
     
     args = parser.parse_args()
 
-    config = load_config_from_env()
+    config = load_common_config_from_env()
+    config.update(load_targets_from_env())
     test = NodeNetworkTest(config)    
 
     if args.command == 'nodes':
-        node_list = [node.strip() for node in args.nodes.split(',')]
+        node_list = [parse_node(node)[1] for node in args.nodes.split(',')]
         test.scan_k8s_nodes(node_list, args.port, args.count)
     elif args.command == 'daemon':
-        # Start scheduler in a separate thread
-        scheduler_thread = threading.Thread(target=test.run_scheduler)
-        scheduler_thread.daemon = True
-        scheduler_thread.start()
-        
-        # Keep main thread alive
         try:
-            while True:
-                time.sleep(1)
+            test.run_scheduler()
         except KeyboardInterrupt:
             logger.info("Shutting down...")
             sys.exit(0)
@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 import argparse
-import time
+import asyncio
 import sys
 import logging
-import threading
 import os
 
-from k8s.network.test import NetworkTest
+from k8s.network.test import NetworkTest, load_common_config_from_env
 
 # Configure logging
 logging.basicConfig(
@@ -17,30 +16,73 @@ logger = logging.getLogger('network-test')
 
 class ServiceNetworkTest(NetworkTest):
 
-  def _run_scheduled_tests(self):
-      """Run tests based on configuration"""
-      logger.info("Starting scheduled network tests")
-      
-      # K8s service tests
-      for service in self.config.get('k8s_services', []):
-          self.test_k8s_service(
-              service['name'], 
-              service.get('namespace', 'default'),
-              service.get('port', 80),
-              service.get('count', 5),
-              quiet=True
+  def probe_jobs(self):
+      """One job per K8s service, each with its own interval and count"""
+      return [
+          self.probe_job(
+              f"svc:{service['name']}.{service.get('namespace', 'default')}:{service.get('port', 80)}",
+              lambda service=service: self.test_k8s_service_async(
+                  service['name'],
+                  service.get('namespace', 'default'),
+                  service.get('port', 80),
+                  service.get('count', 5),
+                  quiet=True,
+                  timeout=service.get('timeout', 5)
+              ),
+              service.get('interval'),
+              spec=service
           )
+          for service in self.config.get('k8s_services', [])
+      ] + [
+          self.probe_job(
+              f"dns:{target['name']}",
+              lambda target=target: self.run_dns_test_async(target['name'], target.get('count', self.config.get('dns_count', 5)), quiet=True),
+              target.get('interval'),
+              spec=target
+          )
+          for target in (target if isinstance(target, dict) else {'name': target} for target in self.config.get('dns_targets', []))
+      ]
 
   def test_k8s_service(self, service_name, namespace="default", port=80, count=10, quiet=False):
       """Test connectivity to a Kubernetes service"""
+      return self.engine.run(self.test_k8s_service_async(service_name, namespace, port, count, quiet))
+
+  async def test_k8s_service_async(self, service_name, namespace="default", port=80, count=10, quiet=False, timeout=5):
+      """Test connectivity to a Kubernetes service on the probe engine
+
+      Each sample resolves the service name as its own timed phase and then
+      connects to the resolved address, so TCP connection time excludes DNS.
+      """
       host = f"{service_name}.{namespace}.svc.cluster.local"
-      return self.run_ping_test(host, port, count, quiet)
+      if not quiet:
+          logger.info(f"Running DNS + TCP connection test to {host}:{port}")
+      results = []
+      dns_results = []
+      for i in range(count):
+          # Fully qualified so the lookup doesn't walk the pod's search list
+          answer = await self.resolve_async(f"{host}.")
+          if answer is not None:
+              if not answer.cached:
+                  dns_results.append(answer.elapsed * 1000)
+              result = await self.ping_host_async(host, port, timeout, address=answer.addresses[0])
+              if result is not None:
+                  results.append(result * 1000)
+                  if not quiet:
+                      logger.info(f"Sample {i+1}/{count}: dns {answer.elapsed * 1000:.2f} ms{' (cached)' if answer.cached else ''}, connect {result * 1000:.2f} ms")
+          if i < count - 1:
+              await asyncio.sleep(0.2)  # Short delay between samples
+
+      self._record_dns_results(f"{host}.", dns_results, quiet)
+      self._record_tcp_results(host, port, results, quiet)
+      return results
 
-def load_config_from_env():
-    """Load configuration from environment variables"""
+def load_targets_from_env():
+    """Load this probe's targets and settings from environment variables
+
+    Settings shared by every probe type come from load_common_config_from_env.
+    """
     config = {
         'k8s_services': [],
-        'interval_seconds': int(os.environ.get('NETWORK_TEST_INTERVAL', 60)),
     }
     
     # Load K8s services (comma-separated list of service:namespace:port)
@@ -59,6 +101,19 @@ def load_config_from_env():
                 'count': int(os.environ.get('SERVICE_COUNT', 5))
             })
 
+    # DNS resolver settings; DNS_CACHE keeps answers for their TTL so
+    # service probes measure TCP connect without a lookup every sample
+    if os.environ.get('DNS_SERVER'):
+        config['dns_server'] = os.environ['DNS_SERVER']
+    config['dns_timeout'] = float(os.environ.get('DNS_TIMEOUT', 2))
+    config['dns_cache'] = os.environ.get('DNS_CACHE', 'false').lower() == 'true'
+
+    # DNS-only targets (comma-separated names)
+    dns_targets = os.environ.get('DNS_TARGETS', '')
+    if dns_targets:
+        config['dns_targets'] = [name.strip() for name in dns_targets.split(',')]
+        config['dns_count'] = int(os.environ.get('DNS_COUNT', 5))
+
     return config
 
 def main():
@@ -74,29 +129,32 @@ def main():
     k8s_parser.add_argument('--port', type=int, default=80, help='Port to connect to (default: 80)')
     k8s_parser.add_argument('--count', type=int, default=10, help='Number of tests to run (default: 10)')
     
+    # DNS-only test
+    dns_parser = subparsers.add_parser('dns', help='Test DNS resolution against the configured resolver')
+    dns_parser.add_argument('name', help='Name to resolve')
+    dns_parser.add_argument('--server', help='Nameserver to query (default: DNS_SERVER or first in /etc/resolv.conf)')
+    dns_parser.add_argument('--count', type=int, default=10, help='Number of lookups to run (default: 10)')
+    
     # Daemon mode for continuous monitoring
     daemon_parser = subparsers.add_parser('daemon', help='Run as a daemon for continuous monitoring')
     daemon_parser.add_argument('--port', type=int, default=8000, help='Port for Prometheus metrics (default: 8000)')
     
     args = parser.parse_args()
 
-    config = load_config_from_env()
+    config = load_common_config_from_env()
+    config.update(load_targets_from_env())
     print(config)
     test = ServiceNetworkTest(config)
     
     if args.command == 'service':
         test.test_k8s_service(args.service, args.namespace, args.port, args.count)
+    elif args.command == 'dns':
+        if args.server:
+            test.config['dns_server'] = args.server
+        test.engine.run(test.run_dns_test_async(args.name, args.count))
     elif args.command == 'daemon':
-        
-        # Start scheduler in a separate thread
-        scheduler_thread = threading.Thread(target=test.run_scheduler)
-        scheduler_thread.daemon = True
-        scheduler_thread.start()
-        
-        # Keep main thread alive
         try:
-            while True:
-                time.sleep(1)
+            test.run_scheduler()
         except KeyboardInterrupt:
             logger.info("Shutting down...")
             sys.exit(0)
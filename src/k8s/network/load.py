@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import asyncio
+import math
+import time
+
+from k8s.network.histogram import LogHistogram
+
+
+class RateSchedule:
+    """Intended send times for a constant request rate or a linear ramp
+
+    With ramp_to set the rate moves linearly from `rate` to `ramp_to` over
+    `duration`, so request i is due when the integral of the rate reaches i.
+    """
+
+    def __init__(self, rate, duration, ramp_to=None):
+        if duration <= 0:
+            raise ValueError(f"duration must be positive, got {duration}")
+        self.rate = rate
+        self.duration = duration
+        self.ramp_to = rate if ramp_to is None else ramp_to
+        self._slope = (self.ramp_to - self.rate) / duration
+        self.total = int(duration * (self.rate + self.ramp_to) / 2)
+
+    def rate_at(self, elapsed):
+        return self.rate + self._slope * elapsed
+
+    def send_time(self, i):
+        """Seconds after the start at which request i is due, or None past the end"""
+        if i >= self.total:
+            return None
+        if self._slope == 0:
+            return i / self.rate
+        discriminant = self.rate * self.rate + 2 * self._slope * i
+        if discriminant < 0:
+            return None
+        return (math.sqrt(discriminant) - self.rate) / self._slope
+
+
+class LoadResult:
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.histogram = LogHistogram()
+        # Per second of the schedule: [histogram, sent, errors]
+        self.seconds = [[LogHistogram(), 0, 0] for _ in range(int(math.ceil(schedule.duration)))]
+        self.sent = 0
+        self.errors = 0
+        self.status_classes = {}
+        self.send_elapsed = 0.0
+        self.elapsed = 0.0
+
+    def _bucket(self, second):
+        return self.seconds[min(second, len(self.seconds) - 1)]
+
+    def mark_sent(self, second):
+        self.sent += 1
+        self._bucket(second)[1] += 1
+
+    def record(self, second, latency, status_code=None):
+        bucket = self._bucket(second)
+        if status_code is None:
+            self.errors += 1
+            bucket[2] += 1
+            return
+        status_class = f"{status_code // 100}xx"
+        self.status_classes[status_class] = self.status_classes.get(status_class, 0) + 1
+        self.histogram.record(latency)
+        bucket[0].record(latency)
+
+    @property
+    def target_rate(self):
+        return self.schedule.total / self.schedule.duration
+
+    @property
+    def send_rate(self):
+        return self.sent / self.send_elapsed if self.send_elapsed > 0 else 0.0
+
+    @property
+    def completed_rate(self):
+        completed = self.sent - self.errors
+        return completed / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def error_ratio(self):
+        return self.errors / self.sent if self.sent else 0.0
+
+    def timeseries(self, quantiles):
+        """Rows of (second, target rate, sent, errors, *latency quantiles)"""
+        rows = []
+        for second, (histogram, sent, errors) in enumerate(self.seconds):
+            rows.append(
+                (second, round(self.schedule.rate_at(second + 0.5), 3), sent, errors)
+                + tuple(histogram.quantile(q) for q in quantiles)
+            )
+        return rows
+
+
+class LoadGenerator:
+    """Open-loop HTTP load at a scheduled rate
+
+    Requests are sent when the schedule says they are due, whether or not
+    earlier requests have completed, and latency is measured from the intended
+    send time rather than the actual one. When the target stalls, requests
+    that queue behind the stall are charged for the wait instead of silently
+    not being sent (coordinated omission). `max_in_flight` bounds open
+    requests; once it is reached sending falls behind the schedule and that
+    lag shows up in the recorded latencies.
+    """
+
+    def __init__(self, client, schedule, max_in_flight=1000, timeout=5):
+        self.client = client
+        self.schedule = schedule
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+
+    async def run(self, url):
+        result = LoadResult(self.schedule)
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+
+        start = time.perf_counter()
+        i = 0
+        while True:
+            offset = self.schedule.send_time(i)
+            if offset is None:
+                break
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await slots.acquire()
+            task = asyncio.ensure_future(self._send(url, start + offset, int(offset), slots, result))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            result.mark_sent(int(offset))
+            i += 1
+        result.send_elapsed = time.perf_counter() - start
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    async def _send(self, url, intended, second, slots, result):
+        try:
+            response = await self.client.get(url, timeout=self.timeout, reuse=True)
+            result.record(second, time.perf_counter() - intended, response.status_code)
+        except (OSError, asyncio.TimeoutError, EOFError, ValueError):
+            result.record(second, None)
+        finally:
+            slots.release()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import threading
+
+# Every metric declared so far, created together when metrics are enabled
+_declared = []
+_enabled = False
+_lock = threading.Lock()
+
+
+class _NullMetric:
+    """Stands in for every metric and labeled child until metrics are enabled; all updates are dropped"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def _ignore(self, *args, **kwargs):
+        return self
+
+    def __getattr__(self, name):
+        return self._ignore
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_METRIC = _NullMetric()
+
+
+class LazyMetric:
+    """A prometheus_client metric declared at import time and created when metrics are enabled
+
+    One-shot commands print their results and never export metrics, so
+    importing prometheus_client and registering every metric would only
+    slow their startup. Until enable() is called, updates go to a null
+    metric; afterwards every declared metric exists, so scrapes see counters
+    still at zero too. _name and _labelnames match prometheus_client's, for
+    SeriesRegistry, without creating the metric.
+    """
+
+    def __init__(self, kind, name, documentation, labelnames=(), **kwargs):
+        self._kind = kind
+        self._args = (name, documentation, labelnames)
+        self._kwargs = kwargs
+        self._labelnames = tuple(labelnames)
+        # prometheus_client stores counter names without the _total suffix
+        self._name = name[:-len('_total')] if kind == 'Counter' and name.endswith('_total') else name
+        self._metric = None
+        with _lock:
+            _declared.append(self)
+        if _enabled:
+            self._resolve()
+
+    def _resolve(self):
+        metric = self._metric
+        if metric is None:
+            if not _enabled:
+                return NULL_METRIC
+            with _lock:
+                if self._metric is None:
+                    import prometheus_client
+                    self._metric = getattr(prometheus_client, self._kind)(*self._args, **self._kwargs)
+                metric = self._metric
+        return metric
+
+    def labels(self, *args, **kwargs):
+        return self._resolve().labels(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+def Counter(name, documentation, labelnames=(), **kwargs):
+    return LazyMetric('Counter', name, documentation, labelnames, **kwargs)
+
+
+def Gauge(name, documentation, labelnames=(), **kwargs):
+    return LazyMetric('Gauge', name, documentation, labelnames, **kwargs)
+
+
+def Histogram(name, documentation, labelnames=(), **kwargs):
+    return LazyMetric('Histogram', name, documentation, labelnames, **kwargs)
+
+
+def Summary(name, documentation, labelnames=(), **kwargs):
+    return LazyMetric('Summary', name, documentation, labelnames, **kwargs)
+
+
+def enable():
+    """Create every declared metric, and from now on every new one as it is declared
+
+    Called wherever metrics can be exported: daemon mode and the health server.
+    """
+    global _enabled
+    _enabled = True
+    with _lock:
+        declared = list(_declared)
+    for metric in declared:
+        metric._resolve()
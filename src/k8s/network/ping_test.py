@@ -1,12 +1,10 @@
 #!/usr/bin/env python3
 import argparse
-import time
 import sys
 import logging
-import threading
 import os
 
-from k8s.network.test import NetworkTest
+from k8s.network.test import NetworkTest, load_common_config_from_env
 
 # Configure logging
 logging.basicConfig(
@@ -17,27 +15,31 @@ logger = logging.getLogger('network-test')
 
 class PingNetworkTest(NetworkTest):
 
-  def _run_scheduled_tests(self):
-    """Run tests based on configuration"""
-    logger.info("Starting scheduled network tests")
-    
-    # TCP tests
-    for target in self.config.get('tcp_targets', []):
-        self.run_ping_test(
-            target['host'], 
-            target.get('port', 80), 
-            target.get('count', 5),
-            quiet=True
+  def probe_jobs(self):
+    """One job per TCP target, each with its own interval and count"""
+    return [
+        self.probe_job(
+            f"tcp:{target['host']}:{target.get('port', 80)}",
+            lambda target=target: self.run_ping_test_async(
+                target['host'],
+                target.get('port', 80),
+                target.get('count', 5),
+                quiet=True,
+                timeout=target.get('timeout', 5)
+            ),
+            target.get('interval'),
+            spec=target
         )
+        for target in self.config.get('tcp_targets', [])
+    ]
+
+def load_targets_from_env():
+    """Load this probe's targets and settings from environment variables
 
-def load_config_from_env():
-    """Load configuration from environment variables"""
+    Settings shared by every probe type come from load_common_config_from_env.
+    """
     config = {
         'tcp_targets': [],
-        'http_targets': [],
-        'k8s_services': [],
-        'nodes': [],
-        'interval_seconds': int(os.environ.get('NETWORK_TEST_INTERVAL', 60)),
     }
     
     # Load TCP targets (comma-separated list of host:port)
@@ -73,21 +75,15 @@ def main():
     
     args = parser.parse_args()
 
-    config = load_config_from_env()
+    config = load_common_config_from_env()
+    config.update(load_targets_from_env())
     test = PingNetworkTest(config)
     
     if args.command == 'ping':
         test.run_ping_test(args.host, args.port, args.count)
     elif args.command == 'daemon':
-        # Start scheduler in a separate thread
-        scheduler_thread = threading.Thread(target=test.run_scheduler)
-        scheduler_thread.daemon = True
-        scheduler_thread.start()
-        
-        # Keep main thread alive
         try:
-            while True:
-                time.sleep(1)
+            test.run_scheduler()
         except KeyboardInterrupt:
             logger.info("Shutting down...")
             sys.exit(0)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+# Segment header: magic and version
+MAGIC = b'NTSLOG01'
+HEADER_SIZE = len(MAGIC)
+
+# One record per sample: timestamp, target id, status, flags, then phase
+# timings and the total in seconds (NaN where a phase does not apply).
+# 40 bytes, so doubles stay 8-byte aligned after the header and the
+# columns can be read as strided memoryviews.
+RECORD = struct.Struct('<dIHH6f')
+RECORD_SIZE = RECORD.size
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'transfer')
+FLAG_ERROR = 1
+
+TARGETS_FILE = 'targets.tsv'
+SEGMENT_PREFIX = 'samples-'
+SEGMENT_SUFFIX = '.bin'
+
+NAN = math.nan
+
+
+class SampleLog:
+    """Append-only log of raw probe samples in rotating fixed-width segments
+
+    Each sample is one RECORD; targets are stored as ids, with the id to
+    name mapping appended to targets.tsv in the same directory. A segment is
+    closed once it reaches `segment_bytes` and the oldest segments beyond
+    `max_segments` are deleted, so the log uses bounded disk space. Writes
+    are buffered and flushed after each probe run.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, max_segments=16):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        os.makedirs(directory, exist_ok=True)
+        self._targets = read_targets(directory)
+        self._targets_file = open(os.path.join(directory, TARGETS_FILE), 'a')
+        self._segment = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _target_id(self, target):
+        target_id = self._targets.get(target)
+        if target_id is None:
+            target_id = self._targets[target] = len(self._targets)
+            self._targets_file.write(f"{target_id}\t{target}\n")
+            self._targets_file.flush()
+        return target_id
+
+    def _rotate(self):
+        if self._segment is not None:
+            self._segment.close()
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{time.time_ns()}{SEGMENT_SUFFIX}")
+        self._segment = open(path, 'wb')
+        self._segment.write(MAGIC)
+        self._size = HEADER_SIZE
+        for old in segments(self.directory)[:-self.max_segments]:
+            os.remove(old)
+
+    def append(self, target, latency, status=0, timings=None, timestamp=None):
+        """Append one sample; latency None marks a failed sample"""
+        timings = timings or {}
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if self._segment is None or self._size + RECORD_SIZE > self.segment_bytes:
+                self._rotate()
+            self._segment.write(RECORD.pack(
+                timestamp,
+                self._target_id(target),
+                status,
+                FLAG_ERROR if latency is None else 0,
+                *(timings.get(phase, NAN) for phase in PHASES),
+                NAN if latency is None else latency
+            ))
+            self._size += RECORD_SIZE
+
+    def flush(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment.flush()
+
+    def close(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            self._targets_file.close()
+
+
+def read_targets(directory):
+    """Target name -> id mapping of a sample log directory"""
+    targets = {}
+    try:
+        with open(os.path.join(directory, TARGETS_FILE)) as f:
+            for line in f:
+                target_id, _, target = line.rstrip('\n').partition('\t')
+                if target:
+                    targets[target] = int(target_id)
+    except FileNotFoundError:
+        pass
+    return targets
+
+
+def segments(directory):
+    """Segment paths, oldest first"""
+    names = [n for n in os.listdir(directory) if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX)]
+    names.sort(key=lambda n: int(n[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+    return [os.path.join(directory, n) for n in names]
+
+
+def iter_columns(path, chunk_records=65536):
+    """Yield column chunks of a segment: (timestamps, target ids, statuses, flags, totals)
+
+    The segment is memory-mapped and each column is read as a strided view,
+    so only `chunk_records` records are materialised at a time. A partially
+    written trailing record is ignored.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        count = (size - HEADER_SIZE) // RECORD_SIZE if size > HEADER_SIZE else 0
+        if count <= 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:HEADER_SIZE] != MAGIC:
+                raise ValueError(f"{path} is not a sample log segment")
+            for start in range(0, count, chunk_records):
+                end = min(start + chunk_records, count)
+                with memoryview(mm)[HEADER_SIZE + start * RECORD_SIZE:HEADER_SIZE + end * RECORD_SIZE] as view:
+                    columns = (
+                        view.cast('d')[0::5].tolist(),
+                        view.cast('I')[2::10].tolist(),
+                        view.cast('H')[6::20].tolist(),
+                        view.cast('H')[7::20].tolist(),
+                        view.cast('f')[9::10].tolist(),
+                    )
+                yield columns
+
+
+def iter_records(path, chunk_records=65536):
+    """Yield full records of a segment as tuples in RECORD field order"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = HEADER_SIZE + max((size - HEADER_SIZE) // RECORD_SIZE, 0) * RECORD_SIZE
+        if end <= HEADER_SIZE:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            step = chunk_records * RECORD_SIZE
+            for offset in range(HEADER_SIZE, end, step):
+                yield from RECORD.iter_unpack(mm[offset:min(offset + step, end)])
+
+
+def _quantile(ordered, q):
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def minute_quantiles(directory, since=None, until=None, target=None, quantiles=(0.5, 0.9, 0.99)):
+    """Stream (minute, target, count, errors, *quantiles, max) rows across all segments
+
+    A (target, minute) bucket is emitted once samples are more than a minute
+    past it, so memory holds only the buckets still open.
+    """
+    names = {target_id: name for name, target_id in read_targets(directory).items()}
+    only = None
+    if target is not None:
+        only = {target_id for target_id, name in names.items() if name == target}
+    open_buckets = {}
+
+    def emit(key):
+        minute, target_id = key
+        latencies, errors = open_buckets.pop(key)
+        ordered = sorted(latencies)
+        values = tuple(_quantile(ordered, q) if ordered else None for q in quantiles)
+        return (minute, names.get(target_id, str(target_id)), len(latencies) + errors, errors) + values + (ordered[-1] if ordered else None,)
+
+    for path in segments(directory):
+        for timestamps, target_ids, _, flags, totals in iter_columns(path):
+            newest = 0
+            for timestamp, target_id, flag, total in zip(timestamps, target_ids, flags, totals):
+                if (since is not None and timestamp < since) or (until is not None and timestamp >= until):
+                    continue
+                if only is not None and target_id not in only:
+                    continue
+                minute = int(timestamp // 60) * 60
+                if minute > newest:
+                    newest = minute
+                bucket = open_buckets.get((minute, target_id))
+                if bucket is None:
+                    bucket = open_buckets[(minute, target_id)] = [array('f'), 0]
+                if flag & FLAG_ERROR:
+                    bucket[1] += 1
+                else:
+                    bucket[0].append(total)
+            for key in sorted(k for k in open_buckets if k[0] < newest - 60):
+                yield emit(key)
+    for key in sorted(open_buckets):
+        yield emit(key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read a network-test sample log')
+    parser.add_argument('directory', help='Sample log directory (SAMPLE_LOG_DIR)')
+
+    # Options shared by every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--since', type=float, help='Only samples at or after this unix time')
+    common.add_argument('--until', type=float, help='Only samples before this unix time')
+    common.add_argument('--output', help='Write CSV here instead of stdout')
+
+    subparsers = parser.add_subparsers(dest='command', help='Command')
+    quantiles_parser = subparsers.add_parser('quantiles', parents=[common], help='Latency quantiles per target per minute')
+    quantiles_parser.add_argument('--target', help='Only this target (e.g. http:http://frontend/health)')
+    subparsers.add_parser('export', parents=[common], help='Every sample as a CSV row')
+    subparsers.add_parser('targets', parents=[common], help='List the targets in the log')
+
+    args = parser.parse_args()
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    writer = csv.writer(out)
+    start = time.perf_counter()
+    rows = 0
+
+    if args.command == 'quantiles':
+        writer.writerow(['minute', 'target', 'samples', 'errors', 'p50_seconds', 'p90_seconds', 'p99_seconds', 'max_seconds'])
+        for minute, *rest in minute_quantiles(args.directory, args.since, args.until, args.target):
+            writer.writerow([datetime.fromtimestamp(minute, timezone.utc).isoformat()] + rest)
+            rows += rest[1]
+    elif args.command == 'export':
+        names = {target_id: name for name, target_id in read_targets(args.directory).items()}
+        writer.writerow(['timestamp', 'target', 'status', 'error'] + [f'{phase}_seconds' for phase in PHASES] + ['total_seconds'])
+        for path in segments(args.directory):
+            for timestamp, target_id, status, flags, *timings in iter_records(path):
+                if (args.since is not None and timestamp < args.since) or (args.until is not None and timestamp >= args.until):
+                    continue
+                writer.writerow(
+                    [timestamp, names.get(target_id, target_id), status or '', flags & FLAG_ERROR]
+                    + ['' if math.isnan(t) else t for t in timings]
+                )
+                rows += 1
+    elif args.command == 'targets':
+        for target, target_id in sorted(read_targets(args.directory).items(), key=lambda item: item[1]):
+            writer.writerow([target_id, target])
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+    if out is not sys.stdout:
+        out.close()
+    elapsed = time.perf_counter() - start
+    if rows:
+        print(f"Read {rows} samples in {elapsed:.2f}s ({rows / elapsed:,.0f} samples/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import asyncio
+import contextvars
+import logging
+import random
+import time
+
+from k8s.network.metrics import Counter, Gauge, Histogram
+from k8s.network.series import SeriesRegistry
+
+logger = logging.getLogger('network-test')
+
+SCHEDULER_METRICS = {
+    'lag': Gauge('probe_scheduling_lag_seconds', 'Delay between when a probe run was due and when it started', ['probe_job'], multiprocess_mode='mostrecent'),
+    'skipped': Counter('probe_runs_skipped_total', 'Probe runs skipped because the previous run was still in progress', ['probe_job']),
+    'runs': Counter('probe_runs_total', 'Probe runs started', ['probe_job']),
+    'delay': Histogram('probe_scheduling_delay_seconds', 'Delay between when a probe run was due and when it started, by probe type', ['probe'],
+                       buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)),
+    'duration': Histogram('probe_run_duration_seconds', 'Wall time of a probe run, by probe type', ['probe'],
+                          buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)),
+    'in_flight': Gauge('probe_runs_in_flight', 'Probe runs currently in progress, by probe type', ['probe'], multiprocess_mode='livesum'),
+}
+
+# Series labeled by job name, removed with the job
+JOB_METRICS = ('lag', 'skipped', 'runs')
+
+# Name of the job whose run the current task belongs to, so samples can be
+# attributed to jobs without threading the job through every probe call
+CURRENT_JOB = contextvars.ContextVar('probe_job', default=None)
+
+
+class ProbeJob:
+    """A probe that runs every `interval` seconds
+
+    `run` is a zero-argument callable returning a coroutine, so a fresh
+    coroutine is created for every run. `offset` fixes the delay before the
+    first run instead of drawing it from the scheduler's random jitter.
+    `spec` is the target settings the job was built from, compared on config
+    reloads to tell which jobs changed.
+    """
+
+    def __init__(self, name, interval, run, offset=None, spec=None):
+        self.name = name
+        self.interval = interval
+        self.base_interval = interval
+        self.run = run
+        self.offset = offset
+        self.spec = spec
+        self.next_run = None
+        self.task = None
+
+    @property
+    def probe(self):
+        """Probe type, the job name up to the first colon (http, tcp, dns, ...)"""
+        return self.name.split(':', 1)[0]
+
+
+class ProbeScheduler:
+    """Fixed-rate scheduler for probe jobs on an asyncio loop
+
+    Run times are computed from each job's first run (first + n * interval), so
+    a slow run never pushes later runs back. If a job is still running when it
+    is due again, that run is skipped and counted instead of overlapping. The
+    first run of each job is offset by a random jitter so replicas started
+    together don't probe in lockstep. The loop sleeps until the next due job,
+    so an idle daemon does no polling.
+    """
+
+    def __init__(self, jitter=None, on_complete=None, series=None):
+        self.jitter = jitter
+        self.on_complete = on_complete
+        # Per-job series go through the registry, so the series cap applies to them
+        self.series = series if series is not None else SeriesRegistry()
+        self.jobs = {}
+        self._wakeup = None
+
+    def add(self, job):
+        if job.offset is not None:
+            delay = job.offset
+        else:
+            jitter = job.interval if self.jitter is None else min(self.jitter, job.interval)
+            delay = random.uniform(0, jitter)
+        job.next_run = time.monotonic() + delay
+        self.jobs[job.name] = job
+        self._wake()
+
+    def remove(self, name):
+        job = self.jobs.pop(name, None)
+        if job is not None and job.task is not None:
+            job.task.cancel()
+        for key in JOB_METRICS:
+            self.series.remove(SCHEDULER_METRICS[key], probe_job=name)
+        self._wake()
+
+    def set_interval(self, job, interval):
+        """Change a job's interval, spacing its next run from the slot it last ran in"""
+        if interval == job.interval or job.next_run is None:
+            job.interval = interval
+            return
+        job.next_run += interval - job.interval
+        job.interval = interval
+        self._wake()
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        """Run jobs until cancelled"""
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                now = time.monotonic()
+                for job in list(self.jobs.values()):
+                    if job.next_run <= now:
+                        self._start(job, now)
+                delay = min((job.next_run for job in self.jobs.values()), default=now + 60) - time.monotonic()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(delay, 0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for job in self.jobs.values():
+                if job.task is not None:
+                    job.task.cancel()
+
+    def _start(self, job, now):
+        due = job.next_run
+        # Advance to the next slot on the fixed grid, skipping any that were missed
+        missed = int((now - due) // job.interval)
+        job.next_run = due + (missed + 1) * job.interval
+
+        if job.task is not None and not job.task.done():
+            self.series.labels(SCHEDULER_METRICS['skipped'], probe_job=job.name).inc(missed + 1)
+            logger.warning(f"Skipping {job.name}: previous run still in progress")
+            return
+
+        lag = now - (due + missed * job.interval)
+        self.series.labels(SCHEDULER_METRICS['lag'], probe_job=job.name).set(lag)
+        SCHEDULER_METRICS['delay'].labels(probe=job.probe).observe(lag)
+        self.series.labels(SCHEDULER_METRICS['runs'], probe_job=job.name).inc()
+        job.task = asyncio.get_running_loop().create_task(self._run_job(job))
+
+    async def _run_job(self, job):
+        start = time.perf_counter()
+        CURRENT_JOB.set(job.name)
+        try:
+            with SCHEDULER_METRICS['in_flight'].labels(probe=job.probe).track_inprogress():
+                await job.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Probe {job.name} failed - {e}")
+        SCHEDULER_METRICS['duration'].labels(probe=job.probe).observe(time.perf_counter() - start)
+        if self.on_complete is not None:
+            self.on_complete(job)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+from k8s.network.metrics import Counter, Gauge
+
+SERIES_METRICS = {
+    'series': Gauge('metric_series', 'Labeled probe series currently exported', multiprocess_mode='livesum'),
+    'evicted': Counter('metric_series_evicted_total', 'Probe series removed after not being updated for several cycles', ['metric']),
+    'overflow': Counter('metric_series_overflow_total', 'Updates dropped because the series cap was reached', ['metric']),
+}
+
+
+def status_class(status_code):
+    """Bucket an HTTP status code into its class (2xx, 5xx, ...)"""
+    return f"{status_code // 100}xx"
+
+
+class _DroppedSeries:
+    """Stands in for a series over the cap, ignoring every update"""
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+class SeriesRegistry:
+    """Tracks labeled probe series so they can be capped and evicted
+
+    Every update goes through labels(), which records when the series was
+    last touched. Series not updated for `stale_after` seconds (a few probe
+    cycles) are removed from their metric, so targets that leave the config
+    stop being exported. Once `max_series` series exist, updates to new ones
+    are dropped and counted instead of growing the scrape without bound.
+    """
+
+    def __init__(self, max_series=10000, stale_after=None):
+        self.max_series = max_series
+        self.stale_after = stale_after
+        # (metric, label values) -> time of the last update
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def labels(self, metric, **labels):
+        values = tuple(str(labels[name]) for name in metric._labelnames)
+        key = (metric, values)
+        with self._lock:
+            if key not in self._series:
+                if len(self._series) >= self.max_series:
+                    SERIES_METRICS['overflow'].labels(metric=metric._name).inc()
+                    return _DroppedSeries()
+                SERIES_METRICS['series'].set(len(self._series) + 1)
+            self._series[key] = time.monotonic()
+        return metric.labels(*values)
+
+    def remove(self, metric, **labels):
+        """Remove one series now, e.g. an info series whose label values changed"""
+        values = tuple(str(labels[name]) for name in metric._labelnames)
+        with self._lock:
+            self._series.pop((metric, values), None)
+            SERIES_METRICS['series'].set(len(self._series))
+        try:
+            metric.remove(*values)
+        except KeyError:
+            pass
+
+    def __len__(self):
+        return len(self._series)
+
+    def evict_stale(self, now=None):
+        """Remove series not updated within stale_after, returning how many were removed"""
+        if self.stale_after is None:
+            return 0
+        cutoff = (time.monotonic() if now is None else now) - self.stale_after
+        with self._lock:
+            stale = [key for key, updated in self._series.items() if updated < cutoff]
+            for key in stale:
+                del self._series[key]
+            SERIES_METRICS['series'].set(len(self._series))
+
+        for metric, values in stale:
+            try:
+                metric.remove(*values)
+            except KeyError:
+                pass
+            SERIES_METRICS['evicted'].labels(metric=metric._name).inc()
+        return len(stale)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+
+from k8s.network.metrics import Counter, Gauge
+
+from k8s.network.discovery import SERVICE_ACCOUNT_DIR, Informer, KubeApi, _read
+
+logger = logging.getLogger('network-test')
+
+SHARD_METRICS = {
+    'replicas': Gauge('shard_replicas', 'Replicas sharing the probe targets, as seen by this replica', multiprocess_mode='max'),
+    'rebalances': Counter('shard_rebalances', 'Times the set of replicas changed and jobs were reassigned'),
+    'moved': Counter('shard_jobs_moved', 'Jobs this replica took over or handed off on rebalances', ['direction']),
+}
+
+
+def _weight(member, key):
+    digest = hashlib.blake2b(f"{member}\0{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def rendezvous_owner(key, members):
+    """Member that owns key under rendezvous (highest random weight) hashing
+
+    Every member scores every key and the highest score wins. When a member
+    joins it takes over only the keys it now scores highest on, and when one
+    leaves only its own keys move, each to its runner-up, so the
+    minimum (about 1/N of the keys) moves either way. Unlike a hash ring
+    it needs no virtual nodes to spread keys evenly, and with the handful
+    of replicas a probe deployment runs, scoring every member is cheap.
+    """
+    return max(members, key=lambda member: _weight(member, key))
+
+
+def ordinal_members(identity, replicas):
+    """Pod names of a StatefulSet with `replicas` pods, given one of them (<name>-<ordinal>)"""
+    base, sep, ordinal = identity.rpartition('-')
+    if not sep or not ordinal.isdigit():
+        raise ValueError(f"cannot derive a replica ordinal from {identity!r}, expected <statefulset>-<ordinal>")
+    return [f"{base}-{i}" for i in range(replicas)]
+
+
+class ShardMembership:
+    """The replicas sharing the probe targets, and which of them runs each job
+
+    Members are identified by pod name. With a fixed replica count (e.g. a
+    StatefulSet) they are derived from this pod's ordinal; otherwise they
+    are the running pods matching a label selector, kept current with a
+    list + watch so replicas added or removed by a rollout or autoscaler are
+    picked up. A pod being deleted stops counting as a member, so its
+    targets move before it goes away. This replica always counts itself, so
+    it never drops its share while the API server is unreachable.
+    """
+
+    def __init__(self, identity, members=(), informer=None, settle_seconds=5):
+        self.identity = identity
+        self.informer = informer
+        self.settle_seconds = settle_seconds
+        self.members = ()
+        self.set_members(members)
+
+    @classmethod
+    def from_config(cls, config):
+        """Membership from the shard_* config keys, or None when this replica probes every target"""
+        identity = config.get('shard_identity') or socket.gethostname()
+        selector = config.get('shard_pod_selector')
+        if selector:
+            namespace = config.get('shard_namespace') or _read(os.path.join(SERVICE_ACCOUNT_DIR, 'namespace')) or 'default'
+            api = KubeApi(config.get('shard_api_server'))
+            informer = Informer(api, f"/api/v1/namespaces/{namespace}/pods", {'labelSelector': selector})
+            return cls(identity, informer=informer, settle_seconds=config.get('shard_settle_seconds', 5))
+        replicas = config.get('shard_replicas', 1)
+        if replicas > 1:
+            return cls(identity, ordinal_members(identity, replicas))
+        return None
+
+    def set_members(self, members):
+        """Replace the member list, returning whether it changed"""
+        members = tuple(sorted(set(members) | {self.identity}))
+        if members == self.members:
+            return False
+        self.members = members
+        SHARD_METRICS['replicas'].set(len(members))
+        return True
+
+    def owns(self, name):
+        return len(self.members) == 1 or rendezvous_owner(name, self.members) == self.identity
+
+    def running_pods(self):
+        """Names of the watched pods that are running and not being deleted"""
+        return [
+            pod['metadata']['name'] for pod in self.informer.items.values()
+            if pod.get('status', {}).get('phase') == 'Running' and not pod['metadata'].get('deletionTimestamp')
+        ]
+
+    async def sync(self):
+        """List the member pods once"""
+        if self.informer is not None:
+            await self.informer.list()
+            self.set_members(self.running_pods())
+
+    async def run(self, on_change):
+        """Watch the member pods until cancelled, awaiting on_change() once changes settle"""
+        if self.informer is None:
+            return
+        changed = asyncio.Event()
+        self.informer.on_change = changed.set
+        watch = asyncio.ensure_future(self.informer.run())
+        try:
+            while True:
+                await changed.wait()
+                # A rollout replaces pods one by one; wait for it to settle rather than rebalance per pod
+                await asyncio.sleep(self.settle_seconds)
+                changed.clear()
+                if self.set_members(self.running_pods()):
+                    logger.info(f"Replicas changed, now {len(self.members)}: {', '.join(self.members)}")
+                    SHARD_METRICS['rebalances'].inc()
+                    await on_change()
+        finally:
+            watch.cancel()
+
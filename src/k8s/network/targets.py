@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+
+from k8s.network.metrics import Counter, Gauge
+
+logger = logging.getLogger('network-test')
+
+TARGETS_METRICS = {
+    'reloads': Counter('targets_file_reloads', 'Targets file loads, by result (success, error)', ['result']),
+    'last_reload': Gauge('targets_file_last_reload_timestamp_seconds', 'Time the targets file was last applied', multiprocess_mode='max'),
+    'labels': Gauge('probe_target_labels', 'Labels given to a target in the targets file, one series per label (join on probe_job)', ['probe_job', 'label', 'value'], multiprocess_mode='mostrecent'),
+}
+
+# Section of the targets file -> (config key, required fields, allowed fields)
+SECTIONS = {
+    'tcp': ('tcp_targets', ('host',), ('port',)),
+    'http': ('http_targets', ('url',), ('method', 'expectStatus')),
+    'services': ('k8s_services', ('name',), ('namespace', 'port')),
+    'dns': ('dns_targets', ('name',), ()),
+    'udp': ('udp_targets', ('host',), ('port', 'rate', 'size')),
+    'tls': ('tls_targets', ('host',), ('port', 'serverName')),
+}
+COMMON_FIELDS = ('interval', 'count', 'timeout', 'labels')
+
+EXAMPLE = """\
+# Settings applied to every target unless the target sets them itself
+defaults:
+  interval: 60
+  count: 3
+  timeout: 5
+tcp:
+  - host: database
+    port: 5432
+    interval: 15
+    labels: {team: data}
+http:
+  - url: http://frontend-service/health
+    method: HEAD
+    expectStatus: [200, 204]
+    timeout: 2
+services:
+  - name: kubernetes
+    namespace: default
+    port: 443
+dns:
+  - name: kubernetes.default.svc.cluster.local.
+    count: 5
+# count is the number of packets per train; rate is packets per second
+udp:
+  - host: network-test
+    port: 9000
+    count: 200
+    rate: 100
+    size: 512
+# count is the number of full + resumed handshake pairs; serverName is sent as SNI and verified
+tls:
+  - host: kubernetes.default.svc
+    port: 443
+  - host: 10.0.0.1
+    serverName: kubernetes.default.svc
+"""
+
+
+def parse_targets(data):
+    """Validate a parsed targets file and return its config overlay
+
+    The overlay sets tcp_targets, http_targets, k8s_services, dns_targets, udp_targets and tls_targets
+    to lists of per-target dicts, so a targets file replaces the target lists
+    from the environment entirely. Raises ValueError describing the first
+    problem found.
+    """
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ValueError("targets file must be a mapping")
+    unknown = set(data) - set(SECTIONS) - {'defaults'}
+    if unknown:
+        raise ValueError(f"unknown sections: {', '.join(sorted(unknown))}")
+    defaults = data.get('defaults') or {}
+    _check_fields('defaults', defaults, COMMON_FIELDS)
+
+    overlay = {}
+    for section, (key, required, allowed) in SECTIONS.items():
+        entries = data.get(section) or []
+        if not isinstance(entries, list):
+            raise ValueError(f"{section} must be a list")
+        overlay[key] = []
+        for i, entry in enumerate(entries):
+            where = f"{section}[{i}]"
+            if not isinstance(entry, dict):
+                raise ValueError(f"{where} must be a mapping")
+            _check_fields(where, entry, required + allowed + COMMON_FIELDS)
+            missing = [field for field in required if not entry.get(field)]
+            if missing:
+                raise ValueError(f"{where} is missing {', '.join(missing)}")
+            overlay[key].append(_target(where, {**defaults, **entry}))
+    return overlay
+
+
+def _check_fields(where, entry, allowed):
+    if not isinstance(entry, dict):
+        raise ValueError(f"{where} must be a mapping")
+    unknown = set(entry) - set(allowed)
+    if unknown:
+        raise ValueError(f"{where} has unknown fields: {', '.join(sorted(unknown))}")
+
+
+def _target(where, entry):
+    """Normalise one target: numeric types checked, expectStatus as expect_status tuple"""
+    target = {}
+    for field, value in entry.items():
+        if field in ('interval', 'timeout', 'rate'):
+            if not isinstance(value, (int, float)) or value <= 0:
+                raise ValueError(f"{where}.{field} must be a positive number")
+        elif field in ('count', 'port', 'size'):
+            if not isinstance(value, int) or value <= 0:
+                raise ValueError(f"{where}.{field} must be a positive integer")
+        elif field == 'labels':
+            if not isinstance(value, dict):
+                raise ValueError(f"{where}.labels must be a mapping")
+            value = {str(k): str(v) for k, v in value.items()}
+        elif field == 'method':
+            value = str(value).upper()
+        elif field == 'expectStatus':
+            statuses = value if isinstance(value, list) else [value]
+            if not all(isinstance(status, int) for status in statuses):
+                raise ValueError(f"{where}.expectStatus must be a status code or a list of them")
+            field, value = 'expect_status', tuple(statuses)
+        elif field == 'serverName':
+            field, value = 'server_name', str(value)
+        target[field] = value
+    return target
+
+
+def load_targets_file(path):
+    """Read and validate a YAML or JSON targets file, returning its config overlay"""
+    with open(path) as f:
+        text = f.read()
+    return parse_targets(_decode(path, text))
+
+
+def _decode(path, text):
+    if path.endswith('.json'):
+        return json.loads(text)
+    # YAML is a superset of JSON, so this also reads JSON under other names.
+    # Imported here, as only daemons with a targets file and network-targets need it
+    import yaml
+    try:
+        return yaml.safe_load(text)
+    except yaml.YAMLError as e:
+        raise ValueError(str(e)) from e
+
+
+class TargetLabels:
+    """probe_target_labels series for the labels of each scheduled target"""
+
+    def __init__(self):
+        self._labels = {}
+
+    def update(self, jobs):
+        """Export the labels of jobs (name -> labels dict), dropping those of targets no longer present"""
+        for name, labels in list(self._labels.items()):
+            if jobs.get(name) != labels:
+                for label, value in labels.items():
+                    TARGETS_METRICS['labels'].remove(name, label, value)
+                del self._labels[name]
+        for name, labels in jobs.items():
+            if labels and name not in self._labels:
+                for label, value in labels.items():
+                    TARGETS_METRICS['labels'].labels(probe_job=name, label=label, value=value).set(1)
+                self._labels[name] = labels
+
+
+class TargetsFileWatcher:
+    """Re-read a targets file whenever its content changes
+
+    ConfigMap volumes are updated by swapping a symlink rather than writing
+    the file in place, so the file is polled and compared by content hash
+    instead of relying on inotify events for the path. on_change receives the
+    new overlay; a file that fails to parse is logged and counted, and the
+    targets from the last good version stay in effect.
+    """
+
+    def __init__(self, path, on_change, poll_interval=5):
+        self.path = path
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self._digest = None
+
+    def load(self):
+        """Load the file if it changed since the last load, returning the overlay or None"""
+        try:
+            with open(self.path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            logger.error(f"Cannot read targets file {self.path} - {e}")
+            return None
+        digest = hashlib.sha256(content).digest()
+        if digest == self._digest:
+            return None
+        self._digest = digest
+        try:
+            overlay = parse_targets(_decode(self.path, content.decode('utf-8')))
+        except (ValueError, UnicodeDecodeError) as e:
+            TARGETS_METRICS['reloads'].labels(result='error').inc()
+            logger.error(f"Invalid targets file {self.path}, keeping the current targets - {e}")
+            return None
+        TARGETS_METRICS['reloads'].labels(result='success').inc()
+        TARGETS_METRICS['last_reload'].set_to_current_time()
+        return overlay
+
+    async def run(self):
+        """Poll for changes until cancelled"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            overlay = await asyncio.to_thread(self.load)
+            if overlay is not None:
+                logger.info(f"Targets file {self.path} changed, applying")
+                await self.on_change(overlay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate a network-test targets file')
+    parser.add_argument('path', nargs='?', help='Targets file (YAML or JSON)')
+    parser.add_argument('--example', action='store_true', help='Print an example targets file')
+    args = parser.parse_args()
+
+    if args.example or not args.path:
+        print(EXAMPLE, end='')
+        return
+    try:
+        overlay = load_targets_file(args.path)
+    except (OSError, ValueError) as e:
+        print(f"{args.path}: {e}", file=sys.stderr)
+        sys.exit(1)
+    counts = ', '.join(f"{len(overlay[key])} {section}" for section, (key, _, _) in SECTIONS.items())
+    print(f"{args.path}: ok ({counts})")
+
+
+if __name__ == "__main__":
+    main()
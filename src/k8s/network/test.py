@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
 from abc import abstractmethod
+import asyncio
 import os
 import socket
 import time
 import statistics
-import requests
 import logging
-from prometheus_client import Gauge, Counter, Summary
-import schedule
+import threading
+import zlib
+from k8s.network import metrics
+from k8s.network.metrics import Gauge, Counter, Histogram, Summary
 from k8s.health import HealthCheck, health_status
+from k8s.network.dns import DnsError, DnsResolver
+from k8s.network.adaptive import AdaptiveSampler
+from k8s.network.engine import ProbeEngine
+from k8s.network.histogram import LatencyRecorder, latency_buckets_from_env
+from k8s.network.history import ResultHistory
+from k8s.network.instrumentation import CycleTimer, StackSampler, count_error, flush_gc_metrics, install_gc_metrics
+from k8s.network.samplelog import SampleLog
+from k8s.network.scheduler import CURRENT_JOB, ProbeJob, ProbeScheduler
+from k8s.network.series import SeriesRegistry, status_class
+from k8s.network.sharding import SHARD_METRICS, ShardMembership
+from k8s.network.targets import TargetLabels, TargetsFileWatcher
 
 # Configure logging
 logging.basicConfig(
@@ -19,47 +32,139 @@ logger = logging.getLogger('network-test')
 
 config = {}
 
+LATENCY_BUCKETS = latency_buckets_from_env()
+
 METRICS = {
-    'http_request_time': Summary('http_request_time_seconds', 'HTTP request time in seconds', ['url', 'status_code']),
+    'http_request_time': Summary('http_request_time_seconds', 'HTTP request time in seconds, by status class (2xx, 5xx, ...)', ['url', 'status_class']),
     'http_request_errors': Counter('http_request_errors_total', 'Total HTTP request errors', ['url']),
-    'http_response_size': Gauge('http_response_size_bytes', 'HTTP response size in bytes', ['url', 'status_code']),
-    'http_request_min': Gauge('http_request_min_ms', 'Minimum HTTP request time in milliseconds', ['url']),
-    'http_request_max': Gauge('http_request_max_ms', 'Maximum HTTP request time in milliseconds', ['url']),
-    'http_request_avg': Gauge('http_request_avg_ms', 'Average HTTP request time in milliseconds', ['url']),
-    'http_request_stddev': Gauge('http_request_stddev_ms', 'Standard deviation of HTTP request time', ['url']),
+    'http_unexpected_status': Counter('http_unexpected_status_total', 'HTTP responses whose status was not one of the target\'s expected statuses', ['url', 'status_class']),
+    'http_phase_time': Summary('http_phase_time_seconds', 'HTTP request phase time in seconds (dns, connect, tls, ttfb, transfer)', ['url', 'phase']),
+    'http_connections': Counter('http_connections_total', 'HTTP connections used by samples, by whether they were reused', ['url', 'reused']),
+    'http_response_size': Gauge('http_response_size_bytes', 'HTTP response size in bytes, by status class', ['url', 'status_class'], multiprocess_mode='mostrecent'),
+    'http_throughput': Gauge('http_throughput_bytes_per_second', 'HTTP response body throughput in bytes per second', ['url'], multiprocess_mode='mostrecent'),
+    'http_time_to_last_byte': Summary('http_time_to_last_byte_seconds', 'Time from sending an HTTP request to its last body byte', ['url']),
+    'http_request_duration': Histogram('http_request_duration_seconds', 'HTTP request latency in seconds', ['url'], buckets=LATENCY_BUCKETS),
+    'http_request_quantile': Gauge('http_request_quantile_seconds', 'HTTP request latency quantiles over a rolling window', ['url', 'quantile'], multiprocess_mode='mostrecent'),
 
-    'tcp_connection_time': Gauge('tcp_connection_time_ms', 'TCP connection time in milliseconds', ['target', 'port']),
     'tcp_connection_errors': Counter('tcp_connection_errors_total', 'Total TCP connection errors', ['target', 'port']),
-    'tcp_connection_min': Gauge('tcp_connection_min_ms', 'Minimum TCP connection time in milliseconds', ['target', 'port']),
-    'tcp_connection_max': Gauge('tcp_connection_max_ms', 'Maximum TCP connection time in milliseconds', ['target', 'port']),
-    'tcp_connection_avg': Gauge('tcp_connection_avg_ms', 'Average TCP connection time in milliseconds', ['target', 'port']),
-    'tcp_connection_stddev': Gauge('tcp_connection_stddev_ms', 'Standard deviation of TCP connection time', ['target', 'port']),
+    'tcp_connection_duration': Histogram('tcp_connection_duration_seconds', 'TCP connection latency in seconds', ['target', 'port'], buckets=LATENCY_BUCKETS),
+    'dns_resolution_duration': Histogram('dns_resolution_duration_seconds', 'DNS resolution latency in seconds', ['name'], buckets=LATENCY_BUCKETS),
+    'dns_resolution_quantile': Gauge('dns_resolution_quantile_seconds', 'DNS resolution latency quantiles over a rolling window', ['name', 'quantile'], multiprocess_mode='mostrecent'),
+    'dns_errors': Counter('dns_errors_total', 'DNS resolution errors by reason (nxdomain, servfail, timeout, ...)', ['name', 'reason']),
+    'dns_cache_hits': Counter('dns_cache_hits_total', 'DNS lookups answered from the TTL cache', ['name']),
+
+    'tcp_connection_quantile': Gauge('tcp_connection_quantile_seconds', 'TCP connection latency quantiles over a rolling window', ['target', 'port', 'quantile'], multiprocess_mode='mostrecent'),
+
+    'endpoint_connection_duration': Histogram('endpoint_connection_duration_seconds', 'TCP connection latency to a discovered service endpoint', ['namespace', 'service', 'pod', 'port'], buckets=LATENCY_BUCKETS),
+    'endpoint_connection_quantile': Gauge('endpoint_connection_quantile_seconds', 'Service endpoint connection latency quantiles over a rolling window', ['namespace', 'service', 'pod', 'port', 'quantile'], multiprocess_mode='mostrecent'),
+    'endpoint_connection_errors': Counter('endpoint_connection_errors_total', 'Failed connections to a discovered service endpoint', ['namespace', 'service', 'pod', 'port']),
+
+    'udp_round_trip_duration': Histogram('udp_round_trip_duration_seconds', 'Round trip time of UDP probe packets to an echo responder', ['target', 'port'], buckets=LATENCY_BUCKETS),
+    'udp_round_trip_quantile': Gauge('udp_round_trip_quantile_seconds', 'UDP probe packet round trip quantiles over a rolling window', ['target', 'port', 'quantile'], multiprocess_mode='mostrecent'),
+
+    'tls_handshake_duration': Histogram('tls_handshake_duration_seconds', 'TLS handshake time, full or resumed from a session ticket', ['target', 'port', 'resumed'], buckets=LATENCY_BUCKETS),
+    'tls_handshake_quantile': Gauge('tls_handshake_quantile_seconds', 'TLS handshake time quantiles over a rolling window, full or resumed', ['target', 'port', 'resumed', 'quantile'], multiprocess_mode='mostrecent'),
 }
 
 class NetworkTest:
 
   def __init__(self, config):
       self.config = config
+      self._engine = None
+      self._resolver = None
+      self._recorders = {}
+      self._recorders_lock = threading.Lock()
+      # Set up by run_scheduler in daemon mode
+      self.scheduler = None
+      self._stale_cycles = config.get('metric_stale_cycles', 3)
+      self._sweep_interval = config.get('interval_seconds', 60)
+      self._next_sweep = time.monotonic() + self._sweep_interval
+      self.series = SeriesRegistry(max_series=config.get('metric_max_series', 10000))
+      self._update_stale_after()
+      self._dynamic_jobs = {}
+      # Daemon cycle in progress: (CycleTimer, jobs yet to complete a run in it)
+      self._cycle = None
+      self.history = ResultHistory(capacity=config.get('result_history_size', 1024))
+      self.sample_log = None
+      if config.get('sample_log_dir'):
+          self.sample_log = SampleLog(
+              config['sample_log_dir'],
+              segment_bytes=config.get('sample_log_segment_bytes', 64 * 1024 * 1024),
+              max_segments=config.get('sample_log_segments', 16)
+          )
+      # Called after every probe run when running as a worker process
+      self.heartbeat = None
+      self.adaptive = None
+      if config.get('adaptive_sampling'):
+          self.adaptive = AdaptiveSampler(
+              min_factor=config.get('adaptive_min_factor', 0.25),
+              max_factor=config.get('adaptive_max_factor', 4.0),
+              series=self.series
+          )
+      # Replicas sharing the targets (None when this one probes them all)
+      self.shards = ShardMembership.from_config(config)
+      # A targets file replaces the target lists from the environment
+      self.target_labels = TargetLabels()
+      self.targets_watcher = None
+      if config.get('targets_file'):
+          self.targets_watcher = TargetsFileWatcher(config['targets_file'], self.apply_targets, config.get('targets_poll_seconds', 5))
+          overlay = self.targets_watcher.load()
+          if overlay is not None:
+              config.update(overlay)
+
+  @property
+  def engine(self):
+      """Asyncio probe engine, created on first use"""
+      if self._engine is None:
+          self._engine = ProbeEngine(
+              concurrency=self.config.get('concurrency', 100),
+              rate=self.config.get('probe_rate_limit'),
+              burst=self.config.get('probe_rate_burst')
+          )
+      return self._engine
 
-  def http_request(self, url, timeout=5):
+  @property
+  def resolver(self):
+      """DNS resolver for probes that time resolution separately, created on first use"""
+      if self._resolver is None:
+          self._resolver = DnsResolver(
+              nameserver=self.config.get('dns_server'),
+              timeout=self.config.get('dns_timeout', 2),
+              cache=self.config.get('dns_cache', False)
+          )
+      return self._resolver
+
+  def latency_recorder(self, kind, **labels):
+      """Latency recorder for a target, created on first sample"""
+      key = (kind, *labels.values())
+      recorder = self._recorders.get(key)
+      if recorder is None:
+          with self._recorders_lock:
+              recorder = self._recorders.get(key)
+              if recorder is None:
+                  recorder = LatencyRecorder(
+                      METRICS[f'{kind}_duration'],
+                      METRICS[f'{kind}_quantile'],
+                      labels,
+                      window_seconds=self.config.get('quantile_window_seconds', 300),
+                      series=self.series.labels
+                  )
+                  self._recorders[key] = recorder
+      return recorder
+
+  def record_sample(self, target, latency, status=0, timings=None):
+      """Keep a raw sample in the result history and, if enabled, the sample log"""
+      self.history.record(target, latency, status)
+      if self.sample_log is not None:
+          self.sample_log.append(target, latency, status, timings)
+      if self.adaptive is not None:
+          job = CURRENT_JOB.get()
+          if job is not None:
+              self.adaptive.observe(job, latency)
+
+  def http_request(self, url, timeout=5, mode=None):
       """Test HTTP request speed"""
-      try:
-          start_time = time.time()
-          response = requests.get(url, timeout=timeout)
-          elapsed = time.time() - start_time
-          
-          METRICS['http_request_time'].labels(url=url, status_code=response.status_code).observe(elapsed)
-          METRICS['http_response_size'].labels(url=url, status_code=response.status_code).set(len(response.content))
-          
-          return {
-              "elapsed": elapsed,
-              "status_code": response.status_code,
-              "content_size": len(response.content)
-          }
-      except requests.exceptions.RequestException as e:
-          logger.error(f"Error requesting {url} - {str(e)}")
-          METRICS['http_request_errors'].labels(url=url).inc()
-          return None
+      return self.engine.run(self.http_request_async(url, timeout, mode))
 
   def run_http_test(self, url, count=5, quiet=False):
       """Run multiple HTTP tests and calculate statistics"""
@@ -73,44 +178,32 @@ class NetworkTest:
               elapsed_ms = result["elapsed"] * 1000
               results.append(elapsed_ms)
               if not quiet:
-                  logger.info(f"Request {i+1}/{count}: {elapsed_ms:.2f} ms, Status: {result['status_code']}, Size: {result['content_size']} bytes")
+                  phases = ", ".join(f"{phase}={seconds * 1000:.2f}" for phase, seconds in result["timings"].items())
+                  logger.info(f"Request {i+1}/{count}: {elapsed_ms:.2f} ms, Status: {result['status_code']}, Size: {result['content_size']} bytes, "
+                              f"Throughput: {result['throughput'] * 8 / 1e6:.2f} Mbit/s ({phases} ms)")
           time.sleep(0.5)  # Delay between requests
       
-      if results:
-          # Update Prometheus metrics with statistics
-          METRICS['http_request_min'].labels(url=url).set(min(results))
-          METRICS['http_request_max'].labels(url=url).set(max(results))
-          METRICS['http_request_avg'].labels(url=url).set(statistics.mean(results))
-          if len(results) > 1:
-              METRICS['http_request_stddev'].labels(url=url).set(statistics.stdev(results))
-          
-          if not quiet:
-              logger.info(f"\nHTTP Results for {url}:")
-              logger.info(f"  Min: {min(results):.2f} ms")
-              logger.info(f"  Max: {max(results):.2f} ms")
-              logger.info(f"  Avg: {statistics.mean(results):.2f} ms")
-              if len(results) > 1:
-                  logger.info(f"  Std Dev: {statistics.stdev(results):.2f} ms")
-      else:
-          if not quiet:
-              logger.warning(f"No successful HTTP requests to {url}")
+      self._record_http_results(url, results, quiet)
       
       return results
   
   def ping_host(self, host, port=80, timeout=5):
     """Test TCP connection speed to a host:port"""
-    start_time = time.time()
+    start_time = time.perf_counter()
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         s.settimeout(timeout)
         s.connect((host, port))
         s.close()
-        elapsed = time.time() - start_time
-        METRICS['tcp_connection_time'].labels(target=host, port=port).set(elapsed * 1000)
+        elapsed = time.perf_counter() - start_time
+        self.latency_recorder('tcp_connection', target=host, port=port).record(elapsed)
+        self.record_sample(f"tcp:{host}:{port}", elapsed, timings={'connect': elapsed})
         return elapsed
     except (socket.timeout, socket.error) as e:
         logger.error(f"Error connecting to {host}:{port} - {str(e)}")
-        METRICS['tcp_connection_errors'].labels(target=host, port=port).inc()
+        self.series.labels(METRICS['tcp_connection_errors'], target=host, port=port).inc()
+        count_error('tcp', e)
+        self.record_sample(f"tcp:{host}:{port}", None)
         return None
 
   def run_ping_test(self, host, port, count=10, quiet=False):
@@ -127,52 +220,457 @@ class NetworkTest:
                 logger.info(f"Ping {i+1}/{count}: {result * 1000:.2f} ms")
         time.sleep(0.2)  # Short delay between pings
     
+    self._record_tcp_results(host, port, results, quiet)
+    
+    return results
+
+  def _record_http_results(self, url, results, quiet=False):
+      """Publish rolling HTTP latency quantiles and log a summary of this run"""
+      quantiles = self.latency_recorder('http_request', url=url).export_quantiles()
+      if quiet:
+          return
+      if results:
+          logger.info(f"\nHTTP Results for {url}:")
+          self._log_summary(results, quantiles)
+      else:
+          logger.warning(f"No successful HTTP requests to {url}")
+
+  def _record_tcp_results(self, host, port, results, quiet=False):
+    """Publish rolling TCP latency quantiles and log a summary of this run"""
+    quantiles = self.latency_recorder('tcp_connection', target=host, port=port).export_quantiles()
+    if quiet:
+        return
     if results:
-        # Update Prometheus metrics with statistics
-        METRICS['tcp_connection_min'].labels(target=host, port=port).set(min(results))
-        METRICS['tcp_connection_max'].labels(target=host, port=port).set(max(results))
-        METRICS['tcp_connection_avg'].labels(target=host, port=port).set(statistics.mean(results))
-        if len(results) > 1:
-            METRICS['tcp_connection_stddev'].labels(target=host, port=port).set(statistics.stdev(results))
-        
-        if not quiet:
-            logger.info(f"\nResults for {host}:{port}:")
-            logger.info(f"  Min: {min(results):.2f} ms")
-            logger.info(f"  Max: {max(results):.2f} ms")
-            logger.info(f"  Avg: {statistics.mean(results):.2f} ms")
-            if len(results) > 1:
-                logger.info(f"  Std Dev: {statistics.stdev(results):.2f} ms")
+        logger.info(f"\nResults for {host}:{port}:")
+        self._log_summary(results, quantiles)
     else:
-        if not quiet:
-            logger.warning(f"No successful connections to {host}:{port}")
-    
+        logger.warning(f"No successful connections to {host}:{port}")
+
+  def _log_summary(self, results, quantiles):
+      logger.info(f"  Min: {min(results):.2f} ms")
+      logger.info(f"  Max: {max(results):.2f} ms")
+      logger.info(f"  Avg: {statistics.mean(results):.2f} ms")
+      if len(results) > 1:
+          logger.info(f"  Std Dev: {statistics.stdev(results):.2f} ms")
+      for q, value in quantiles.items():
+          logger.info(f"  p{q * 100:g}: {value * 1000:.2f} ms")
+
+  async def http_request_async(self, url, timeout=5, mode=None, method='GET', expect_status=None):
+      """Test HTTP request speed on the probe engine
+
+      mode is 'pooled' to reuse keep-alive connections between samples or
+      'cold' to open a fresh connection (DNS, TCP, TLS) for every sample.
+      With http_stream set the body is counted in chunks and discarded, and
+      at most http_max_bytes are read. If expect_status is given, any other
+      status counts as a failed sample (its timings are still recorded).
+      """
+      mode = mode or self.config.get('http_mode', 'cold')
+      try:
+          response = await self.engine.http_get(
+              url,
+              timeout=timeout,
+              reuse=(mode == 'pooled'),
+              stream=self.config.get('http_stream', False),
+              max_bytes=self.config.get('http_max_bytes'),
+              method=method
+          )
+      except (OSError, asyncio.TimeoutError, EOFError, ValueError) as e:
+          logger.error(f"Error requesting {url} - {str(e) or type(e).__name__}")
+          self.series.labels(METRICS['http_request_errors'], url=url).inc()
+          count_error('http', e)
+          self.record_sample(f"http:{url}", None)
+          return None
+
+      elapsed = response.elapsed
+      self.series.labels(METRICS['http_request_time'], url=url, status_class=status_class(response.status_code)).observe(elapsed)
+      unexpected = expect_status is not None and response.status_code not in expect_status
+      if unexpected:
+          logger.error(f"Unexpected status {response.status_code} from {url}")
+          self.series.labels(METRICS['http_unexpected_status'], url=url, status_class=status_class(response.status_code)).inc()
+          self.record_sample(f"http:{url}", None, response.status_code, response.timings)
+      else:
+          self.latency_recorder('http_request', url=url).record(elapsed)
+          self.record_sample(f"http:{url}", elapsed, response.status_code, response.timings)
+      self.series.labels(METRICS['http_response_size'], url=url, status_class=status_class(response.status_code)).set(response.size)
+      self.series.labels(METRICS['http_throughput'], url=url).set(response.throughput)
+      self.series.labels(METRICS['http_time_to_last_byte'], url=url).observe(response.time_to_last_byte)
+      self.series.labels(METRICS['http_connections'], url=url, reused=str(response.reused).lower()).inc()
+      for phase, seconds in response.timings.items():
+          self.series.labels(METRICS['http_phase_time'], url=url, phase=phase).observe(seconds)
+
+      if unexpected:
+          return None
+      return {
+          "elapsed": elapsed,
+          "status_code": response.status_code,
+          "content_size": response.size,
+          "throughput": response.throughput,
+          "timings": response.timings,
+          "reused": response.reused
+      }
+
+  async def run_http_test_async(self, url, count=5, quiet=False, timeout=5, method='GET', expect_status=None):
+      """Run multiple HTTP tests without blocking other targets"""
+      results = []
+      for i in range(count):
+          result = await self.http_request_async(url, timeout, method=method, expect_status=expect_status)
+          if result is not None:
+              results.append(result["elapsed"] * 1000)
+          if i < count - 1:
+              await asyncio.sleep(0.5)  # Delay between requests
+      self._record_http_results(url, results, quiet)
+      return results
+
+  async def ping_host_async(self, host, port=80, timeout=5, address=None):
+    """Test TCP connection speed on the probe engine
+
+    If address is given the connection goes there and host is only used for
+    labels, so the measurement excludes name resolution.
+    """
+    try:
+        elapsed = await self.engine.tcp_connect(address or host, port, timeout=timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        logger.error(f"Error connecting to {host}:{port} - {str(e) or type(e).__name__}")
+        self.series.labels(METRICS['tcp_connection_errors'], target=host, port=port).inc()
+        count_error('tcp', e)
+        self.record_sample(f"tcp:{host}:{port}", None)
+        return None
+    self.latency_recorder('tcp_connection', target=host, port=port).record(elapsed)
+    self.record_sample(f"tcp:{host}:{port}", elapsed, timings={'connect': elapsed})
+    return elapsed
+
+  async def run_ping_test_async(self, host, port, count=10, quiet=False, timeout=5):
+    """Run multiple ping tests without blocking other targets"""
+    results = []
+    for i in range(count):
+        result = await self.ping_host_async(host, port, timeout)
+        if result is not None:
+            results.append(result * 1000)
+        if i < count - 1:
+            await asyncio.sleep(0.2)  # Short delay between pings
+    self._record_tcp_results(host, port, results, quiet)
     return results
 
+  async def resolve_async(self, name, use_cache=True):
+      """Time a DNS lookup, returning the DnsAnswer or None on failure"""
+      if not (use_cache and self.resolver.cache):
+          await self.engine.pace('dns')
+      try:
+          answer = await self.resolver.resolve(name, use_cache=use_cache)
+      except DnsError as e:
+          logger.error(f"Error resolving {name} - {e.reason}")
+          self.series.labels(METRICS['dns_errors'], name=name, reason=e.reason).inc()
+          count_error('dns', e)
+          self.record_sample(f"dns:{name}", None)
+          return None
+      except asyncio.TimeoutError as e:
+          logger.error(f"Error resolving {name} - timeout")
+          self.series.labels(METRICS['dns_errors'], name=name, reason='timeout').inc()
+          count_error('dns', e)
+          self.record_sample(f"dns:{name}", None)
+          return None
+      except OSError as e:
+          logger.error(f"Error resolving {name} - {str(e)}")
+          self.series.labels(METRICS['dns_errors'], name=name, reason='error').inc()
+          count_error('dns', e)
+          self.record_sample(f"dns:{name}", None)
+          return None
+
+      if answer.cached:
+          self.series.labels(METRICS['dns_cache_hits'], name=name).inc()
+      else:
+          self.latency_recorder('dns_resolution', name=name).record(answer.elapsed)
+          self.record_sample(f"dns:{name}", answer.elapsed, timings={'dns': answer.elapsed})
+      return answer
+
+  async def run_dns_test_async(self, name, count=5, quiet=False):
+      """Run multiple uncached DNS lookups against the configured resolver"""
+      if not quiet:
+          logger.info(f"Running DNS resolution test for {name} via {self.resolver.nameserver}")
+      results = []
+      for i in range(count):
+          answer = await self.resolve_async(name, use_cache=False)
+          if answer is not None:
+              results.append(answer.elapsed * 1000)
+              if not quiet:
+                  logger.info(f"Lookup {i+1}/{count}: {answer.elapsed * 1000:.2f} ms, {', '.join(answer.addresses)} (ttl {answer.ttl}s)")
+          if i < count - 1:
+              await asyncio.sleep(0.2)
+      self._record_dns_results(name, results, quiet)
+      return results
+
+  def _record_dns_results(self, name, results, quiet=False):
+      """Publish rolling DNS latency quantiles and log a summary of this run"""
+      quantiles = self.latency_recorder('dns_resolution', name=name).export_quantiles()
+      if quiet:
+          return
+      if results:
+          logger.info(f"\nDNS Results for {name}:")
+          self._log_summary(results, quantiles)
+      else:
+          logger.warning(f"No successful DNS lookups for {name}")
+
+  def run_concurrently(self, coros):
+      """Run probe coroutines concurrently and wait for all of them"""
+      results = self.engine.gather(coros)
+      for result in results:
+          if isinstance(result, Exception):
+              logger.error(f"Probe raised an exception: {result}")
+      return results
+
   def run_scheduled_tests(self):
-      """Run tests based on configuration"""
+      """Run every configured probe once, concurrently"""
       logger.info("Starting scheduled network tests")
       
-      self._run_scheduled_tests()
+      with CycleTimer():
+          self.run_concurrently([job.run() for job in self.probe_jobs()])
+      if self.sample_log is not None:
+          self.sample_log.flush()
       
       health_status["last_test_run"] = time.time()
 
   @abstractmethod
-  def _run_scheduled_tests(self):
+  def probe_jobs(self):
+      """Return one ProbeJob per configured target"""
       raise NotImplementedError()
-      
-  def run_scheduler(self):
-      """Set up and run the scheduler for periodic tests"""
-      interval = self.config.get('interval_seconds', 60)
-      
-      health_check = HealthCheck(config=self.config)
-      health_check.start()
 
-      self.run_scheduled_tests()
+  def background_tasks(self):
+      """Coroutines to run alongside the scheduler in daemon mode, e.g. watches that add and remove jobs"""
+      return []
 
-      logger.info(f"Setting up scheduled tests to run every {interval} seconds")
-      
-      schedule.every(interval).seconds.do(self.run_scheduled_tests)
+  def replace_jobs(self, owner, jobs, changed=()):
+      """Make the scheduled jobs added under owner match jobs, adding and removing the difference
+
+      Jobs already scheduled under the same name (e.g. from probe_jobs at
+      startup) are kept as they are, so their schedule is not reset, unless
+      their name is in changed. Every job of the owner is remembered, including
+      those another replica or worker runs, so a rebalance can pick them up.
+      """
+      desired = {job.name: job for job in jobs}
+      current = self._dynamic_jobs.get(owner, set())
+      removed = [name for name in current - desired.keys() if name in self.scheduler.jobs]
+      replaced = [name for name in desired.keys() & set(changed) if name in self.scheduler.jobs]
+      added = [name for name in desired.keys() - current if self.owns(name) and name not in self.scheduler.jobs]
+      for name in removed:
+          self.scheduler.remove(name)
+          if self.adaptive is not None:
+              self.adaptive.forget(name)
+      for name in replaced + added:
+          self.scheduler.add(desired[name])
+      self._dynamic_jobs[owner] = set(desired)
+      self._update_stale_after()
+      if added or removed or replaced:
+          logger.info(f"{owner}: {len(added)} jobs added, {len(replaced)} changed, {len(removed)} removed")
+
+  def owns(self, name):
+      """Whether this process runs job `name`
+
+      Replicas sharing the targets each take the jobs that hash to them; worker
+      processes then each take a fixed share of their replica's jobs.
+      """
+      if self.shards is not None and not self.shards.owns(name):
+          return False
+      count = self.config.get('worker_count', 1)
+      return count <= 1 or zlib.crc32(name.encode()) % count == self.config.get('worker_index', 0)
+
+  def probe_job(self, name, run, interval=None, offset=None, spec=None):
+      """Build a ProbeJob, defaulting to the configured interval"""
+      return ProbeJob(name, interval or self.config.get('interval_seconds', 60), run, offset, spec)
+
+  def create_health_check(self):
+      """Health/metrics server for daemon mode"""
+      profiler = StackSampler() if self.config.get('profiler_enabled') else None
+      return HealthCheck(config=self.config, history=self.history, profiler=profiler)
       
+  def run_scheduler(self, serve=True):
+      """Set up and run the scheduler for periodic tests, blocking the caller
+
+      serve=False skips the health/metrics server, for worker processes whose
+      parent serves it (from what each worker serves on its loopback port).
+      """
+      metrics.enable()
+      install_gc_metrics()
+      if serve:
+          self.create_health_check().start()
+
+      self.scheduler = ProbeScheduler(
+          jitter=self.config.get('schedule_jitter_seconds'),
+          on_complete=self._on_job_complete,
+          series=self.series
+      )
+      if self.shards is not None:
+          try:
+              self.engine.run(self.shards.sync())
+          except (OSError, asyncio.TimeoutError, ValueError) as e:
+              logger.error(f"Listing replicas failed, probing every target until the watch catches up - {str(e) or type(e).__name__}")
+      all_jobs = self.probe_jobs()
+      for job in all_jobs:
+          if self.owns(job.name):
+              self.scheduler.add(job)
+      self._dynamic_jobs['targets'] = {job.name for job in all_jobs if job.spec is not None}
+      self._update_target_labels()
+      self._update_stale_after()
+
+      if self.shards is not None:
+          logger.info(f"Scheduled {len(self.scheduler.jobs)} of {len(all_jobs)} probe jobs as {self.shards.identity} ({len(self.shards.members)} replicas)")
+      else:
+          logger.info(f"Scheduled {len(self.scheduler.jobs)} probe jobs")
+
+      self._advance_cycle()
+      self.engine.run(self._run_daemon())
+
+  async def _run_daemon(self):
+      tasks = [self.scheduler.run(), *self.background_tasks()]
+      if self.targets_watcher is not None:
+          tasks.append(self.targets_watcher.run())
+      if self.shards is not None:
+          tasks.append(self.shards.run(self.rebalance))
+      if self.shards is not None or self.config.get('worker_count', 1) > 1:
+          tasks.append(self._keep_idle_alive())
+      await asyncio.gather(*tasks)
+
+  async def _keep_idle_alive(self):
+      """Keep a replica or worker whose share of the jobs is empty healthy"""
       while True:
-          schedule.run_pending()
-          time.sleep(1)
\ No newline at end of file
+          if not self.scheduler.jobs:
+              self._mark_alive()
+          await asyncio.sleep(self.config.get('interval_seconds', 60))
+
+  async def rebalance(self):
+      """Hand off jobs this process no longer owns and take over the ones it now does
+
+      Jobs that stay with this process keep their schedule.
+      """
+      jobs = await asyncio.to_thread(self.probe_jobs)
+      removed = [name for name in self.scheduler.jobs if not self.owns(name)]
+      for name in removed:
+          self.scheduler.remove(name)
+          if self.adaptive is not None:
+              self.adaptive.forget(name)
+      added = [job for job in jobs if job.name not in self.scheduler.jobs and self.owns(job.name)]
+      for job in added:
+          self.scheduler.add(job)
+      SHARD_METRICS['moved'].labels(direction='added').inc(len(added))
+      SHARD_METRICS['moved'].labels(direction='removed').inc(len(removed))
+      self._update_target_labels()
+      self._update_stale_after()
+      logger.info(f"Rebalanced: {len(added)} jobs taken over, {len(removed)} handed off, {len(self.scheduler.jobs)} scheduled")
+
+  async def apply_targets(self, overlay):
+      """Apply a changed targets file to the running scheduler
+
+      Only jobs built from target settings (those with a spec) are touched:
+      new targets are added, removed ones dropped and targets whose settings
+      changed rescheduled. Unchanged targets keep their schedule and metrics;
+      series of removed targets age out through stale series eviction.
+      """
+      self.config.update(overlay)
+      # probe_jobs may block on the engine (e.g. an initial discovery list)
+      jobs = [job for job in await asyncio.to_thread(self.probe_jobs) if job.spec is not None]
+      scheduled = {name: job for name, job in self.scheduler.jobs.items() if job.spec is not None}
+      changed = [job.name for job in jobs if job.name in scheduled and scheduled[job.name].spec != job.spec]
+      self.replace_jobs('targets', jobs, changed)
+      self._update_target_labels()
+
+  def _update_stale_after(self):
+      """Size the stale series window from the longest interval of any scheduled job
+
+      Targets can set their own interval, and adaptive sampling can stretch
+      it, so a series is only stale after metric_stale_cycles of the longest
+      interval; a slow target's series, recorders and history are never
+      evicted between its runs.
+      """
+      if not self._stale_cycles:
+          self.series.stale_after = None
+          return
+      interval = self.config.get('interval_seconds', 60)
+      if self.scheduler is not None:
+          interval = max([interval, *(job.base_interval for job in self.scheduler.jobs.values())])
+      if self.config.get('adaptive_sampling'):
+          interval *= self.config.get('adaptive_max_factor', 4.0)
+      self.series.stale_after = self._stale_cycles * interval
+
+  def _update_target_labels(self):
+      self.target_labels.update({name: job.spec.get('labels') for name, job in self.scheduler.jobs.items() if job.spec})
+
+  def _mark_alive(self):
+      health_status["last_test_run"] = time.time()
+      if self.heartbeat is not None:
+          self.heartbeat()
+
+  def _advance_cycle(self, completed=None):
+      """End the daemon's current cycle once every job scheduled when it began has completed a run
+
+      Jobs are spread over the interval rather than run together, so a cycle
+      normally lasts about one interval; longer cycles mean the daemon is
+      falling behind. Jobs removed meanwhile are not waited for.
+      """
+      if self._cycle is not None:
+          timer, pending = self._cycle
+          pending.discard(completed)
+          pending.intersection_update(self.scheduler.jobs)
+          if pending:
+              return
+          timer.stop()
+      self._cycle = (CycleTimer().start(), set(self.scheduler.jobs))
+
+  def _on_job_complete(self, job):
+      self._mark_alive()
+      flush_gc_metrics()
+      self._advance_cycle(job.name)
+      if self.adaptive is not None and self.scheduler.jobs.get(job.name) is job:
+          self.scheduler.set_interval(job, self.adaptive.interval(job))
+      if self.sample_log is not None:
+          self.sample_log.flush()
+      now = time.monotonic()
+      if now >= self._next_sweep:
+          self._next_sweep = now + self._sweep_interval
+          self.evict_stale_series(now)
+
+  def evict_stale_series(self, now=None):
+      """Drop series and latency recorders of targets that stopped reporting"""
+      now = time.monotonic() if now is None else now
+      evicted = self.series.evict_stale(now)
+      if self.series.stale_after is not None:
+          cutoff = now - self.series.stale_after
+          with self._recorders_lock:
+              for key in [key for key, recorder in self._recorders.items() if recorder.updated < cutoff]:
+                  del self._recorders[key]
+          self.history.evict_older_than(time.time() - self.series.stale_after)
+      if evicted:
+          logger.info(f"Evicted {evicted} stale metric series")
+      return evicted
+
+
+def load_common_config_from_env():
+    """Load the settings shared by every probe type from environment variables
+
+    Each probe module adds its own targets with its load_targets_from_env.
+    """
+    return {
+        'interval_seconds': int(os.environ.get('NETWORK_TEST_INTERVAL', 60)),
+        'concurrency': int(os.environ.get('PROBE_CONCURRENCY', 100)),
+        'schedule_jitter_seconds': float(os.environ['SCHEDULE_JITTER_SECONDS']) if os.environ.get('SCHEDULE_JITTER_SECONDS') else None,
+        'metric_stale_cycles': int(os.environ.get('METRIC_STALE_CYCLES', 3)),
+        'metric_max_series': int(os.environ.get('METRIC_MAX_SERIES', 10000)),
+        'result_history_size': int(os.environ.get('RESULT_HISTORY_SIZE', 1024)),
+        'quantile_window_seconds': int(os.environ.get('QUANTILE_WINDOW_SECONDS', 300)),
+        'sample_log_dir': os.environ.get('SAMPLE_LOG_DIR', ''),
+        'sample_log_segment_bytes': int(os.environ.get('SAMPLE_LOG_SEGMENT_BYTES', 64 * 1024 * 1024)),
+        'sample_log_segments': int(os.environ.get('SAMPLE_LOG_SEGMENTS', 16)),
+        'profiler_enabled': os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true',
+        'targets_file': os.environ.get('TARGETS_FILE', ''),
+        'targets_poll_seconds': float(os.environ.get('TARGETS_POLL_SECONDS', 5)),
+        'adaptive_sampling': os.environ.get('ADAPTIVE_SAMPLING', 'false').lower() == 'true',
+        'adaptive_min_factor': float(os.environ.get('ADAPTIVE_MIN_FACTOR', 0.25)),
+        'adaptive_max_factor': float(os.environ.get('ADAPTIVE_MAX_FACTOR', 4)),
+        'probe_rate_limit': float(os.environ.get('PROBE_RATE_LIMIT', 0)) or None,
+        'probe_rate_burst': float(os.environ.get('PROBE_RATE_BURST', 0)) or None,
+        'shard_identity': os.environ.get('POD_NAME', ''),
+        'shard_namespace': os.environ.get('POD_NAMESPACE', ''),
+        'shard_pod_selector': os.environ.get('SHARD_POD_SELECTOR', ''),
+        'shard_replicas': int(os.environ.get('SHARD_REPLICAS', 1)),
+        'shard_settle_seconds': float(os.environ.get('SHARD_SETTLE_SECONDS', 5)),
+        'shard_api_server': os.environ.get('SHARD_API_SERVER') or None,
+        'worker_health_port': int(os.environ.get('NETWORK_TEST_WORKER_HEALTH_PORT', 18081)),
+    }
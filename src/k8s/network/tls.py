@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import asyncio
+import calendar
+import os
+import ssl
+import time
+
+# Seconds to wait after a TLS 1.3 handshake for the session ticket the server sends after it
+TICKET_WAIT = 0.5
+
+
+def create_context(verify=True, ca_file=None):
+    """Client SSLContext for TLS probes
+
+    Loading the CA bundle is the expensive part of creating a context, so
+    one is shared by every TLS probe. ca_file (e.g. the service account's
+    ca.crt, for the API server) is trusted in addition to the system CAs.
+    """
+    context = ssl.create_default_context()
+    if ca_file and os.path.exists(ca_file):
+        context.load_verify_locations(ca_file)
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class TlsHandshake:
+    """Outcome of one TLS handshake"""
+
+    def __init__(self, elapsed, resumed, version, cipher, session, not_after):
+        self.elapsed = elapsed
+        self.resumed = resumed
+        self.version = version
+        self.cipher = cipher
+        self.session = session
+        self.not_after = not_after
+
+
+async def tls_handshake(host, port, context, server_name=None, session=None):
+    """Connect to host:port and time a TLS handshake, offering `session` for resumption
+
+    asyncio's start_tls cannot offer a saved session, so the handshake is
+    driven over memory BIOs on a plain connection. Only the handshake itself
+    is timed, not the TCP connect. After a full TLS 1.3 handshake the session
+    ticket arrives in a separate message, which is waited for briefly so the
+    returned session can be resumed.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+        tls = context.wrap_bio(incoming, outgoing, server_hostname=server_name or host, session=session)
+        start = time.perf_counter()
+        await _drive(tls.do_handshake, reader, writer, incoming, outgoing)
+        elapsed = time.perf_counter() - start
+
+        if not tls.session_reused and tls.version() == 'TLSv1.3':
+            await _await_ticket(tls, reader, writer, incoming, outgoing)
+        der = tls.getpeercert(binary_form=True)
+        return TlsHandshake(
+            elapsed, tls.session_reused, tls.version(), tls.cipher()[0], tls.session,
+            certificate_not_after(der) if der else None
+        )
+    finally:
+        writer.close()
+
+
+async def _drive(operation, reader, writer, incoming, outgoing):
+    """Run an SSLObject operation to completion, moving records between the BIOs and the connection"""
+    while True:
+        try:
+            result = operation()
+        except ssl.SSLWantReadError:
+            _flush(writer, outgoing)
+            await writer.drain()
+            data = await reader.read(64 * 1024)
+            if not data:
+                raise ConnectionResetError("connection closed during TLS handshake")
+            incoming.write(data)
+        else:
+            _flush(writer, outgoing)
+            await writer.drain()
+            return result
+
+
+def _flush(writer, outgoing):
+    data = outgoing.read()
+    if data:
+        writer.write(data)
+
+
+async def _await_ticket(tls, reader, writer, incoming, outgoing):
+    deadline = time.monotonic() + TICKET_WAIT
+    while not (tls.session is not None and tls.session.has_ticket):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        try:
+            await asyncio.wait_for(_drive(lambda: tls.read(1), reader, writer, incoming, outgoing), remaining)
+        except (asyncio.TimeoutError, ConnectionResetError, ssl.SSLZeroReturnError):
+            return
+
+
+def _der_element(der, offset):
+    """(tag, content start, content end) of the DER element at offset"""
+    tag, length = der[offset], der[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(der[offset:offset + size], 'big')
+        offset += size
+    return tag, offset, offset + length
+
+
+def certificate_not_after(der):
+    """notAfter of a DER-encoded X.509 certificate, as a Unix timestamp
+
+    getpeercert() only decodes the certificate when it was verified; reading
+    the one field needed from the DER keeps expiry working with verify off.
+    """
+    _, tbs, _ = _der_element(der, 0)
+    _, field, _ = _der_element(der, tbs)
+    tag, _, end = _der_element(der, field)
+    if tag == 0xa0:  # explicit version
+        field = end
+    for _ in range(3):  # serialNumber, signature, issuer
+        _, _, field = _der_element(der, field)
+    _, validity, _ = _der_element(der, field)
+    _, _, field = _der_element(der, validity)  # notBefore
+    tag, start, end = _der_element(der, field)
+    text = der[start:end].decode('ascii')
+    # UTCTime (two-digit year) or GeneralizedTime
+    return calendar.timegm(time.strptime(text, '%y%m%d%H%M%SZ' if tag == 0x17 else '%Y%m%d%H%M%SZ'))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from k8s.network.metrics import Counter, Gauge
+
+from k8s.network.discovery import SERVICE_ACCOUNT_DIR
+from k8s.network.instrumentation import count_error
+from k8s.network.test import NetworkTest, load_common_config_from_env
+from k8s.network.tls import create_context
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('network-test')
+
+TLS_METRICS = {
+    'errors': Counter('tls_handshake_errors_total', 'Failed TLS handshakes, including certificate verification failures', ['target', 'port']),
+    'resumptions': Counter('tls_session_resumptions_total', 'Handshakes that offered a saved session, by whether the server resumed it (resumed, rejected)', ['target', 'port', 'result']),
+    'info': Gauge('tls_connection_info', 'Protocol version and cipher negotiated by the last full handshake (always 1)', ['target', 'port', 'version', 'cipher'], multiprocess_mode='mostrecent'),
+    'expiry': Gauge('tls_certificate_expiry_timestamp_seconds', 'notAfter of the certificate the target presented, as a Unix timestamp', ['target', 'port'], multiprocess_mode='mostrecent'),
+}
+
+
+class TlsNetworkTest(NetworkTest):
+    """TLS handshake time, full and resumed, to HTTPS and API server targets
+
+    Each sample is a full handshake followed by one that resumes the session
+    (ticket) it returned, so TLS termination cost shows up separately from
+    TCP connect time, and a server that stops resuming sessions is visible
+    as more expensive handshakes. All targets share one SSLContext, and the
+    latest session of each target is kept for resumption.
+    """
+
+    def __init__(self, config):
+      super().__init__(config)
+      self._tls_context = None
+      self._tls_sessions = {}
+      self._tls_info = {}
+
+    @property
+    def tls_context(self):
+      if self._tls_context is None:
+          self._tls_context = create_context(
+              verify=self.config.get('tls_verify', True),
+              ca_file=self.config.get('tls_ca_file') or os.path.join(SERVICE_ACCOUNT_DIR, 'ca.crt')
+          )
+      return self._tls_context
+
+    def probe_jobs(self):
+      """One job per TLS target, each with its own interval and count"""
+      return [
+          self.probe_job(
+              f"tls:{target['host']}:{target.get('port', 443)}",
+              lambda target=target: self.run_tls_test_async(
+                  target['host'],
+                  target.get('port', 443),
+                  target.get('count', 3),
+                  target.get('server_name'),
+                  target.get('timeout', 5),
+                  quiet=True
+              ),
+              target.get('interval'),
+              spec=target
+          )
+          for target in self.config.get('tls_targets', [])
+      ]
+
+    def run_tls_test(self, host, port=443, count=3, server_name=None, timeout=5):
+      """Run full and resumed handshakes and log their times"""
+      return self.engine.run(self.run_tls_test_async(host, port, count, server_name, timeout))
+
+    async def run_tls_test_async(self, host, port=443, count=3, server_name=None, timeout=5, quiet=False):
+      """`count` samples of a full handshake followed by a resumed one"""
+      if not quiet:
+          logger.info(f"Running TLS handshake test to {host}:{port}")
+      results = {False: [], True: []}
+      for i in range(count):
+          full = await self._tls_sample(host, port, server_name, None, timeout, quiet)
+          if full is not None:
+              results[full.resumed].append(full.elapsed * 1000)
+              if full.session is not None:
+                  self._tls_sessions[(host, port)] = full.session
+          session = self._tls_sessions.get((host, port))
+          if session is not None:
+              resumed = await self._tls_sample(host, port, server_name, session, timeout, quiet)
+              if resumed is not None:
+                  results[resumed.resumed].append(resumed.elapsed * 1000)
+          if i < count - 1:
+              await asyncio.sleep(0.2)
+
+      quantiles = {
+          resumed: self.latency_recorder('tls_handshake', target=host, port=port, resumed=str(resumed).lower()).export_quantiles()
+          for resumed in (False, True)
+      }
+      if not quiet:
+          for resumed, name in ((False, 'full'), (True, 'resumed')):
+              if results[resumed]:
+                  logger.info(f"\nTLS {name} handshake results for {host}:{port}:")
+                  self._log_summary(results[resumed], quantiles[resumed])
+          if not any(results.values()):
+              logger.warning(f"No successful TLS handshakes with {host}:{port}")
+      return results
+
+    async def _tls_sample(self, host, port, server_name, session, timeout, quiet):
+      labels = dict(target=host, port=port)
+      target = f"tls:{host}:{port}"
+      try:
+          handshake = await self.engine.tls_handshake(host, port, self.tls_context, server_name, session, timeout)
+      except (OSError, asyncio.TimeoutError, ValueError) as e:
+          logger.error(f"TLS handshake with {host}:{port} failed - {str(e) or type(e).__name__}")
+          self.series.labels(TLS_METRICS['errors'], **labels).inc()
+          count_error('tls', e)
+          self.record_sample(target, None)
+          return None
+
+      self.latency_recorder('tls_handshake', **labels, resumed=str(handshake.resumed).lower()).record(handshake.elapsed)
+      self.record_sample(target, handshake.elapsed, timings={'tls': handshake.elapsed})
+      if session is not None:
+          self.series.labels(TLS_METRICS['resumptions'], **labels, result='resumed' if handshake.resumed else 'rejected').inc()
+      if not handshake.resumed:
+          self._export_tls_info(host, port, handshake)
+      if not quiet:
+          logger.info(f"{'Resumed' if handshake.resumed else 'Full'} handshake: {handshake.elapsed * 1000:.2f} ms, "
+                      f"{handshake.version} {handshake.cipher}")
+      return handshake
+
+    def _export_tls_info(self, host, port, handshake):
+      info = (handshake.version, handshake.cipher)
+      previous = self._tls_info.get((host, port))
+      if previous is not None and previous != info:
+          self.series.remove(TLS_METRICS['info'], target=host, port=port, version=previous[0], cipher=previous[1])
+      self._tls_info[(host, port)] = info
+      self.series.labels(TLS_METRICS['info'], target=host, port=port, version=info[0], cipher=info[1]).set(1)
+      if handshake.not_after is not None:
+          self.series.labels(TLS_METRICS['expiry'], target=host, port=port).set(handshake.not_after)
+
+
+def load_targets_from_env():
+    """Load this probe's targets and settings from environment variables
+
+    Settings shared by every probe type come from load_common_config_from_env.
+    """
+    config = {
+        'tls_targets': [],
+        # Empty CA file means the service account's ca.crt (if mounted) on top of the system CAs
+        'tls_verify': os.environ.get('TLS_VERIFY', 'true').lower() == 'true',
+        'tls_ca_file': os.environ.get('TLS_CA_FILE', ''),
+    }
+
+    # Load TLS targets (comma-separated list of host:port)
+    tls_targets = os.environ.get('TLS_TARGETS', '')
+    if tls_targets:
+        for target in tls_targets.split(','):
+            parts = target.strip().split(':')
+            config['tls_targets'].append({
+                'host': parts[0],
+                'port': int(parts[1]) if len(parts) > 1 else 443,
+                'count': int(os.environ.get('TLS_COUNT', 3)),
+                'timeout': float(os.environ.get('TLS_TIMEOUT', 5)),
+            })
+
+    return config
+
+def main():
+    parser = argparse.ArgumentParser(description='Kubernetes TLS Handshake Test with Prometheus Metrics')
+
+    # Create subparsers for different commands
+    subparsers = parser.add_subparsers(dest='command', help='Test command')
+
+    # Handshake test
+    handshake_parser = subparsers.add_parser('handshake', help='Time full and resumed TLS handshakes')
+    handshake_parser.add_argument('host', help='Hostname or IP to connect to')
+    handshake_parser.add_argument('--port', type=int, default=443, help='Port to connect to (default: 443)')
+    handshake_parser.add_argument('--count', type=int, default=3, help='Number of full + resumed handshake pairs (default: 3)')
+    handshake_parser.add_argument('--server-name', help='Name to send as SNI and verify the certificate against (default: host)')
+    handshake_parser.add_argument('--insecure', action='store_true', help='Do not verify the certificate')
+
+    # Daemon mode for continuous monitoring
+    subparsers.add_parser('daemon', help='Run as a daemon for continuous monitoring')
+
+    args = parser.parse_args()
+
+    config = load_common_config_from_env()
+    config.update(load_targets_from_env())
+    if getattr(args, 'insecure', False):
+        config['tls_verify'] = False
+    test = TlsNetworkTest(config)
+
+    if args.command == 'handshake':
+        results = test.run_tls_test(args.host, args.port, args.count, args.server_name)
+        if not any(results.values()):
+            sys.exit(1)
+    elif args.command == 'daemon':
+        try:
+            test.run_scheduler()
+        except KeyboardInterrupt:
+            logger.info("Shutting down...")
+            sys.exit(0)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import asyncio
+import random
+import socket
+import statistics
+import struct
+import time
+
+from k8s.utils.udp_echo_server import HEADER, MAGIC
+
+# The sender wakes at most this often; every packet due by then goes out in one batch
+SEND_TICK = 0.001
+
+# Kernel receive timestamps, so packets read in a batch keep their own arrival time
+KERNEL_TIMESTAMPS = hasattr(socket, 'SO_TIMESTAMPNS')
+TIMESPEC = struct.Struct('@qq')
+
+
+def rfc3550_jitter(transits):
+    """Interarrival jitter (RFC 3550 section 6.4.1) of transit times in arrival order
+
+    J is moved a sixteenth of the way towards each |D(i-1, i)|, the change in
+    transit time between consecutive packets, which smooths out noise while
+    following real changes within a few dozen packets.
+    """
+    jitter = 0.0
+    for previous, current in zip(transits, transits[1:]):
+        jitter += (abs(current - previous) - jitter) / 16
+    return jitter
+
+
+class TrainResult:
+    """What came back from one packet train
+
+    Arrivals are (sequence, client send ns, server receive ns, client
+    receive ns) in the order they were read. Duplicates are counted and
+    dropped. A packet is reordered if a higher sequence number arrived before
+    it (RFC 4737). Forward transit times (server receive - client send) carry
+    the unknown offset between the two clocks, which cancels out of both the
+    jitter and the one-way delay standard deviation.
+    """
+
+    def __init__(self, packets, sent, arrivals, errors=0):
+        self.packets = packets
+        self.sent = sent
+        self.errors = errors
+        seen = bytearray(packets)
+        unique = []
+        self.duplicates = self.reordered = 0
+        highest = -1
+        for arrival in arrivals:
+            sequence = arrival[0]
+            if seen[sequence]:
+                self.duplicates += 1
+                continue
+            seen[sequence] = 1
+            if sequence < highest:
+                self.reordered += 1
+            else:
+                highest = sequence
+            unique.append(arrival)
+        self.received = len(unique)
+        self.round_trips = [(received_ns - sent_ns) / 1e9 for _, sent_ns, _, received_ns in unique]
+
+        # Relative to the first packet, in integer nanoseconds before converting, so the clock offset costs no precision
+        forward = sorted((server_ns, server_ns - sent_ns) for _, sent_ns, server_ns, _ in unique)
+        transits = [(transit - forward[0][1]) / 1e9 for _, transit in forward]
+        self.jitter = rfc3550_jitter(transits) if len(transits) > 1 else None
+        self.one_way_delay_stddev = statistics.pstdev(transits) if len(transits) > 1 else None
+
+    @property
+    def loss_ratio(self):
+        return 1 - self.received / self.sent if self.sent else None
+
+    @property
+    def reordered_ratio(self):
+        return self.reordered / self.received if self.received else None
+
+
+async def send_train(host, port, packets=100, rate=50, size=64, timeout=1.0):
+    """Send `packets` sequenced, timestamped packets at `rate` per second to a UDP echo responder
+
+    Sending is paced in batches: the sender sleeps at least SEND_TICK and then
+    sends every packet that has fallen due, so high rates do not mean one
+    event loop wakeup per packet. Echoes are read the same way, draining the
+    socket on each readiness callback. After the last packet is sent,
+    stragglers are awaited for up to `timeout` seconds; anything later counts
+    as lost.
+    """
+    loop = asyncio.get_running_loop()
+    family, _, _, _, address = (await loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM))[0]
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    if KERNEL_TIMESTAMPS:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_TIMESTAMPNS, 1)
+    ancillary_size = socket.CMSG_SPACE(TIMESPEC.size) if KERNEL_TIMESTAMPS else 0
+
+    train = random.getrandbits(32)
+    payload = bytearray(max(size, HEADER.size))
+    receive_buffer = bytearray(len(payload))
+    arrivals = []
+    seen = bytearray(packets)
+    unique = 0
+    errors = 0
+    done = asyncio.Event()
+
+    def drain():
+        nonlocal unique, errors
+        while True:
+            try:
+                n, ancillary, _, _ = sock.recvmsg_into([receive_buffer], ancillary_size)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # ICMP errors (e.g. port unreachable) are reported on a later receive
+                errors += 1
+                continue
+            received_ns = None
+            for level, kind, data in ancillary:
+                if level == socket.SOL_SOCKET and kind == socket.SO_TIMESTAMPNS:
+                    seconds, nanoseconds = TIMESPEC.unpack_from(data)
+                    received_ns = seconds * 1_000_000_000 + nanoseconds
+            if received_ns is None:
+                received_ns = time.time_ns()
+            if n < HEADER.size:
+                continue
+            magic, train_id, sequence, sent_ns, server_ns = HEADER.unpack_from(receive_buffer)
+            if magic != MAGIC or train_id != train or sequence >= packets:
+                continue
+            arrivals.append((sequence, sent_ns, server_ns, received_ns))
+            if not seen[sequence]:
+                seen[sequence] = 1
+                unique += 1
+        if unique == packets:
+            done.set()
+
+    sent = 0
+    loop.add_reader(sock.fileno(), drain)
+    try:
+        sock.connect(address)
+        start = time.monotonic()
+        while sent < packets:
+            due = min(packets, int((time.monotonic() - start) * rate) + 1)
+            while sent < due:
+                HEADER.pack_into(payload, 0, MAGIC, train, sent, time.time_ns(), 0)
+                try:
+                    sock.send(payload)
+                except (BlockingIOError, InterruptedError):
+                    # Send buffer full; the rest of the batch goes out next tick
+                    break
+                except OSError:
+                    # e.g. ECONNREFUSED left by an earlier ICMP error; the packet counts as lost
+                    errors += 1
+                sent += 1
+            if sent < packets:
+                await asyncio.sleep(max(start + sent / rate - time.monotonic(), SEND_TICK))
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        drain()
+    finally:
+        loop.remove_reader(sock.fileno())
+        sock.close()
+    return TrainResult(packets, sent, arrivals, errors)
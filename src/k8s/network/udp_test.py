@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+
+from k8s.network.metrics import Counter, Gauge
+
+from k8s.network.instrumentation import count_error
+from k8s.network.test import NetworkTest, load_common_config_from_env
+from k8s.utils.udp_echo_server import DEFAULT_PORT
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('network-test')
+
+UDP_METRICS = {
+    'sent': Counter('udp_packets_sent_total', 'UDP probe packets sent', ['target', 'port']),
+    'received': Counter('udp_packets_received_total', 'UDP probe packets echoed back (duplicates not counted)', ['target', 'port']),
+    'duplicates': Counter('udp_packets_duplicated_total', 'UDP probe packets echoed back more than once', ['target', 'port']),
+    'errors': Counter('udp_errors_total', 'UDP packet trains that failed, and socket errors (e.g. ICMP port unreachable) during trains', ['target', 'port']),
+    'loss': Gauge('udp_packet_loss_ratio', 'Fraction of the packets of the last train that did not come back', ['target', 'port'], multiprocess_mode='mostrecent'),
+    'reordered': Gauge('udp_packets_reordered_ratio', 'Fraction of the packets of the last train that arrived after a later one (RFC 4737)', ['target', 'port'], multiprocess_mode='mostrecent'),
+    'jitter': Gauge('udp_jitter_seconds', 'RFC 3550 interarrival jitter of the forward path over the last train', ['target', 'port'], multiprocess_mode='mostrecent'),
+    'one_way_delay_stddev': Gauge('udp_one_way_delay_stddev_seconds', 'Standard deviation of the forward one-way delay over the last train', ['target', 'port'], multiprocess_mode='mostrecent'),
+}
+
+
+class UdpNetworkTest(NetworkTest):
+    """Packet loss, jitter and reordering to UDP echo responders (udp-echo-server)
+
+    Each run sends one train of sequenced, timestamped packets at a fixed
+    rate and size. Unlike TCP, where retransmits turn loss into latency
+    spikes, loss shows up here directly, and so does the variation of the
+    forward one-way delay, which the responder's receive timestamps separate
+    from the return path.
+    """
+
+    def probe_jobs(self):
+      """One job per UDP target, each with its own interval and train settings"""
+      return [
+          self.probe_job(
+              f"udp:{target['host']}:{target.get('port', DEFAULT_PORT)}",
+              lambda target=target: self.run_udp_test_async(
+                  target['host'],
+                  target.get('port', DEFAULT_PORT),
+                  target.get('count', 100),
+                  target.get('rate', 50),
+                  target.get('size', 64),
+                  target.get('timeout', 1),
+                  quiet=True
+              ),
+              target.get('interval'),
+              spec=target
+          )
+          for target in self.config.get('udp_targets', [])
+      ]
+
+    def run_udp_test(self, host, port=DEFAULT_PORT, packets=100, rate=50, size=64, timeout=1):
+      """Send one packet train and log its results"""
+      return self.engine.run(self.run_udp_test_async(host, port, packets, rate, size, timeout))
+
+    async def run_udp_test_async(self, host, port=DEFAULT_PORT, packets=100, rate=50, size=64, timeout=1, quiet=False):
+      """Send `packets` packets of `size` bytes at `rate` per second and export what came back"""
+      labels = dict(target=host, port=port)
+      target = f"udp:{host}:{port}"
+      if not quiet:
+          logger.info(f"Sending {packets} UDP packets of {size} bytes at {rate}/s to {host}:{port}")
+      try:
+          result = await self.engine.udp_train(host, port, packets, rate, size, timeout)
+      except (OSError, asyncio.TimeoutError) as e:
+          logger.error(f"Error sending UDP train to {host}:{port} - {str(e) or type(e).__name__}")
+          self.series.labels(UDP_METRICS['errors'], **labels).inc()
+          count_error('udp', e)
+          self.record_sample(target, None)
+          return None
+
+      self.series.labels(UDP_METRICS['sent'], **labels).inc(result.sent)
+      self.series.labels(UDP_METRICS['received'], **labels).inc(result.received)
+      if result.duplicates:
+          self.series.labels(UDP_METRICS['duplicates'], **labels).inc(result.duplicates)
+      if result.errors:
+          self.series.labels(UDP_METRICS['errors'], **labels).inc(result.errors)
+      if result.loss_ratio is not None:
+          self.series.labels(UDP_METRICS['loss'], **labels).set(result.loss_ratio)
+      if result.reordered_ratio is not None:
+          self.series.labels(UDP_METRICS['reordered'], **labels).set(result.reordered_ratio)
+      if result.jitter is not None:
+          self.series.labels(UDP_METRICS['jitter'], **labels).set(result.jitter)
+          self.series.labels(UDP_METRICS['one_way_delay_stddev'], **labels).set(result.one_way_delay_stddev)
+
+      recorder = self.latency_recorder('udp_round_trip', **labels)
+      for round_trip in result.round_trips:
+          recorder.record(round_trip)
+      quantiles = recorder.export_quantiles()
+      # One sample per train: its median round trip, or a failure if nothing came back
+      self.record_sample(target, statistics.median(result.round_trips) if result.round_trips else None)
+
+      if not quiet:
+          self._log_udp_summary(host, port, result, quantiles)
+      return result
+
+    def _log_udp_summary(self, host, port, result, quantiles):
+      logger.info(f"\nUDP Results for {host}:{port}:")
+      logger.info(f"  Sent: {result.sent}, received: {result.received}, duplicates: {result.duplicates}, errors: {result.errors}")
+      if result.loss_ratio is not None:
+          logger.info(f"  Loss: {result.loss_ratio * 100:.2f}%")
+      if result.reordered_ratio is not None:
+          logger.info(f"  Reordered: {result.reordered_ratio * 100:.2f}%")
+      if result.jitter is not None:
+          logger.info(f"  Jitter (RFC 3550): {result.jitter * 1000:.3f} ms")
+          logger.info(f"  One-way delay std dev: {result.one_way_delay_stddev * 1000:.3f} ms")
+      if result.round_trips:
+          self._log_summary([rtt * 1000 for rtt in result.round_trips], quantiles)
+      else:
+          logger.warning(f"No UDP packets came back from {host}:{port}")
+
+
+def load_targets_from_env():
+    """Load this probe's targets and settings from environment variables
+
+    Settings shared by every probe type come from load_common_config_from_env.
+    """
+    config = {
+        'udp_targets': [],
+    }
+
+    # Load UDP targets (comma-separated list of host:port running udp-echo-server)
+    udp_targets = os.environ.get('UDP_TARGETS', '')
+    if udp_targets:
+        for target in udp_targets.split(','):
+            parts = target.strip().split(':')
+            config['udp_targets'].append({
+                'host': parts[0],
+                'port': int(parts[1]) if len(parts) > 1 else DEFAULT_PORT,
+                'count': int(os.environ.get('UDP_PACKETS', 100)),
+                'rate': float(os.environ.get('UDP_RATE', 50)),
+                'size': int(os.environ.get('UDP_PACKET_SIZE', 64)),
+                'timeout': float(os.environ.get('UDP_TIMEOUT', 1)),
+            })
+
+    return config
+
+def main():
+    parser = argparse.ArgumentParser(description='Kubernetes UDP Packet Loss and Jitter Test with Prometheus Metrics')
+
+    # Create subparsers for different commands
+    subparsers = parser.add_subparsers(dest='command', help='Test command')
+
+    # Single packet train
+    train_parser = subparsers.add_parser('train', help='Send one packet train to a udp-echo-server')
+    train_parser.add_argument('host', help='Hostname or IP running udp-echo-server')
+    train_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'UDP port (default: {DEFAULT_PORT})')
+    train_parser.add_argument('--packets', type=int, default=100, help='Packets in the train (default: 100)')
+    train_parser.add_argument('--rate', type=float, default=50, help='Packets per second (default: 50)')
+    train_parser.add_argument('--size', type=int, default=64, help='Packet size in bytes (default: 64)')
+    train_parser.add_argument('--timeout', type=float, default=1, help='Seconds to wait for echoes after the last packet (default: 1)')
+
+    # Daemon mode for continuous monitoring
+    subparsers.add_parser('daemon', help='Run as a daemon for continuous monitoring')
+
+    args = parser.parse_args()
+
+    config = load_common_config_from_env()
+    config.update(load_targets_from_env())
+    test = UdpNetworkTest(config)
+
+    if args.command == 'train':
+        if test.run_udp_test(args.host, args.port, args.packets, args.rate, args.size, args.timeout) is None:
+            sys.exit(1)
+    elif args.command == 'daemon':
+        try:
+            test.run_scheduler()
+        except KeyboardInterrupt:
+            logger.info("Shutting down...")
+            sys.exit(0)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
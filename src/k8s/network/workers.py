@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.sharedctypes import RawArray
+from urllib.parse import urlencode
+
+from k8s.health import HealthCheck, health_status
+
+logger = logging.getLogger('network-test')
+
+MULTIPROC_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+# Workers serve their own history, matrix and profiler here, for the parent only
+WORKER_HOST = '127.0.0.1'
+
+
+def ensure_multiprocess_dir():
+    """Make sure prometheus_client runs in multiprocess mode, re-executing if it cannot
+
+    prometheus_client picks its value storage when it is first imported, so
+    PROMETHEUS_MULTIPROC_DIR has to be set before then. If it is not set
+    (e.g. outside the chart), a fresh directory is created; metrics import
+    prometheus_client only once enabled, so normally that is still to come,
+    and only if it has already been imported does the process re-execute
+    itself with the same arguments. Files left from a previous run are
+    removed, as their values would otherwise be merged in.
+    """
+    directory = os.environ.get(MULTIPROC_ENV)
+    if not directory:
+        directory = os.environ[MULTIPROC_ENV] = tempfile.mkdtemp(prefix='network-test-metrics-')
+        if 'prometheus_client' in sys.modules:
+            os.execv(sys.executable, [sys.executable, *sys.orig_argv[1:]])
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.db'):
+            os.remove(os.path.join(directory, name))
+    return directory
+
+
+class WorkerPool:
+    """Probe worker processes, each running the scheduler for its shard of the targets
+
+    Workers are forked before the parent starts any threads. Each sets
+    worker_index/worker_count in its config, so NetworkTest.owns() gives it
+    a disjoint share of the jobs, and writes its metrics to the shared
+    multiprocess directory for the parent's /metrics to merge. Each worker
+    stamps its slot in a shared array after every probe run, and the
+    parent's /health goes by the worker that ran least recently, so one
+    stuck worker is enough to fail it. A worker that exits is restarted.
+
+    Result history, the mesh matrix and the profiler live in the workers, so
+    each worker also serves its own health API on a loopback port, and the
+    parent's /results, /summary, /matrix and /debug/profile merge theirs.
+    """
+
+    def __init__(self, create_test, config, workers):
+        self.create_test = create_test
+        self.config = config
+        self.workers = workers
+        self.health_port = config.get('worker_health_port', 18081)
+        self.last_run = RawArray('d', workers)
+        self.processes = [None] * workers
+        self._context = get_context('fork')
+
+    def worker_url(self, index, path):
+        return f"http://{WORKER_HOST}:{self.health_port + index}{path}"
+
+    def _worker(self, index):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        config = dict(self.config, worker_index=index, worker_count=self.workers)
+        if config.get('sample_log_dir'):
+            # One log per worker; the sample-log reader takes each directory on its own
+            config['sample_log_dir'] = os.path.join(config['sample_log_dir'], f"worker-{index}")
+        test = self.create_test(config)
+        test.heartbeat = lambda: self.last_run.__setitem__(index, time.time())
+        test.create_health_check().start(host=WORKER_HOST, port=self.health_port + index)
+        test.run_scheduler(serve=False)
+
+    def _spawn(self, index):
+        process = self._context.Process(target=self._worker, args=(index,), name=f"probe-worker-{index}", daemon=True)
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Started probe worker {index} (pid {process.pid})")
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        return self
+
+    def fetch(self, path, timeout=5):
+        """GET path from every worker at once, returning (status, body) per worker; status is None if it did not answer"""
+        def get(index):
+            try:
+                with urllib.request.urlopen(self.worker_url(index, path), timeout=timeout) as response:
+                    return response.status, response.read()
+            except urllib.error.HTTPError as e:
+                return e.code, e.read()
+            except (OSError, ValueError) as e:
+                logger.warning(f"Probe worker {index} did not answer {path} - {str(e) or type(e).__name__}")
+                return None, b''
+        with ThreadPoolExecutor(self.workers) as executor:
+            return list(executor.map(get, range(self.workers)))
+
+    def fetch_json(self, path, timeout=5):
+        """Decoded JSON bodies of the workers that answered path with 200"""
+        documents = []
+        for status, body in self.fetch(path, timeout):
+            if status == 200:
+                try:
+                    documents.append(json.loads(body))
+                except ValueError:
+                    logger.warning(f"Invalid JSON from a probe worker's {path}")
+        return documents
+
+    def health_check(self, mesh=False):
+        """The parent's health server, reading history, matrix and profiles from the workers"""
+        return HealthCheck(
+            config=self.config,
+            history=WorkerResults(self),
+            matrix=self.mesh_matrix if mesh else None,
+            profiler=WorkerProfiler(self) if self.config.get('profiler_enabled') else None,
+            collectors=[WorkerProcessCollector(self)]
+        )
+
+    async def mesh_matrix(self, scope="cluster"):
+        """/matrix for the whole pod: the workers' rows (or matrices) merged"""
+        documents = await asyncio.to_thread(self.fetch_json, f"/matrix?{urlencode({'scope': scope})}", 10)
+        if scope == "local":
+            return merge_mesh_rows(documents, self.config.get('node_name') or socket.gethostname())
+        return merge_mesh_matrices(documents)
+
+    def monitor(self, poll_interval=1):
+        """Restart workers that exit and publish their progress, until interrupted"""
+        from prometheus_client import multiprocess
+
+        while True:
+            time.sleep(poll_interval)
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    logger.error(f"Probe worker {index} (pid {process.pid}) exited with {process.exitcode}, restarting")
+                    multiprocess.mark_process_dead(process.pid)
+                    self._spawn(index)
+            # 0 until a worker first runs, which keeps the pod unhealthy until every worker has
+            oldest = min(self.last_run)
+            if oldest:
+                health_status["last_test_run"] = oldest
+
+    def stop(self):
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=5)
+
+
+class WorkerResults:
+    """ResultHistory's read side over the workers' /results and /summary
+
+    Every target is probed by exactly one worker, so merging is a union.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def targets(self):
+        return sorted({target for document in self.pool.fetch_json("/results") for target in document.get("targets", [])})
+
+    def results(self, target, since=None):
+        params = {'target': target} if since is None else {'target': target, 'since': since}
+        for document in self.pool.fetch_json(f"/results?{urlencode(params)}"):
+            return document.get("samples", [])
+        return None
+
+    def summary(self):
+        summary = {}
+        for document in self.pool.fetch_json("/summary"):
+            summary.update(document)
+        return summary
+
+
+class WorkerProfiler:
+    """StackSampler's dump over every worker, each stack rooted at its worker"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def dump(self, seconds):
+        stacks = []
+        for index, (status, body) in enumerate(self.pool.fetch(f"/debug/profile?seconds={seconds}", timeout=seconds + 10)):
+            if status == 200:
+                stacks.extend(f"probe-worker-{index};{line}\n" for line in body.decode().splitlines() if line)
+        return ''.join(stacks)
+
+
+class WorkerProcessCollector:
+    """CPU, memory and file descriptors of each worker process, labeled with its index
+
+    prometheus_client's process collector only sees the process it runs in,
+    and process metrics are not written to the multiprocess directory.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def collect(self):
+        from prometheus_client import ProcessCollector
+        from prometheus_client.metrics_core import Metric
+
+        families = {}
+        for index, process in enumerate(self.pool.processes):
+            if process is None or not process.is_alive():
+                continue
+            collector = ProcessCollector(namespace='probe_worker', pid=lambda pid=process.pid: pid, registry=None)
+            for family in collector.collect():
+                merged = families.setdefault(family.name, Metric(family.name, family.documentation, family.type))
+                for sample in family.samples:
+                    merged.add_sample(sample.name, {**sample.labels, 'worker': str(index)}, sample.value)
+        return list(families.values())
+
+
+def merge_mesh_rows(rows, source):
+    """One MeshMatrix.local() row from the workers' rows, each covering its own peers"""
+    merged = {"source": source, "rtt_ms": {}, "loss": {}, "updated": None}
+    for row in rows:
+        merged["source"] = row.get("source") or merged["source"]
+        merged["rtt_ms"].update(row.get("rtt_ms") or {})
+        merged["loss"].update(row.get("loss") or {})
+        if row.get("updated") is not None:
+            merged["updated"] = max(merged["updated"] or 0, row["updated"])
+    return merged
+
+
+def merge_mesh_matrices(matrices):
+    """One MeshMatrix.combine() matrix from the workers' matrices, taking each measured cell from whichever has it"""
+    nodes = sorted({node for matrix in matrices for node in matrix.get("nodes", [])})
+    merged = {
+        "nodes": nodes,
+        "rtt_ms": [[None] * len(nodes) for _ in nodes],
+        "loss": [[None] * len(nodes) for _ in nodes],
+        "unreachable": sorted({address for matrix in matrices for address in matrix.get("unreachable", [])}),
+        "updated": max((matrix.get("updated") or 0 for matrix in matrices), default=None),
+    }
+    position = {node: i for i, node in enumerate(nodes)}
+    for matrix in matrices:
+        index = [position[node] for node in matrix.get("nodes", [])]
+        for key in ("rtt_ms", "loss"):
+            for i, row in zip(index, matrix.get(key, [])):
+                for j, value in zip(index, row):
+                    if value is not None and merged[key][i][j] is None:
+                        merged[key][i][j] = value
+    return merged
@@ -0,0 +1,220 @@
+from flask import Flask, Response, request, jsonify
+import json
+import threading
+import argparse
+
+app = Flask(__name__)
+
+# Resource name in the URL -> (API path prefix, kind, namespaced)
+RESOURCES = {
+    'services': ('/api/v1', 'Service', True),
+    'nodes': ('/api/v1', 'Node', False),
+    'endpointslices': ('/apis/discovery.k8s.io/v1', 'EndpointSlice', True),
+    'pods': ('/api/v1', 'Pod', True),
+}
+
+MAX_EVENTS = 10000
+
+class FakeCluster:
+    """In-memory objects with resourceVersions and a watch event log
+
+    Enough of the API server for list + watch clients: every change bumps a
+    cluster-wide resourceVersion and is appended to a bounded event log that
+    watches replay from. A watch from a version older than the log gets
+    410 Gone, like a real API server after compaction.
+    """
+
+    def __init__(self):
+        self.objects = {resource: {} for resource in RESOURCES}
+        self.events = []
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def _key(self, obj):
+        metadata = obj['metadata']
+        return (metadata.get('namespace', ''), metadata['name'])
+
+    def put(self, resource, obj):
+        with self.changed:
+            self.version += 1
+            obj.setdefault('metadata', {})['resourceVersion'] = str(self.version)
+            obj.setdefault('kind', RESOURCES[resource][1])
+            key = self._key(obj)
+            kind = 'MODIFIED' if key in self.objects[resource] else 'ADDED'
+            self.objects[resource][key] = obj
+            self._append(resource, kind, obj)
+        return obj
+
+    def delete(self, resource, namespace, name):
+        with self.changed:
+            obj = self.objects[resource].pop((namespace or '', name), None)
+            if obj is None:
+                return None
+            self.version += 1
+            obj = {**obj, 'metadata': {**obj['metadata'], 'resourceVersion': str(self.version)}}
+            self._append(resource, 'DELETED', obj)
+        return obj
+
+    def _append(self, resource, kind, obj):
+        self.events.append((self.version, resource, kind, obj))
+        del self.events[:-MAX_EVENTS]
+        self.changed.notify_all()
+
+    def list(self, resource, namespace=None, selector=None):
+        with self.changed:
+            items = [obj for obj in self.objects[resource].values() if matches(obj, namespace, selector)]
+            return items, str(self.version)
+
+    def events_since(self, version, resource, namespace=None, selector=None):
+        """Events after version, or None if the log no longer reaches back that far"""
+        if self.events and self.events[0][0] > version + 1:
+            return None
+        return [
+            (event_version, kind, obj) for event_version, event_resource, kind, obj in self.events
+            if event_version > version and event_resource == resource and matches(obj, namespace, selector)
+        ]
+
+cluster = FakeCluster()
+
+def parse_selector(selector):
+    """Equality-based label selector: 'a=b,c!=d,e' (e: label exists)"""
+    terms = []
+    for term in filter(None, (t.strip() for t in (selector or '').split(','))):
+        if '!=' in term:
+            key, value = term.split('!=', 1)
+            terms.append((key.strip(), '!=', value.strip()))
+        elif '=' in term:
+            key, value = term.split('=', 1)
+            terms.append((key.strip().rstrip('='), '=', value.strip()))
+        else:
+            terms.append((term, 'exists', None))
+    return terms
+
+def matches(obj, namespace=None, selector=None):
+    metadata = obj['metadata']
+    if namespace and metadata.get('namespace') != namespace:
+        return False
+    labels = metadata.get('labels') or {}
+    for key, op, value in selector or []:
+        if op == 'exists' and key not in labels:
+            return False
+        if op == '=' and labels.get(key) != value:
+            return False
+        if op == '!=' and labels.get(key) == value:
+            return False
+    return True
+
+def status(code, reason, message):
+    return jsonify({"kind": "Status", "apiVersion": "v1", "status": "Failure", "reason": reason, "message": message, "code": code}), code
+
+def list_or_watch(resource, namespace=None):
+    selector = parse_selector(request.args.get('labelSelector'))
+    if request.args.get('watch') not in ('true', '1'):
+        items, version = cluster.list(resource, namespace, selector)
+        prefix, kind, _ = RESOURCES[resource]
+        return jsonify({
+            "kind": f"{kind}List",
+            "apiVersion": prefix.split('/', 2)[-1],
+            "metadata": {"resourceVersion": version},
+            "items": items,
+        })
+
+    try:
+        since = int(request.args.get('resourceVersion') or cluster.version)
+    except ValueError:
+        return status(400, "BadRequest", "invalid resourceVersion")
+    timeout = min(float(request.args.get('timeoutSeconds', 300)), 1800)
+    if cluster.events_since(since, resource) is None:
+        return status(410, "Expired", f"too old resource version: {since}")
+
+    def stream():
+        version = since
+        deadline = threading.Event()
+        timer = threading.Timer(timeout, deadline.set)
+        timer.start()
+        try:
+            while not deadline.is_set():
+                with cluster.changed:
+                    events = cluster.events_since(version, resource, namespace, selector)
+                    if events == [] and cluster.version == version:
+                        cluster.changed.wait(1)
+                        continue
+                    version = cluster.version
+                if events is None:
+                    yield json.dumps({"type": "ERROR", "object": {"kind": "Status", "code": 410, "message": "too old resource version"}}) + '\n'
+                    return
+                for _, kind, obj in events:
+                    yield json.dumps({"type": kind, "object": obj}) + '\n'
+        finally:
+            timer.cancel()
+
+    return Response(stream(), mimetype='application/json')
+
+@app.route('/api/v1/<resource>')
+@app.route('/apis/discovery.k8s.io/v1/<resource>')
+def cluster_scope(resource):
+    if resource not in RESOURCES or not request.path.startswith(RESOURCES[resource][0] + '/'):
+        return status(404, "NotFound", "the server could not find the requested resource")
+    return list_or_watch(resource)
+
+@app.route('/api/v1/namespaces/<namespace>/<resource>')
+@app.route('/apis/discovery.k8s.io/v1/namespaces/<namespace>/<resource>')
+def namespace_scope(namespace, resource):
+    if resource not in RESOURCES or not RESOURCES[resource][2] or not request.path.startswith(RESOURCES[resource][0] + '/'):
+        return status(404, "NotFound", "the server could not find the requested resource")
+    return list_or_watch(resource, namespace)
+
+@app.route('/fake/<resource>', methods=['PUT'])
+def put_object(resource):
+    """Create or replace an object; the body is the object as JSON"""
+    if resource not in RESOURCES:
+        return status(404, "NotFound", f"unknown resource {resource}")
+    obj = request.get_json(force=True)
+    if not obj.get('metadata', {}).get('name'):
+        return status(400, "BadRequest", "metadata.name is required")
+    return jsonify(cluster.put(resource, obj))
+
+@app.route('/fake/<resource>/<name>', methods=['DELETE'])
+@app.route('/fake/<resource>/<namespace>/<name>', methods=['DELETE'])
+def delete_object(resource, name, namespace=None):
+    if resource not in RESOURCES:
+        return status(404, "NotFound", f"unknown resource {resource}")
+    obj = cluster.delete(resource, namespace, name)
+    if obj is None:
+        return status(404, "NotFound", f"{resource} {name} not found")
+    return jsonify(obj)
+
+@app.route('/health')
+def health():
+    return jsonify({"status": "healthy", "resourceVersion": cluster.version})
+
+def load_state(path):
+    """Seed the cluster from a JSON file: {"services": [...], "endpointslices": [...], "nodes": [...]}"""
+    with open(path) as f:
+        state = json.load(f)
+    for resource, objects in state.items():
+        for obj in objects:
+            cluster.put(resource, obj)
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Kubernetes API server for testing endpoint discovery')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind to')
+    parser.add_argument('--port', type=int, default=8001, help='Port to listen on')
+    parser.add_argument('--state', help='JSON file of initial services, endpointslices and nodes')
+
+    args = parser.parse_args()
+
+    if args.state:
+        load_state(args.state)
+
+    print(f"Starting fake API server on {args.host}:{args.port}")
+    print("Available endpoints:")
+    print("  /api/v1/[namespaces/<ns>/]services, /api/v1/nodes - List, or watch with ?watch=true")
+    print("  /apis/discovery.k8s.io/v1/[namespaces/<ns>/]endpointslices - List, or watch with ?watch=true")
+    print("  PUT /fake/<resource> - Create or replace an object")
+    print("  DELETE /fake/<resource>/[<namespace>/]<name> - Delete an object")
+
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Import-time benchmark for the one-shot command-line tools
+
+A one-shot probe (ping-test tcp, tls-test handshake, ...) runs for well
+under a second, so its startup matters as much as the probe itself. Each
+entry module is imported in a fresh interpreter and timed, and the modules
+that only daemon mode needs (the web server, prometheus_client, YAML) must
+not have been loaded along the way. Results are printed as JSON; the exit
+status is 1 if a module is over the budget or loads a deferred module.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Seconds an entry module may take to import, on top of interpreter startup
+IMPORT_BUDGET = 0.1
+
+# Entry modules of the one-shot commands
+ENTRY_MODULES = [
+    'k8s.network.ping_test',
+    'k8s.network.http_test',
+    'k8s.network.k8s_svc_test',
+    'k8s.network.k8s_node_test',
+    'k8s.network.bandwidth_test',
+    'k8s.network.udp_test',
+    'k8s.network.tls_test',
+    'k8s.network.k8s_discovery_test',
+    'k8s.network.targets',
+]
+
+# Loaded only once daemon mode (or a targets file) needs them
+DEFERRED_MODULES = ['fastapi', 'uvicorn', 'starlette', 'prometheus_client', 'flask', 'yaml']
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def import_once(module):
+    """(seconds to import module, deferred modules it loaded), in a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE.format(module=module, deferred=DEFERRED_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    measurement = json.loads(output.splitlines()[-1])
+    return measurement["elapsed"], measurement["loaded"]
+
+
+def interpreter_startup(repeats):
+    """Fastest wall time of starting and stopping a bare interpreter, for reference"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmarks(modules=ENTRY_MODULES, repeats=5, budget=IMPORT_BUDGET):
+    """Fastest of `repeats` imports of each module, checked against the budget
+
+    The first import of each module also compiles its bytecode, so it is
+    run once before timing.
+    """
+    results = {}
+    for module in modules:
+        import_once(module)
+        best, loaded = None, set()
+        for _ in range(repeats):
+            elapsed, deferred = import_once(module)
+            best = elapsed if best is None else min(best, elapsed)
+            loaded.update(deferred)
+        results[module] = {
+            "import_ms": round(best * 1000, 1),
+            "deferred_loaded": sorted(loaded),
+            "over_budget": best > budget,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import time of the one-shot command-line tools')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed imports per module; the fastest counts (default: 5)')
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET, help=f'Seconds each import may take (default: {IMPORT_BUDGET})')
+    parser.add_argument('modules', nargs='*', default=ENTRY_MODULES, help='Modules to import (default: every one-shot entry module)')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.modules, args.repeats, args.budget)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "budget_ms": round(args.budget * 1000, 1),
+        "interpreter_startup_ms": round(interpreter_startup(args.repeats) * 1000, 1),
+        "imports": results,
+    }
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    failed = any(entry["over_budget"] or entry["deferred_loaded"] for entry in results.values())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Probe overhead benchmarks against servers on localhost
+
+Starts test_http_server and a raw TCP listener, then measures how much each
+probe path costs per sample and how many samples per second it sustains.
+With loopback targets the network time is close to zero, so what remains is
+the prober's own overhead. Results are printed as JSON and can be compared
+with a saved baseline to hold probe changes to a performance budget.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from k8s.network.k8s_node_test import NodeNetworkTest
+from k8s.network.metrics import enable as enable_metrics
+from k8s.network.test import METRICS
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class TcpListener:
+    """Accepts connections on localhost and closes them immediately"""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1024)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+class HttpServer:
+    """test_http_server in a subprocess"""
+
+    def __init__(self, workers=2):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'k8s.utils.test_http_server', '--host', '127.0.0.1', '--port', str(self.port), '--workers', str(workers)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                urllib.request.urlopen(f"{self.url}/health", timeout=1).read()
+                return
+            except OSError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.close()
+                    raise RuntimeError("test_http_server did not start")
+                time.sleep(0.1)
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+def measure(run, repeats=3):
+    """Run `run` once to warm up, then return (elapsed, run's return value) of the fastest of `repeats` runs
+
+    The minimum is the run least disturbed by the rest of the machine, which
+    keeps comparisons against a baseline stable.
+    """
+    run()
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, value)
+    return best
+
+
+def result(samples, elapsed, reported=None):
+    entry = {
+        "samples": samples,
+        "per_sample_us": round(elapsed / samples * 1e6, 2),
+        "samples_per_second": round(samples / elapsed, 1),
+    }
+    if reported is not None:
+        # Wall time per sample that the probe did not report as latency
+        entry["reported_us"] = round(reported / samples * 1e6, 2)
+        entry["overhead_us"] = round((elapsed - reported) / samples * 1e6, 2)
+    return entry
+
+
+def run_benchmarks(samples=2000, concurrency=100):
+    # As in daemon mode, so metrics_update measures real metric updates
+    enable_metrics()
+    test = NodeNetworkTest({'concurrency': concurrency, 'metric_max_series': 100000})
+    listener = TcpListener()
+    server = HttpServer()
+    results = {}
+    try:
+        url = f"{server.url}/health"
+
+        for mode in ('cold', 'pooled'):
+
+            def sequential(mode=mode):
+                reported = 0.0
+                for _ in range(samples):
+                    sample = test.http_request(url, mode=mode)
+                    reported += sample["elapsed"] if sample else 0.0
+                return reported
+
+            results[f"http_request_{mode}"] = result(samples, *measure(sequential))
+
+            def concurrent(mode=mode):
+                test.run_concurrently([test.http_request_async(url, mode=mode) for _ in range(samples)])
+
+            results[f"http_request_{mode}_concurrent"] = result(samples, measure(concurrent)[0])
+
+        def ping():
+            return sum(test.ping_host('127.0.0.1', listener.port) or 0.0 for _ in range(samples))
+
+        results["ping_host"] = result(samples, *measure(ping))
+
+        def scan():
+            test.scan_k8s_nodes(['127.0.0.1'] * samples, port=listener.port, count=1, quiet=True)
+
+        results["scan_k8s_nodes"] = result(samples, measure(scan)[0])
+
+        def metrics():
+            # Everything http_request_async does with a sample, without the request
+            for _ in range(samples):
+                test.series.labels(METRICS['http_request_time'], url=url, status_class='2xx').observe(0.001)
+                test.latency_recorder('http_request', url=url).record(0.001)
+                test.series.labels(METRICS['http_throughput'], url=url).set(1e6)
+                for phase in ('connect', 'ttfb', 'transfer'):
+                    test.series.labels(METRICS['http_phase_time'], url=url, phase=phase).observe(0.0003)
+                test.record_sample(f"http:{url}", 0.001, 200)
+
+        results["metrics_update"] = result(samples, measure(metrics)[0])
+    finally:
+        server.close()
+        listener.close()
+        test.engine.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Per-benchmark change in per-sample cost against the baseline"""
+    comparison = {}
+    for name, entry in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = entry["per_sample_us"] / base["per_sample_us"] - 1
+        comparison[name] = {
+            "baseline_per_sample_us": base["per_sample_us"],
+            "change": round(change, 4),
+            "regression": change > tolerance,
+        }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure probe overhead against local servers')
+    parser.add_argument('--samples', type=int, default=2000, help='Samples per benchmark (default: 2000)')
+    parser.add_argument('--concurrency', type=int, default=100, help='Probe engine concurrency (default: 100)')
+    parser.add_argument('--baseline', help='Compare with this baseline JSON; exit 1 if a benchmark regresses')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed per-sample cost increase over the baseline (default: 0.2)')
+    parser.add_argument('--save-baseline', help='Write the results to this file as the new baseline')
+    args = parser.parse_args()
+
+    # Errors from the probes would swamp the output; results carry the numbers
+    logging.getLogger('network-test').setLevel(logging.CRITICAL)
+
+    results = run_benchmarks(args.samples, args.concurrency)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "benchmarks": results,
+    }
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline["benchmarks"], args.tolerance)
+        regressed = any(entry["regression"] for entry in report["comparison"].values())
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({k: v for k, v in report.items() if k != "comparison"}, f, indent=2)
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,118 +1,352 @@
-from flask import Flask, request, jsonify
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from multiprocessing import get_context
+from multiprocessing.sharedctypes import RawArray
+from typing import Optional
+from urllib.parse import parse_qsl
+import asyncio
+import json
+import os
+import signal
 import time
 import socket
 import random
 import threading
 import argparse
+import uvicorn
 
-app = Flask(__name__)
+app = FastAPI(title="Test HTTP Service", docs_url=None, redoc_url=None, openapi_url=None)
 
-# Track some basic stats
-request_stats = {
-    "total_requests": 0,
-    "start_time": time.time(),
-    "paths": {}
-}
+MAX_BANDWIDTH_SECONDS = 300
+MAX_DOWNLOAD_BYTES = 4 * 1024 * 1024 * 1024  # 4GB
+MAX_RANDOM_SIZE = 10 * 1024 * 1024  # 10MB
+# Idle seconds a keep-alive connection is held open, longer than typical probe intervals
+KEEP_ALIVE_SECONDS = 75
 
-@app.route('/health')
-def health():
+# Maps every byte value onto 4 letters: 2 bits of entropy per byte, so gzip
+# and friends shrink it roughly 4:1 while it still varies between blocks
+COMPRESSIBLE_TABLE = bytes(b'ACGT'[i % 4] for i in range(256))
+
+class PayloadPool:
+    """Random payload blocks generated once at startup
+
+    Responses are streamed block by block straight out of the pool, starting
+    at a random block so consecutive responses differ. Full blocks are yielded
+    as-is with no copy; only the final partial block of a response is sliced.
+    ASGI body messages carry bytes, which is why blocks aren't memoryviews.
+    """
+
+    KINDS = ('random', 'compressible')
+
+    def __init__(self, block_size=64 * 1024, blocks=64):
+        self.block_size = block_size
+        self.blocks = {
+            'random': [os.urandom(block_size) for _ in range(blocks)],
+            'compressible': [os.urandom(block_size).translate(COMPRESSIBLE_TABLE) for _ in range(blocks)],
+        }
+
+    def stream(self, size, kind='random'):
+        """Yield exactly `size` bytes of pooled payload"""
+        blocks = self.blocks[kind]
+        i = random.randrange(len(blocks))
+        remaining = size
+        while remaining > 0:
+            block = blocks[i % len(blocks)]
+            i += 1
+            yield block if remaining >= len(block) else block[:remaining]
+            remaining -= len(block)
+
+    def forever(self, kind='random'):
+        """Yield pooled blocks until the consumer stops"""
+        blocks = self.blocks[kind]
+        i = random.randrange(len(blocks))
+        while True:
+            yield blocks[i % len(blocks)]
+            i += 1
+
+payload_pool = PayloadPool()
+
+async def iterate(blocks):
+    """Hand pooled blocks to the server without a threadpool hop per block"""
+    for block in blocks:
+        yield block
+
+class RequestStats:
+    """Request counters sharded per worker process
+
+    Counters live in shared memory with one row per worker. A worker only
+    writes its own row, so workers never contend with each other; /stats,
+    whichever worker serves it, sums the rows. Each row also keeps per-second
+    request counts for the last WINDOW seconds, from which the current and
+    peak requests/sec are derived.
+    """
+
+    WINDOW = 60
+
+    def __init__(self, routes, workers=1):
+        self.routes = list(routes)
+        self.workers = workers
+        self.worker = 0
+        self.start_time = time.time()
+        self._route_index = {route: i + 1 for i, route in enumerate(self.routes)}
+        self._row = len(self.routes) + 1  # total, then one counter per route
+        self._counts = RawArray('Q', workers * self._row)
+        self._seconds = RawArray('Q', workers * self.WINDOW)
+        self._epochs = RawArray('Q', workers * self.WINDOW)
+        # Only guards threads within this worker; requests share one event loop
+        self._lock = threading.Lock()
+
+    def record(self, route):
+        now = int(time.time())
+        base = self.worker * self._row
+        slot = self.worker * self.WINDOW + now % self.WINDOW
+        with self._lock:
+            self._counts[base] += 1
+            index = self._route_index.get(route)
+            if index is not None:
+                self._counts[base + index] += 1
+            if self._epochs[slot] != now:
+                self._epochs[slot] = now
+                self._seconds[slot] = 0
+            self._seconds[slot] += 1
+
+    def snapshot(self):
+        now = int(time.time())
+        totals = [0] * self._row
+        for worker in range(self.workers):
+            base = worker * self._row
+            for i in range(self._row):
+                totals[i] += self._counts[base + i]
+
+        # Requests per complete second over the window, summed across workers
+        per_second = {}
+        for i in range(self.workers * self.WINDOW):
+            epoch = self._epochs[i]
+            if now - self.WINDOW <= epoch < now:
+                per_second[epoch] = per_second.get(epoch, 0) + self._seconds[i]
+
+        uptime = time.time() - self.start_time
+        return {
+            "total_requests": totals[0],
+            "uptime_seconds": uptime,
+            "requests_per_second": totals[0] / uptime if uptime > 0 else 0,
+            "current_requests_per_second": per_second.get(now - 1, 0),
+            "peak_requests_per_second": max(per_second.values(), default=0),
+            "workers": self.workers,
+            "paths": {route: totals[i + 1] for i, route in enumerate(self.routes) if totals[i + 1]},
+        }
+
+# Replaced once all routes are registered (see below)
+request_stats = None
+
+@app.get('/health')
+async def health(request: Request):
     """Simple health check endpoint"""
-    update_stats(request.path)
-    return jsonify({
+    update_stats(request)
+    return {
         "status": "healthy",
         "timestamp": time.time()
-    })
+    }
 
-@app.route('/echo', methods=['GET', 'POST'])
-def echo():
+@app.api_route('/echo', methods=['GET', 'POST'])
+async def echo(request: Request):
     """Echo back request information"""
-    update_stats(request.path)
+    update_stats(request)
     
     # Collect request information
     info = {
         "method": request.method,
         "headers": dict(request.headers),
-        "args": dict(request.args),
-        "remote_addr": request.remote_addr,
+        "args": dict(request.query_params),
+        "remote_addr": request.client.host if request.client else None,
         "timestamp": time.time()
     }
     
     # Add body if present
-    if request.is_json:
-        info["json"] = request.get_json()
-    elif request.form:
-        info["form"] = dict(request.form)
-    elif request.data:
-        info["data"] = request.data.decode('utf-8', errors='replace')
+    body = await request.body()
+    content_type = request.headers.get('content-type', '')
+    if content_type.startswith('application/json'):
+        info["json"] = json.loads(body or b'null')
+    elif content_type.startswith('application/x-www-form-urlencoded'):
+        info["form"] = dict(parse_qsl(body.decode('utf-8', errors='replace')))
+    elif body:
+        info["data"] = body.decode('utf-8', errors='replace')
         
-    return jsonify(info)
+    return info
 
-@app.route('/delay/<float:seconds>')
-def delay(seconds):
+@app.get('/delay/{seconds}')
+async def delay(request: Request, seconds: float):
     """Respond after a specified delay"""
-    update_stats(request.path)
+    update_stats(request)
     
     # Cap maximum delay for safety
     seconds = min(seconds, 30.0)
     
-    # Sleep for the specified time
-    time.sleep(seconds)
+    # Waiting doesn't hold up other requests on this worker
+    await asyncio.sleep(seconds)
     
-    return jsonify({
+    return {
         "delayed_for": seconds,
         "timestamp": time.time()
-    })
+    }
 
-@app.route('/random/<int:size>')
-def random_data(size):
-    """Return random data of specified size in bytes"""
-    update_stats(request.path)
+@app.get('/random/{size}')
+async def random_data(request: Request, size: int, payload: str = 'random'):
+    """Return random data of specified size in bytes (?payload=random|compressible)"""
+    update_stats(request)
     
     # Cap maximum size for safety
-    size = min(size, 10 * 1024 * 1024)  # 10MB max
-    
-    # Generate random bytes
-    random_bytes = bytearray(random.getrandbits(8) for _ in range(size))
+    size = max(0, min(size, MAX_RANDOM_SIZE))
     
-    return random_bytes
+    # Stream pre-generated blocks rather than generating bytes per request
+    return StreamingResponse(
+        iterate(payload_pool.stream(size, payload_kind(payload))),
+        media_type='application/octet-stream',
+        headers={'Content-Length': str(size)}
+    )
 
-@app.route('/stats')
-def stats():
+def payload_kind(kind):
+    return kind if kind in PayloadPool.KINDS else 'random'
+
+@app.get('/download')
+async def download(request: Request, seconds: float = 10.0, limit: Optional[int] = Query(None, alias='bytes'), payload: str = 'random'):
+    """Stream data for ?seconds=N (default 10, at most 300), or ?bytes=N bytes (at most 4GB), for bandwidth tests"""
+    update_stats(request)
+
+    seconds = min(seconds, MAX_BANDWIDTH_SECONDS)
+    kind = payload_kind(payload)
+
+    if limit is not None:
+        if limit < 0:
+            return JSONResponse({"error": "bytes must not be negative"}, status_code=400)
+        limit = min(limit, MAX_DOWNLOAD_BYTES)
+        return StreamingResponse(
+            iterate(payload_pool.stream(limit, kind)),
+            media_type='application/octet-stream',
+            headers={'Content-Length': str(limit)}
+        )
+
+    async def generate():
+        deadline = time.monotonic() + seconds
+        for block in payload_pool.forever(kind):
+            if time.monotonic() >= deadline:
+                return
+            yield block
+
+    return StreamingResponse(generate(), media_type='application/octet-stream')
+
+@app.api_route('/upload', methods=['POST', 'PUT'])
+async def upload(request: Request):
+    """Read and discard the request body, reporting how much arrived and how fast"""
+    update_stats(request)
+
+    start = time.monotonic()
+    received = 0
+    async for block in request.stream():
+        received += len(block)
+    elapsed = time.monotonic() - start
+
+    return {
+        "received_bytes": received,
+        "elapsed_seconds": elapsed,
+        "bits_per_second": received * 8 / elapsed if elapsed > 0 else 0,
+        "timestamp": time.time()
+    }
+
+@app.get('/stats')
+async def stats(request: Request):
     """Return basic usage statistics"""
-    update_stats(request.path)
+    update_stats(request)
     
-    uptime = time.time() - request_stats["start_time"]
-    
-    return jsonify({
-        "total_requests": request_stats["total_requests"],
-        "uptime_seconds": uptime,
-        "requests_per_second": request_stats["total_requests"] / uptime if uptime > 0 else 0,
-        "hostname": socket.gethostname(),
-        "paths": request_stats["paths"]
-    })
-
-def update_stats(path):
-    """Update request statistics"""
-    request_stats["total_requests"] += 1
-    request_stats["paths"][path] = request_stats["paths"].get(path, 0) + 1
+    stats = request_stats.snapshot()
+    stats["hostname"] = socket.gethostname()
+    stats["worker_pid"] = os.getpid()
+    return stats
+
+def update_stats(request):
+    """Update request statistics, keyed by route so the set of counters is fixed"""
+    route = request.scope.get('route')
+    request_stats.record(route.path if route else request.url.path)
+
+request_stats = RequestStats(route.path for route in app.routes)
+
+def listen(host, port):
+    """Bind the listening socket shared by every worker"""
+    # An explicit IPPROTO_TCP makes asyncio set TCP_NODELAY on accepted
+    # connections; otherwise Nagle holds back the body written after the
+    # headers until the client's delayed ACK, adding ~40ms per request
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    return sock
+
+def serve_worker(worker, sock, log_level='warning'):
+    """Serve requests on an inherited listening socket in a worker process"""
+    request_stats.worker = worker
+    # One event loop per worker; connections stay open between requests
+    config = uvicorn.Config(
+        app,
+        log_level=log_level,
+        access_log=log_level == 'debug',
+        timeout_keep_alive=KEEP_ALIVE_SECONDS,
+        timeout_graceful_shutdown=5,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+def serve(host, port, workers):
+    """Pre-fork `workers` processes sharing one listening socket"""
+    global request_stats
+    request_stats = RequestStats(request_stats.routes, workers)
+
+    sock = listen(host, port)
+    context = get_context('fork')
+    processes = [
+        context.Process(target=serve_worker, args=(i, sock), daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def shutdown(signum, frame):
+        for process in processes:
+            process.terminate()
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for process in processes:
+        process.join()
 
 def main():
     parser = argparse.ArgumentParser(description='Simple HTTP Service for Network Testing')
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
-    parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--debug', action='store_true', help='Serve from a single process with debug logging')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVER_WORKERS', 1)), help='Worker processes, each running an event loop (default: SERVER_WORKERS or 1)')
+    parser.add_argument('--block-size', type=int, default=64 * 1024, help='Size of each pre-generated payload block (default: 65536)')
+    parser.add_argument('--pool-blocks', type=int, default=64, help='Number of pre-generated payload blocks per payload kind (default: 64)')
     
     args = parser.parse_args()
+
+    global payload_pool
+    payload_pool = PayloadPool(args.block_size, args.pool_blocks)
     
     print(f"Starting HTTP service on {args.host}:{args.port}")
     print("Available endpoints:")
     print("  /health - Health check endpoint")
     print("  /echo - Echo back request information")
     print("  /delay/<seconds> - Respond after specified delay")
-    print("  /random/<size> - Return random data of specified size in bytes")
+    print("  /random/<size>?payload=random|compressible - Return random data of specified size in bytes")
+    print("  /download?seconds=<n>|bytes=<n> - Stream data for bandwidth tests")
+    print("  /upload - Discard an uploaded body and report throughput")
     print("  /stats - Return usage statistics")
     
-    app.run(host=args.host, port=args.port, debug=args.debug)
+    if args.debug:
+        serve_worker(0, listen(args.host, args.port), log_level='debug')
+    else:
+        print(f"Serving with {args.workers} worker process(es)")
+        serve(args.host, args.port, args.workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import argparse
+import socket
+import struct
+import time
+
+# Probe packet header: magic, train id, sequence number, client send time and
+# server receive time (both in nanoseconds, each on its own host's clock).
+# The rest of the packet is padding up to the probe's packet size.
+HEADER = struct.Struct('!4sIIqq')
+MAGIC = b'NTUE'
+SERVER_TIME = struct.Struct('!q')
+SERVER_TIME_OFFSET = 20
+
+DEFAULT_PORT = 9000
+MAX_DATAGRAM = 65535
+
+
+def serve(host, port, receive_buffer=4 * 1024 * 1024, stats_interval=0):
+    """Echo every datagram back to its sender until interrupted
+
+    Probe packets (see HEADER) get the server's receive time written into
+    them before they are echoed, so the probe can separate the forward one-way
+    delay variation from the round trip; any other datagram is echoed as-is.
+    One preallocated buffer is reused for every packet, and a packet is
+    stamped in place without unpacking the rest of it. The socket's receive
+    buffer is enlarged so packet trains are queued rather than dropped while
+    the loop is busy.
+    """
+    family, _, _, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM, flags=socket.AI_PASSIVE)[0]
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    sock.bind(address)
+    buffer = bytearray(MAX_DATAGRAM)
+    view = memoryview(buffer)
+    received = stamped = dropped = 0
+    next_report = time.monotonic() + stats_interval if stats_interval else None
+
+    while True:
+        n, sender = sock.recvfrom_into(buffer)
+        received += 1
+        if n >= HEADER.size and buffer[:4] == MAGIC:
+            SERVER_TIME.pack_into(buffer, SERVER_TIME_OFFSET, time.time_ns())
+            stamped += 1
+        try:
+            sock.sendto(view[:n], sender)
+        except OSError:
+            # Send buffer full or the sender went away; UDP gives no guarantees either way
+            dropped += 1
+        if next_report is not None and time.monotonic() >= next_report:
+            print(f"received={received} probe_packets={stamped} send_failures={dropped}", flush=True)
+            next_report += stats_interval
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UDP echo responder for the UDP packet-train probe')
+    parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--receive-buffer', type=int, default=4 * 1024 * 1024, help='Socket receive buffer in bytes (default: 4 MiB)')
+    parser.add_argument('--stats-interval', type=float, default=0, help='Print packet counts every this many seconds (default: never)')
+
+    args = parser.parse_args()
+
+    print(f"Starting UDP echo responder on {args.host}:{args.port}")
+    try:
+        serve(args.host, args.port, args.receive_buffer, args.stats_interval)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import asyncio
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from k8s.network.discovery import EndpointDiscovery, Informer, KubeApi
+from k8s.network.k8s_discovery_test import DiscoveryNetworkTest
+from k8s.network.k8s_node_test import NodeNetworkTest
+from k8s.utils import fake_api_server
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    cluster = fake_api_server.FakeCluster()
+    monkeypatch.setattr(fake_api_server, 'cluster', cluster)
+    return cluster
+
+
+@pytest.fixture
+def api_server(cluster):
+    server = make_server('127.0.0.1', 0, fake_api_server.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    thread.join()
+
+
+def node(name, address, ready=True, labels=None):
+    return {
+        'metadata': {'name': name, 'labels': labels or {}},
+        'status': {
+            'conditions': [{'type': 'Ready', 'status': 'True' if ready else 'False'}],
+            'addresses': [{'type': 'InternalIP', 'address': address}],
+        },
+    }
+
+
+def service(name, namespace='default'):
+    return {'metadata': {'name': name, 'namespace': namespace}}
+
+
+def endpoint_slice(name, service, addresses, namespace='default', port=80):
+    return {
+        'metadata': {'name': name, 'namespace': namespace, 'labels': {'kubernetes.io/service-name': service}},
+        'addressType': 'IPv4',
+        'ports': [{'port': port, 'protocol': 'TCP'}],
+        'endpoints': [
+            {'addresses': [address], 'conditions': {'ready': ready}, 'targetRef': {'kind': 'Pod', 'name': pod}}
+            for pod, address, ready in addresses
+        ],
+    }
+
+
+async def eventually(predicate, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met before the timeout")
+        await asyncio.sleep(0.02)
+
+
+def counting_lists(informer):
+    """Count the informer's full lists, to tell a relist from a resumed watch"""
+    calls = []
+    original = informer.list
+
+    async def list():
+        calls.append(True)
+        await original()
+
+    informer.list = list
+    return calls
+
+
+def run_informer(informer, scenario):
+    async def main():
+        task = asyncio.ensure_future(informer.run())
+        try:
+            await scenario()
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            informer.api.close()
+    asyncio.run(main())
+
+
+def test_sync_lists_ready_endpoints_and_nodes(cluster, api_server):
+    cluster.put('services', service('web'))
+    cluster.put('services', service('other', namespace='kube-system'))
+    cluster.put('endpointslices', endpoint_slice('web-1', 'web', [('web-a', '10.1.0.5', True), ('web-b', '10.1.0.6', False)]))
+    cluster.put('nodes', node('n1', '10.0.0.1'))
+    cluster.put('nodes', node('n2', '10.0.0.2', ready=False))
+
+    discovery = EndpointDiscovery(KubeApi(api_server), namespace='default')
+    asyncio.run(discovery.sync())
+
+    assert [endpoint.name for endpoint in discovery.endpoints()] == ['default/web/web-a@10.1.0.5:80']
+    assert discovery.ready_nodes() == [('n1', '10.0.0.1')]
+    assert discovery.nodes.resource_version == str(cluster.version)
+
+
+def test_watch_applies_added_modified_and_deleted(cluster, api_server):
+    cluster.put('nodes', node('n1', '10.0.0.1'))
+    informer = Informer(KubeApi(api_server), '/api/v1/nodes')
+    lists = counting_lists(informer)
+
+    async def scenario():
+        await eventually(lambda: '/n1' in informer.items)
+
+        cluster.put('nodes', node('n2', '10.0.0.2'))
+        await eventually(lambda: '/n2' in informer.items)
+
+        cluster.put('nodes', node('n2', '10.0.0.2', labels={'zone': 'b'}))
+        await eventually(lambda: informer.items['/n2']['metadata']['labels'] == {'zone': 'b'})
+
+        cluster.delete('nodes', None, 'n1')
+        await eventually(lambda: '/n1' not in informer.items)
+        await eventually(lambda: informer.resource_version == str(cluster.version))
+
+    run_informer(informer, scenario)
+    assert sorted(informer.items) == ['/n2']
+    assert len(lists) == 1
+
+
+def test_expired_resource_version_relists(cluster, api_server, monkeypatch):
+    monkeypatch.setattr(fake_api_server, 'MAX_EVENTS', 2)
+    cluster.put('nodes', node('n1', '10.0.0.1'))
+    informer = Informer(KubeApi(api_server), '/api/v1/nodes')
+    lists = counting_lists(informer)
+    asyncio.run(informer.list())
+
+    # More changes than the event log keeps: the watch opens with 410 Gone
+    for i in range(2, 6):
+        cluster.put('nodes', node(f"n{i}", f"10.0.0.{i}"))
+    cluster.delete('nodes', None, 'n1')
+
+    async def scenario():
+        await eventually(lambda: sorted(informer.items) == ['/n2', '/n3', '/n4', '/n5'])
+
+    run_informer(informer, scenario)
+    assert len(lists) == 2
+
+
+def test_expired_event_during_watch_relists(cluster, api_server, monkeypatch):
+    monkeypatch.setattr(fake_api_server, 'MAX_EVENTS', 2)
+    cluster.put('nodes', node('n1', '10.0.0.1'))
+    informer = Informer(KubeApi(api_server), '/api/v1/nodes')
+    lists = counting_lists(informer)
+
+    async def scenario():
+        await eventually(lambda: '/n1' in informer.items)
+        # Give the watch stream time to start waiting for changes
+        await asyncio.sleep(0.3)
+        # The open watch falls behind the event log and gets an ERROR 410 event
+        with cluster.changed:
+            for i in range(2, 6):
+                cluster.put('nodes', node(f"n{i}", f"10.0.0.{i}"))
+        await eventually(lambda: sorted(informer.items) == ['/n1', '/n2', '/n3', '/n4', '/n5'])
+
+    run_informer(informer, scenario)
+    assert len(lists) == 2
+
+
+def test_discovered_nodes_do_not_share_static_node_job_names(cluster, api_server):
+    cluster.put('services', service('web'))
+    cluster.put('endpointslices', endpoint_slice('web-1', 'web', [('web-a', '10.1.0.5', True)]))
+    cluster.put('nodes', node('n1', '10.0.0.1'))
+
+    test = DiscoveryNetworkTest({'discovery_enabled': True, 'discovery_api_server': api_server, 'interval_seconds': 60})
+    try:
+        discovered = {job.name for job in test.probe_jobs()}
+    finally:
+        test.discovery.api.close()
+        test.engine.close()
+    static = {job.name for job in NodeNetworkTest({'nodes': ['n1=10.0.0.1'], 'interval_seconds': 60}).probe_jobs()}
+
+    assert discovered == {'endpoint:default/web/web-a@10.1.0.5:80', 'discovered-node:n1'}
+    assert static == {'node:n1'}